@@ -0,0 +1,100 @@
+#   0001_initial.py - data model for the archive index
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSources',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True,
+                                        serialize=False, verbose_name='ID')),
+                ('path', models.TextField(unique=True, verbose_name='Path')),
+                ('state', models.TextField(blank=True,
+                                           verbose_name='Indexed state')),
+                ('indexed', models.DateTimeField(auto_now=True,
+                                                 verbose_name='Index date')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivePackage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True,
+                                        serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=100,
+                                          verbose_name='Name')),
+                ('version', models.CharField(max_length=100,
+                                             verbose_name='Version')),
+                ('maintainer_names', models.TextField(
+                    blank=True, verbose_name='Maintainers')),
+                ('sources', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    to='archive.archivesources')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchiveOrigin',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True,
+                                        serialize=False, verbose_name='ID')),
+                ('source', models.CharField(db_index=True, max_length=100,
+                                            verbose_name='Source package')),
+                ('filename', models.CharField(max_length=255,
+                                              verbose_name='File name')),
+                ('sha256', models.CharField(max_length=64,
+                                            verbose_name='SHA256')),
+                ('sources', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    to='archive.archivesources')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchiveSuite',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True,
+                                        serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=64,
+                                          verbose_name='Name')),
+                ('sources', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    to='archive.archivesources')),
+            ],
+            options={
+                'unique_together': {('name', 'sources')},
+            },
+        ),
+    ]
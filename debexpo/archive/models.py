@@ -0,0 +1,326 @@
+#   models.py - index of the Debian archive
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+import gzip
+import lzma
+from datetime import timedelta
+from email.utils import getaddresses
+from glob import glob
+from logging import getLogger
+from os import stat
+from os.path import isfile, join, realpath
+
+from debian.deb822 import Sources
+from debian.debian_support import NativeVersion
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy as _
+
+from debexpo.tools.files import CheckSumedFile
+
+log = getLogger(__name__)
+
+SOURCES_BATCH_SIZE = 1000
+
+
+class ArchiveSourcesManager(models.Manager):
+    def is_available(self):
+        """
+        Returns True if the index has been built.
+        """
+        return self.exists()
+
+    def get_mirror_sources(self, mirror):
+        """
+        Returns the Sources files of each suite of a local mirror. Plain files
+        are preferred over compressed ones.
+        """
+        suites = {}
+        preferred = ('Sources', 'Sources.xz', 'Sources.gz')
+
+        for directory in sorted(glob(join(mirror, 'dists', '*', '**',
+                                          'source'), recursive=True)):
+            suite = directory[len(join(mirror, 'dists', '')):].split('/')[0]
+
+            for name in preferred:
+                filename = join(directory, name)
+
+                if isfile(filename):
+                    suites.setdefault(suite, []).append(filename)
+                    break
+
+        return suites
+
+    def refresh(self, suites):
+        """
+        Updates the index from suites, a dictionary of suite names and their
+        Sources files. Only files modified since they were last indexed are
+        read again, and only the differences are written.
+
+        Files and suites absent from suites are removed from the index. Suites
+        whose files were all indexed are marked as refreshed.
+        """
+        indexed = {}
+        incomplete = set()
+
+        for suite, filenames in suites.items():
+            for filename in filenames:
+                path = realpath(filename)
+
+                try:
+                    state = self._get_state(path)
+                except FileNotFoundError:
+                    log.warning(f'Sources file not found: {filename}')
+                    incomplete.add(suite)
+                    continue
+
+                sources, _ = self.get_or_create(path=path)
+
+                if sources.state != state:
+                    log.info(f'Indexing {path}')
+                    sources.update_index(state)
+
+                indexed.setdefault(sources, set()).add(suite)
+
+        for sources, names in indexed.items():
+            sources.archivesuite_set.exclude(name__in=names).delete()
+
+            for name in names:
+                ArchiveSuite.objects.get_or_create(name=name, sources=sources)
+
+        self.exclude(id__in=[sources.id for sources in indexed]).delete()
+        ArchiveSuite.objects.exclude(name__in=incomplete) \
+            .update(refreshed=now())
+
+    def _get_state(self, path):
+        info = stat(path)
+
+        return f'{info.st_ino}:{info.st_size}:{info.st_mtime_ns}'
+
+
+class ArchiveSources(models.Model):
+    """
+    Sources file of the Debian archive, as indexed.
+    """
+    objects = ArchiveSourcesManager()
+
+    path = models.TextField(unique=True, verbose_name=_('Path'))
+    state = models.TextField(blank=True, verbose_name=_('Indexed state'))
+    indexed = models.DateTimeField(auto_now=True,
+                                   verbose_name=_('Index date'))
+
+    def __str__(self):
+        return self.path
+
+    def _open(self):
+        if self.path.endswith('.gz'):
+            return gzip.open(self.path)
+
+        if self.path.endswith('.xz'):
+            return lzma.open(self.path)
+
+        return open(self.path, 'rb')
+
+    def _parse(self):
+        packages = {}
+        origins = {}
+
+        with self._open() as data:
+            for source in Sources.iter_paragraphs(data, use_apt_pkg=False):
+                if 'Package' not in source or 'Version' not in source:
+                    continue
+
+                maintainers = getaddresses([source.get('Maintainer', ''),
+                                            source.get('Uploaders', '')])
+                packages[(source['Package'], source['Version'])] = \
+                    '\n'.join(sorted(set(name for name, email in maintainers
+                                         if name)))
+
+                for item in source.get('Checksums-Sha256', []):
+                    if '.orig' in item['name']:
+                        origins[item['name']] = item['sha256']
+
+        return (packages, origins)
+
+    @transaction.atomic
+    def update_index(self, state):
+        """
+        Indexes the content of the file, writing only the source packages and
+        origin files added or removed since it was last indexed.
+        """
+        packages, origins = self._parse()
+
+        indexed = {(name, version): pk for pk, name, version in
+                   self.archivepackage_set.values_list('id', 'name',
+                                                       'version')}
+        ArchivePackage.objects.filter(id__in=[
+            pk for key, pk in indexed.items() if key not in packages
+        ]).delete()
+        ArchivePackage.objects.bulk_create([
+            ArchivePackage(sources=self, name=name, version=version,
+                           maintainer_names=maintainers)
+            for (name, version), maintainers in packages.items()
+            if (name, version) not in indexed
+        ], batch_size=SOURCES_BATCH_SIZE)
+
+        indexed = {(filename, sha256): pk for pk, filename, sha256 in
+                   self.archiveorigin_set.values_list('id', 'filename',
+                                                      'sha256')}
+        ArchiveOrigin.objects.filter(id__in=[
+            pk for key, pk in indexed.items() if key not in origins.items()
+        ]).delete()
+        ArchiveOrigin.objects.bulk_create([
+            ArchiveOrigin(sources=self, source=filename.split('_')[0],
+                          filename=filename, sha256=sha256)
+            for filename, sha256 in origins.items()
+            if (filename, sha256) not in indexed
+        ], batch_size=SOURCES_BATCH_SIZE)
+
+        self.state = state
+        self.full_clean()
+        self.save()
+
+
+class ArchiveSuiteManager(models.Manager):
+    def is_fresh(self, name=None):
+        """
+        Returns True if the suite name, or all indexed suites when not given,
+        was refreshed in the last DEBIAN_ARCHIVE_INDEX_MAX_AGE seconds. The
+        index is then authoritative: a package missing from it is not in the
+        suite.
+        """
+        suites = self.all()
+
+        if name:
+            suites = suites.filter(name=name)
+
+        if not suites.exists():
+            return False
+
+        limit = now() - timedelta(seconds=settings.DEBIAN_ARCHIVE_INDEX_MAX_AGE)
+
+        return not suites.filter(models.Q(refreshed__isnull=True) |
+                                 models.Q(refreshed__lt=limit)).exists()
+
+
+class ArchiveSuite(models.Model):
+    """
+    Suite of the Debian archive, and one of its indexed Sources files.
+    """
+    class Meta:
+        unique_together = ('name', 'sources')
+
+    objects = ArchiveSuiteManager()
+
+    name = models.CharField(max_length=64, db_index=True,
+                            verbose_name=_('Name'))
+    sources = models.ForeignKey(ArchiveSources, on_delete=models.CASCADE)
+    refreshed = models.DateTimeField(null=True,
+                                     verbose_name=_('Refresh date'))
+
+
+class ArchivePackageManager(models.Manager):
+    def get_versions(self, name, suite):
+        """
+        Returns the versions of a source package in a suite, or None if the
+        suite is not indexed or its index is outdated.
+        """
+        if not ArchiveSuite.objects.is_fresh(suite):
+            return None
+
+        return sorted(set(self.filter(
+            name=name, sources__archivesuite__name=suite
+        ).values_list('version', flat=True)))
+
+    def get_package(self, name):
+        """
+        Returns the latest version of a source package in the archive, None if
+        it is not in the archive.
+        """
+        packages = self.filter(name=name)
+
+        if not packages:
+            return None
+
+        return max(packages, key=lambda package: NativeVersion(package.version))
+
+
+class ArchivePackage(models.Model):
+    """
+    Source package listed in an indexed Sources file.
+    """
+    objects = ArchivePackageManager()
+
+    sources = models.ForeignKey(ArchiveSources, on_delete=models.CASCADE)
+    name = models.CharField(max_length=100, db_index=True,
+                            verbose_name=_('Name'))
+    version = models.CharField(max_length=100, verbose_name=_('Version'))
+    maintainer_names = models.TextField(blank=True,
+                                        verbose_name=_('Maintainers'))
+
+    @property
+    def maintainers(self):
+        return self.maintainer_names.splitlines()
+
+
+class ArchiveOriginManager(models.Manager):
+    def get_origin_files(self, name, version):
+        """
+        Returns the origin tarballs (and their signatures) of a source package
+        upstream version, with their sha256.
+        """
+        origin_files = []
+        prefix = f'{name}_{version}.orig'
+        matches = self.filter(source=name) \
+            .values_list('filename', 'sha256').distinct()
+
+        for filename, sha256 in sorted(matches):
+            if not filename.startswith(prefix) or \
+                    '.tar' not in filename[len(prefix):]:
+                continue
+
+            origin = CheckSumedFile(filename)
+            origin.add_checksum('sha256', sha256)
+            origin_files.append(origin)
+
+        return origin_files
+
+
+class ArchiveOrigin(models.Model):
+    """
+    Origin file listed in an indexed Sources file.
+    """
+    objects = ArchiveOriginManager()
+
+    sources = models.ForeignKey(ArchiveSources, on_delete=models.CASCADE)
+    source = models.CharField(max_length=100, db_index=True,
+                              verbose_name=_('Source package'))
+    filename = models.CharField(max_length=255, verbose_name=_('File name'))
+    sha256 = models.CharField(max_length=64, verbose_name=_('SHA256'))
@@ -0,0 +1,55 @@
+#   tasks.py - archive index tasks
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+from celery import shared_task
+from logging import getLogger
+
+from django.conf import settings
+
+from debexpo.archive.models import ArchiveSources
+
+log = getLogger(__name__)
+
+
+@shared_task
+def refresh_archive_index():
+    """
+    Index the Sources files of the local Debian mirror and those listed in
+    DEBIAN_ARCHIVE_SOURCES.
+    """
+    suites = {}
+
+    if settings.DEBIAN_ARCHIVE_MIRROR:
+        suites.update(ArchiveSources.objects.get_mirror_sources(
+            settings.DEBIAN_ARCHIVE_MIRROR))
+
+    for suite, filenames in settings.DEBIAN_ARCHIVE_SOURCES.items():
+        suites.setdefault(suite, []).extend(filenames)
+
+    ArchiveSources.objects.refresh(suites)
+    log.info(f'Archive index refreshed for {len(suites)} suites')
@@ -0,0 +1,83 @@
+#   tasks.py - email delivery tasks
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+
+from smtplib import SMTPException
+
+from celery import shared_task
+from logging import getLogger
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+log = getLogger(__name__)
+
+
+@shared_task(bind=True)
+def send_emails(self, messages):
+    """
+    Deliver a batch of emails over a single connection to the mail server.
+
+    Messages that could not be sent are retried later, up to
+    EMAIL_MAX_RETRIES times.
+    """
+    connection = get_connection()
+    failed = []
+    error = None
+
+    try:
+        connection.open()
+    except (SMTPException, OSError) as e:
+        failed = messages
+        error = e
+    else:
+        try:
+            for message in messages:
+                try:
+                    EmailMessage(connection=connection, **message).send()
+                except (SMTPException, OSError) as e:
+                    failed.append(message)
+                    error = e
+        finally:
+            connection.close()
+
+    if not failed:
+        return
+
+    recipients = ', '.join(', '.join(message['to']) for message in failed)
+
+    if self.request.retries >= settings.EMAIL_MAX_RETRIES:
+        log.error(f'Failed to send email to {recipients}: {error}')
+        return
+
+    log.warning(f'Failed to send email to {recipients}, retrying: {error}')
+
+    raise self.retry(args=[failed], exc=error,
+                     countdown=settings.EMAIL_RETRY_DELAY *
+                     2 ** self.request.retries,
+                     max_retries=settings.EMAIL_MAX_RETRIES)
@@ -82,7 +82,8 @@ def index(request):
     max_time = datetime.now(timezone.utc) - timedelta(days=30)
     packages = set(Package.objects
                    .filter(packageupload__uploaded__gte=max_time)
-                   .filter(needs_sponsor=True))
+                   .filter(needs_sponsor=True)
+                   .with_uploads())
 
     return render(request, 'index.html', {
         'settings': settings,
@@ -30,10 +30,12 @@ from enum import Enum
 from re import search
 from email.utils import getaddresses
 from logging import getLogger
-from datetime import timezone
+from datetime import timezone, timedelta
 from debianbts import get_status
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 
@@ -131,84 +133,198 @@ class BugManager(models.Manager):
 
         return BugType.bug
 
-    def remove_bugs(self, package):
-        self.get_queryset().filter(sources__name=package, bugtype=BugType.bug) \
-            .delete()
+    def remove_bugs(self, *packages):
+        self.get_queryset().filter(sources__name__in=packages,
+                                   bugtype=BugType.bug).delete()
 
-    def _guess_packages(self, source, subject):
-        packages = []
+    def _guess_package_names(self, source, subject):
+        names = []
 
         if source and source not in ('wnpp', 'sponsorship-requests'):
-            for name in source.replace(', ', ',').split(','):
-                package, _ = BugPackage.objects.get_or_create(name=name)
-                packages.append(package)
+            names = source.replace(', ', ',').split(',')
 
         else:
             matches = search(r'^\w+:\s+([a-z0-9][a-z0-9.+-]+)', subject)
 
             if matches:
-                name = matches[1]
-                package, _ = BugPackage.objects.get_or_create(name=name)
-                packages.append(package)
+                names.append(matches[1])
+
+        return names
+
+    def _get_packages(self, names):
+        """
+        Returns a dictionary of BugPackage by name, creating the missing ones
+        in a single query.
+        """
+        packages = BugPackage.objects.in_bulk(names, field_name='name')
+        missing = set(names) - set(packages.keys())
+
+        if missing:
+            BugPackage.objects.bulk_create([BugPackage(name=name)
+                                            for name in missing],
+                                           ignore_conflicts=True)
+            packages = BugPackage.objects.in_bulk(names, field_name='name')
 
         return packages
 
+    def _guess_packages(self, source, subject):
+        names = self._guess_package_names(source, subject)
+        packages = self._get_packages(names)
+
+        return [packages[name] for name in names]
+
     def _extract_email(self, email):
         extract = getaddresses([email])
 
         if extract:
             return extract[0][1]
 
-    def fetch_bugs(self, numbers):
-        bugs = []
+    def _parse_numbers(self, numbers):
+        parsed = set()
+
+        for number in numbers:
+            try:
+                parsed.add(int(number))
+            except ValueError:
+                continue
+
+        return parsed
+
+    def _build_bug(self, bug, synced):
+        new = Bug(
+                number=bug.bug_num,
+                bugtype=self._guess_bug_type(bug.subject),
+                status=getattr(BugStatus, bug.pending.replace('-', '_'), None),
+                created=bug.date.replace(tzinfo=timezone.utc),
+                updated=bug.log_modified.replace(tzinfo=timezone.utc),
+                severity=getattr(BugSeverity, bug.severity, None),
+                subject=bug.subject,
+                submitter_email=self._extract_email(bug.originator),
+                owner_email=self._extract_email(bug.owner),
+                synced=synced,
+        )
 
         try:
-            raw_bugs = get_status(numbers)
-        # BTS url is not configurable in debianbts. It cannot be used to trigger
-        # an exception from within. Excluded from testing
-        except Exception as e:  # pragma: no cover
-            log.warning(f'failed to fetch bugs status for {numbers}:\n{str(e)}')
-            return []
+            new.full_clean(validate_unique=False)
+        # Log as warning since this is not supposed to happen
+        # Excluded from testing
+        except ValidationError as e:  # pragma: no cover
+            log.warning('Failed to create a bug from:\n'
+                        f'{bug}\n'
+                        f'{str(e)}')
+            return None
+
+        return new
+
+    def _set_relations(self, relation, bugs):
+        through = getattr(Bug, relation).through
+
+        through.objects.filter(bug__in=list(bugs.keys())).delete()
+        through.objects.bulk_create([
+            through(bug_id=number, bugpackage_id=package.id)
+            for number, packages in bugs.items()
+            for package in packages
+        ])
+
+    @transaction.atomic
+    def _save_bugs(self, raw_bugs):
+        synced = now()
+        bugs = {}
+        names = {}
 
         for bug in raw_bugs:
-            bugtype = self._guess_bug_type(bug.subject)
-            status = getattr(BugStatus, bug.pending.replace('-', '_'), None)
-            severity = getattr(BugSeverity, bug.severity, None)
-            sources = self._guess_packages(bug.source, bug.subject)
-            packages = self._guess_packages(bug.package, bug.subject)
-            submitter = self._extract_email(bug.originator)
-            owner = self._extract_email(bug.owner)
-            created = bug.date.replace(tzinfo=timezone.utc)
-            updated = bug.log_modified.replace(tzinfo=timezone.utc)
-
-            new = Bug(
-                    number=bug.bug_num,
-                    bugtype=bugtype,
-                    status=status,
-                    created=created,
-                    updated=updated,
-                    severity=severity,
-                    subject=bug.subject,
-                    submitter_email=submitter,
-                    owner_email=owner,
-            )
+            new = self._build_bug(bug, synced)
+
+            if new:
+                bugs[new.number] = new
+                names[new.number] = (
+                    self._guess_package_names(bug.package, bug.subject),
+                    self._guess_package_names(bug.source, bug.subject),
+                )
+
+        if not bugs:
+            return []
+
+        packages = self._get_packages(set(
+            name for bug_names in names.values()
+            for name in bug_names[0] + bug_names[1]
+        ))
+
+        # Upsert without bulk_create(update_conflicts=True), unavailable on
+        # Django 3.2
+        existing = self.in_bulk(list(bugs.keys()), field_name='number')
+
+        self.bulk_create([bug for number, bug in bugs.items()
+                          if number not in existing])
+        self.bulk_update([bug for number, bug in bugs.items()
+                          if number in existing],
+                         [field.name for field in Bug._meta.concrete_fields
+                          if not field.primary_key])
+        self._set_relations('packages', {
+            number: [packages[name] for name in bug_names[0]]
+            for number, bug_names in names.items()
+        })
+        self._set_relations('sources', {
+            number: [packages[name] for name in bug_names[1]]
+            for number, bug_names in names.items()
+        })
+
+        return list(bugs.values())
+
+    def sync_bugs(self, numbers):
+        """
+        Fetches the status of the given bugs from the BTS, in batches of
+        BUGS_SYNC_BATCH_SIZE, and stores them.
+
+        Returns the list of synchronized bugs.
+        """
+        numbers = sorted(self._parse_numbers(numbers))
+        batch_size = settings.BUGS_SYNC_BATCH_SIZE
+        bugs = []
+
+        for index in range(0, len(numbers), batch_size):
+            batch = numbers[index:index + batch_size]
 
             try:
-                new.full_clean(validate_unique=False)
-            # Log as warning since this is not supposed to happen
-            # Excluded from testing
-            except ValidationError as e:  # pragma: no cover
-                log.warning('Failed to create a bug from:\n'
-                            f'{bug}\n'
+                raw_bugs = get_status(batch)
+            # BTS url is not configurable in debianbts. It cannot be used to
+            # trigger an exception from within. Excluded from testing
+            except Exception as e:  # pragma: no cover
+                log.warning(f'failed to fetch bugs status for {batch}:\n'
                             f'{str(e)}')
-            else:
-                new.save()
-                new.packages.set(packages)
-                new.sources.set(sources)
-                bugs.append(new)
+                continue
+
+            bugs += self._save_bugs(raw_bugs)
 
         return bugs
 
+    def get_stale_numbers(self, numbers):
+        """
+        Returns the numbers of the bugs missing from the database or not
+        synchronized for more than BUGS_SYNC_TIME.
+        """
+        numbers = self._parse_numbers(numbers)
+        fresh = self.get_queryset().filter(
+            number__in=numbers,
+            synced__gte=now() - timedelta(seconds=settings.BUGS_SYNC_TIME)
+        ).values_list('number', flat=True)
+
+        return numbers - set(fresh)
+
+    def fetch_bugs(self, numbers):
+        """
+        Returns the bugs matching numbers, fetching from the BTS only the ones
+        missing from the database or stale.
+        """
+        numbers = self._parse_numbers(numbers)
+        stale = self.get_stale_numbers(numbers)
+
+        if stale:
+            self.sync_bugs(stale)
+
+        return list(self.get_queryset().filter(number__in=numbers)
+                    .order_by('number'))
+
 
 class BugPackage(models.Model):
     name = models.TextField(unique=True, verbose_name=_('Package name'))
@@ -232,6 +348,8 @@ class Bug(models.Model):
     submitter_email = models.TextField(verbose_name=_('Submitter email'))
     owner_email = models.TextField(verbose_name=_('Owner email'), blank=True,
                                    null=True)
+    synced = models.DateTimeField(verbose_name=_('Synchronization date'),
+                                  null=True, db_index=True)
 
     objects = BugManager()
 
@@ -0,0 +1,55 @@
+#   tasks.py - tasks for bugs
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+
+from celery import shared_task
+from logging import getLogger
+
+from debexpo.bugs.models import Bug
+from debexpo.packages.models import PackageUpload
+
+log = getLogger(__name__)
+
+
+@shared_task
+def refresh_bugs():
+    """
+    Synchronize the bugs closed by uploads not yet refreshed for
+    BUGS_SYNC_TIME, so that the importer can rely on their cached status.
+    """
+    numbers = set()
+
+    for closes in PackageUpload.objects.exclude(closes='') \
+            .values_list('closes', flat=True).distinct():
+        numbers.update(closes.split())
+
+    stale = Bug.objects.get_stale_numbers(numbers)
+
+    if stale:
+        bugs = Bug.objects.sync_bugs(stale)
+        log.info(f'Refreshed {len(bugs)} bugs out of {len(stale)}')
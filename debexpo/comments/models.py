@@ -35,7 +35,7 @@ from django.urls import reverse
 
 from debexpo.accounts.models import User
 from debexpo.packages.models import PackageUpload, Package
-from debexpo.tools.email import Email
+from debexpo.tools.email import Email, outbox
 
 
 class UploadOutcome(int, Enum):
@@ -126,30 +126,32 @@ class Comment(models.Model):
         # requests)
         email = Email('email-comment.html')
         activate('en')
-        email.send(
-            _('New comment on package {}').format(package),
-            recipients,
-            comment=self,
-            is_uploader=False,
-            from_email=settings.COMMENTS_FROM_EMAIL,
-            package_url=request.build_absolute_uri(
-                reverse('package', args=[package])),
-            subscription_url=request.build_absolute_uri(
-                reverse('subscriptions')),
-        )
-
-        # For the uploader
-        email.send(
-            _('New comment on package {}').format(package),
-            [uploader],
-            comment=self,
-            is_uploader=True,
-            from_email=settings.COMMENTS_FROM_EMAIL,
-            package_url=request.build_absolute_uri(
-                reverse('package', args=[package])),
-            subscription_url=request.build_absolute_uri(
-                reverse('subscriptions')),
-        )
+
+        with outbox():
+            email.send(
+                _('New comment on package {}').format(package),
+                recipients,
+                comment=self,
+                is_uploader=False,
+                from_email=settings.COMMENTS_FROM_EMAIL,
+                package_url=request.build_absolute_uri(
+                    reverse('package', args=[package])),
+                subscription_url=request.build_absolute_uri(
+                    reverse('subscriptions')),
+            )
+
+            # For the uploader
+            email.send(
+                _('New comment on package {}').format(package),
+                [uploader],
+                comment=self,
+                is_uploader=True,
+                from_email=settings.COMMENTS_FROM_EMAIL,
+                package_url=request.build_absolute_uri(
+                    reverse('package', args=[package])),
+                subscription_url=request.build_absolute_uri(
+                    reverse('subscriptions')),
+            )
 
         # Restore language context
         activate(lang)
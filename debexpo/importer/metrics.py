@@ -0,0 +1,170 @@
+#   metrics.py - importer timing and metrics
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Timing of the import stages.
+
+Durations of each upload are aggregated in the cache as Prometheus
+histograms, exported with the spool state and the requests to upstream
+services by the metrics view.
+"""
+
+from contextlib import contextmanager
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+
+from debexpo.tools.cache import increment_counter
+from debexpo.tools.clients import ClientHTTP
+
+# Import stages, in order
+STAGES = ('changes', 'dsc', 'source', 'plugins', 'git', 'repository',
+          'database')
+
+METRICS_PREFIX = 'importer-metrics'
+
+
+class StageTimer():
+    """
+    Measures the duration of the import stages of an upload.
+    """
+    def __init__(self):
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = monotonic()
+
+        try:
+            yield
+        finally:
+            self.durations[name] = monotonic() - start
+
+    def record(self):
+        """
+        Add the durations to the histograms.
+        """
+        buckets = settings.IMPORTER_METRICS_BUCKETS
+
+        for stage, duration in self.durations.items():
+            # Index of the first bucket holding the duration, len(buckets)
+            # for +Inf
+            index = next((index for index, bound in enumerate(buckets)
+                          if duration <= bound), len(buckets))
+
+            # Redis only increments integers, the sum is kept in microseconds
+            increment_counter(f'{METRICS_PREFIX}:{stage}:bucket:{index}')
+            increment_counter(f'{METRICS_PREFIX}:{stage}:sum',
+                              round(duration * 1000000))
+
+
+def get_stage_histograms():
+    """
+    Returns, for each stage, the cumulated counts of each bucket (+Inf last)
+    and the sum of the durations in seconds.
+    """
+    buckets = settings.IMPORTER_METRICS_BUCKETS
+    keys = [f'{METRICS_PREFIX}:{stage}:{name}' for stage in STAGES
+            for name in [f'bucket:{index}'
+                         for index in range(len(buckets) + 1)] + ['sum']]
+    values = cache.get_many(keys)
+    histograms = {}
+
+    for stage in STAGES:
+        counts = []
+        total = 0
+
+        for index in range(len(buckets) + 1):
+            total += values.get(f'{METRICS_PREFIX}:{stage}:bucket:{index}', 0)
+            counts.append(total)
+
+        histograms[stage] = (counts, values.get(
+            f'{METRICS_PREFIX}:{stage}:sum', 0) / 1000000)
+
+    return histograms
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def render_metrics(spool=None):
+    """
+    Returns the metrics in the Prometheus text format.
+    """
+    buckets = [str(bound) for bound in settings.IMPORTER_METRICS_BUCKETS]
+    name = 'debexpo_importer_stage_duration_seconds'
+    lines = [
+        f'# HELP {name} Time spent in each stage of the import of uploads.',
+        f'# TYPE {name} histogram',
+    ]
+
+    for stage, (counts, total) in get_stage_histograms().items():
+        for bound, count in zip(buckets + ['+Inf'], counts):
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} '
+                         f'{count}')
+
+        lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {counts[-1]}')
+
+    stats = sorted(ClientHTTP.get_stats().items())
+
+    for name, field, description in (
+        ('debexpo_http_client_requests_total', 'requests',
+         'Requests to upstream services.'),
+        ('debexpo_http_client_cache_hits_total', 'hits',
+         'Requests to upstream services served from the cache.'),
+        ('debexpo_http_client_request_seconds_total', 'time',
+         'Time spent on requests to upstream services.'),
+    ):
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} counter')
+        lines.extend(f'{name}{{endpoint="{_escape_label(endpoint)}"}} '
+                     f'{endpoint_stats[field]}'
+                     for endpoint, endpoint_stats in stats)
+
+    if spool:
+        queues = [(queue, *spool.get_queue_state(queue))
+                  for queue in spool.queues]
+
+        name = 'debexpo_importer_spool_queue_depth'
+        lines.append(f'# HELP {name} Number of uploads in the spool.')
+        lines.append(f'# TYPE {name} gauge')
+        lines.extend(f'{name}{{queue="{queue}"}} {depth}'
+                     for queue, depth, age in queues)
+
+        name = 'debexpo_importer_spool_oldest_age_seconds'
+        lines.append(f'# HELP {name} Age of the oldest upload in the spool.')
+        lines.append(f'# TYPE {name} gauge')
+        lines.extend(f'{name}{{queue="{queue}"}} {age}'
+                     for queue, depth, age in queues)
+
+    return '\n'.join(lines) + '\n'
@@ -26,14 +26,16 @@
 
 from logging import getLogger
 
-from os.path import join, exists, basename, isfile
+from os.path import join, exists, basename, isfile, dirname
 from os import makedirs, unlink, stat
-from glob import glob
+from glob import glob, escape
 from traceback import format_exc
 from time import time
+from concurrent.futures import ThreadPoolExecutor
 
-from django.db import transaction
+from django.db import models, transaction, connection
 from django.conf import settings
+from django.core.cache import cache
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
@@ -50,13 +52,15 @@ from debexpo.tools.debian.source import ExceptionSource
 from debexpo.tools.debian.control import ExceptionControl
 from debexpo.tools.debian.copyright import ExceptionCopyright
 from debexpo.tools.debian.changelog import ExceptionChangelog
-from debexpo.tools.files import ExceptionCheckSumedFile
+from debexpo.tools.files import GPGSignedFile, ExceptionCheckSumedFile, \
+    CheckSumedFileWriter
 from debexpo.tools.gnupg import ExceptionGnuPG
 from debexpo.tools.email import Email
 from debexpo.repository.models import Repository
-from debexpo.plugins.models import PluginManager
+from debexpo.plugins.models import PluginManager, PluginResults
 from debexpo.tools.gitstorage import GitStorage
 from debexpo.tools.locale import translate_for
+from debexpo.importer.metrics import StageTimer
 
 log = getLogger(__name__)
 
@@ -113,29 +117,172 @@ class Spool():
             raise ExceptionSpoolUploadDenied(
                 'File already queued for importation')
 
-        return open(join(self.queues['incoming'], name), 'wb')
+        return CheckSumedFileWriter(join(self.queues['incoming'], name))
 
     def _is_owned(self, name):
         if not exists(join(self.queues['incoming'], name)):
             return False
 
+        filenames = glob(join(self.queues['incoming'], '**', '*.changes'),
+                         recursive=True)
+
+        for owns in self._get_owned_files(filenames).values():
+            if name in owns:
+                return True
+
+        return False
+
+    def _get_files_state(self, filename, names):
+        """
+        Returns the state on disk of a changes and the files it references,
+        used to detect modifications since the changes was indexed.
+        """
+        state = []
+
+        for path in [filename] + [join(dirname(filename), name)
+                                  for name in names]:
+            try:
+                info = stat(path)
+            except FileNotFoundError:
+                state.append(None)
+            else:
+                state.append((info.st_ino, info.st_mtime_ns, info.st_size))
+
+        return state
+
+    def _get_owned_files(self, filenames):
+        """
+        Returns, for each changes from the incoming queue, the names of the
+        files it owns, including the changes itself. A changes owns files only
+        if it is valid.
+
+        The result is indexed in the cache and computed again only when the
+        changes or one of its files has been modified on disk. Signatures of
+        the changes to index are verified in a single batch.
+        """
+        keys = {filename: f'spool-index:{filename}' for filename in filenames}
+        entries = cache.get_many(keys.values())
+        owned = {}
+        to_index = []
+
+        for filename, key in keys.items():
+            entry = entries.get(key)
+
+            if entry and \
+                    entry['state'] == self._get_files_state(filename,
+                                                            entry['files']):
+                owned[filename] = entry['owns']
+                continue
+
+            try:
+                to_index.append((filename, Changes(filename)))
+            except ExceptionChanges as e:
+                log.warning(e)
+                unlink(filename)
+                owned[filename] = []
+
+        GPGSignedFile.verify_signatures([changes for filename, changes
+                                         in to_index])
+
+        for filename, changes in to_index:
+            owned[filename] = self._index_changes(changes, keys[filename])
+
+        return owned
+
+    def _index_changes(self, changes, key):
+        files = [str(item) for item in changes.files.files]
+        state = self._get_files_state(changes.filename, files)
+        owns = []
+
+        # Only use valid changes
+        try:
+            changes.validate()
+            changes.authenticate()
+            changes.files.validate()
+        except (ExceptionChanges, ExceptionCheckSumedFile, ExceptionGnuPG):
+            pass
+        else:
+            owns = files + [str(changes)]
+
+        cache.set(key, {'files': files, 'state': state, 'owns': owns},
+                  timeout=settings.QUEUE_EXPIRED_TIME)
+
+        return owns
+
+    def is_upload_complete(self, name):
+        """
+        Returns True if name belongs to a changes in the incoming queue for
+        which all referenced files have been uploaded.
+
+        This only checks the presence and the size of the files. Signature and
+        checksums are validated by the importer.
+        """
+        name = basename(name)
+
         for changes in self.get_all_changes('incoming'):
-            # Only use valid changes
+            if str(changes) != name and not changes.owns(name):
+                continue
+
+            if self._has_all_files(changes):
+                return True
+
+        return False
+
+    def _is_stalled(self, changes):
+        """
+        Returns True if no file of the upload, including the ones still being
+        written, was modified for QUEUE_INCOMPLETE_TIME seconds.
+        """
+        directory = dirname(changes.filename)
+        names = [str(changes)] + [str(item) for item in changes.files.files]
+        paths = [join(directory, name) for name in names]
+
+        for name in names:
+            paths.extend(glob(join(directory, f'.{escape(name)}.*')))
+
+        mtimes = []
+
+        for path in paths:
             try:
-                changes.validate()
-                changes.authenticate()
-                changes.files.validate()
-            except (ExceptionChanges, ExceptionCheckSumedFile, ExceptionGnuPG):
+                mtimes.append(stat(path).st_mtime)
+            except FileNotFoundError:
                 pass
-            else:
-                if changes.owns(name):
-                    return True
 
-                if str(changes) == name:
+        return time() - max(mtimes, default=0) >= \
+            settings.QUEUE_INCOMPLETE_TIME
+
+    def _is_superseded(self, changes, incoming):
+        """
+        Returns True if a more recent changes for the same version of the
+        source package was uploaded.
+        """
+        mtime = stat(changes.filename).st_mtime
+
+        for other in incoming:
+            if other is changes or other.source != changes.source or \
+                    other.version != changes.version:
+                continue
+
+            try:
+                if stat(other.filename).st_mtime > mtime:
                     return True
+            except FileNotFoundError:
+                pass
 
         return False
 
+    def _has_all_files(self, changes):
+        for sumed_file in changes.files.files:
+            try:
+                size = stat(sumed_file.filename).st_size
+            except FileNotFoundError:
+                return False
+
+            if sumed_file.size is None or size != int(sumed_file.size):
+                return False
+
+        return True
+
     def _allowed_extention(self, filename):
         suffixes = [
             '.asc',
@@ -178,12 +325,66 @@ class Spool():
                 elif time() - stat(name).st_mtime > settings.QUEUE_EXPIRED_TIME:
                     unlink(name)
 
+        # Partial files of uploads that never completed
+        for name in glob(join(self.queues['incoming'], '**', '.*'),
+                         recursive=True):
+            try:
+                if isfile(name) and time() - stat(name).st_mtime > \
+                        settings.QUEUE_EXPIRED_TIME:
+                    unlink(name)
+            except FileNotFoundError:
+                # Completed in between
+                pass
+
+    def _remove_superseded(self, changes, incoming):
+        directory = dirname(changes.filename)
+        used = set(str(item) for other in incoming
+                   if other is not changes and
+                   dirname(other.filename) == directory
+                   for item in other.files.files)
+
+        for item in changes.files.files:
+            if str(item) not in used:
+                item.remove()
+
+        unlink(changes.filename)
+
     def changes_to_process(self):
-        for changes in self.get_all_changes('incoming'):
-            changes.move(self.queues['processing'])
+        incoming = self.get_all_changes('incoming')
+
+        for changes in incoming:
+            if self._has_all_files(changes):
+                changes.move(self.queues['processing'])
+
+            # A new upload of the same version replaces an incomplete one
+            elif self._is_superseded(changes, incoming):
+                log.info(f'Dropping incomplete {changes}, superseded by a '
+                         'new upload')
+                self._remove_superseded(changes, incoming)
+
+            # Uploads still being transferred are left for a later run, until
+            # they stall: they are then rejected for their missing files
+            elif self._is_stalled(changes):
+                changes.move(self.queues['processing'])
 
         return self.get_all_changes('processing')
 
+    def get_queue_state(self, queue):
+        """
+        Returns the number of uploads in the queue and the age in seconds of
+        the oldest one (0 if empty).
+        """
+        mtimes = []
+
+        for name in glob(join(self.queues[queue], '**', '*.changes'),
+                         recursive=True):
+            try:
+                mtimes.append(stat(name).st_mtime)
+            except FileNotFoundError:
+                pass
+
+        return (len(mtimes), max(time() - min(mtimes), 0) if mtimes else 0)
+
     def get_queue_dir(self, queue):
         return self.queues[queue]
 
@@ -219,30 +420,75 @@ class Importer():
     def process_spool(self):
         """
         Find all incoming uploads in the spool and process them
+
+        Uploads are grouped by source package. Each group is processed in
+        order, while different groups are processed concurrently when
+        IMPORTER_WORKERS is greater than 1.
         """
-        success = True
+        workers = getattr(settings, 'IMPORTER_WORKERS', 1)
+        all_changes = self.spool.changes_to_process()
 
-        for changes in self.spool.changes_to_process():
-            try:
-                upload = self.process_upload(changes)
-            except ExceptionImporterRejected as e:
-                success = False
-                self._reject(e)
+        if not self.skip_gpg:
+            GPGSignedFile.verify_signatures(all_changes)
 
-            # Unfortunatly, we cannot really test that since it is not supposed
-            # to happen. Note that the _fail() method is covered by the tests.
-            except Exception:  # pragma: no cover
-                success = False
-                self._fail(ExceptionImporterRejected(changes, 'Importer failed',
-                                                     Exception(format_exc())))
-            else:
-                self._accept(upload)
-            finally:
-                changes.remove()
+        queues = self._group_by_source(all_changes)
+
+        if workers > 1 and len(queues) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self._process_queue_in_thread,
+                                            queues))
+        else:
+            results = [self._process_queue(queue) for queue in queues]
 
         self.repository.update()
         self.spool.cleanup()
 
+        return all(results)
+
+    def _group_by_source(self, all_changes):
+        queues = {}
+
+        for changes in all_changes:
+            queues.setdefault(changes.source, []).append(changes)
+
+        return list(queues.values())
+
+    def _process_queue_in_thread(self, queue):
+        try:
+            return self._process_queue(queue)
+        finally:
+            # Each thread uses its own database connection
+            connection.close()
+
+    def _process_queue(self, queue):
+        success = True
+
+        for changes in queue:
+            if not self._process_changes(changes):
+                success = False
+
+        return success
+
+    def _process_changes(self, changes):
+        success = True
+
+        try:
+            upload = self.process_upload(changes)
+        except ExceptionImporterRejected as e:
+            success = False
+            self._reject(e)
+
+        # Unfortunatly, we cannot really test that since it is not supposed
+        # to happen. Note that the _fail() method is covered by the tests.
+        except Exception:  # pragma: no cover
+            success = False
+            self._fail(ExceptionImporterRejected(changes, 'Importer failed',
+                                                 Exception(format_exc())))
+        else:
+            self._accept(upload)
+        finally:
+            changes.remove()
+
         return success
 
     def _is_valid_email(self, email):
@@ -346,31 +592,38 @@ class Importer():
         """
         upload = PackageUpload.objects.create_from_changes(changes)
         upload.git_ref = git_ref
-        upload.full_clean()
+        # Related objects were just fetched from the database, skip checking
+        # their existence again.
+        upload.full_clean(exclude=('package', 'uploader', 'distribution',
+                                   'component'))
         upload.save()
 
         package = source.control.get_source_package()
         source_package = SourcePackage.objects.create_from_package(upload,
                                                                    package)
-        source_package.full_clean()
+        source_package.full_clean(exclude=('upload', 'section', 'priority'))
         source_package.save()
 
-        for package in source.control.get_binary_packages():
-            binary_package = BinaryPackage.objects.create_from_package(upload,
-                                                                       package)
-            binary_package.full_clean()
-            binary_package.save()
+        binary_packages = BinaryPackage.objects.create_from_packages(
+            upload, source.control.get_binary_packages())
+
+        for binary_package in binary_packages:
+            binary_package.full_clean(exclude=('upload', 'section',
+                                               'priority'))
+
+        BinaryPackage.objects.bulk_create(binary_packages)
 
         for result in plugins.results:
             result.upload = upload
-            result.full_clean()
-            result.save()
+            result.full_clean(exclude=('upload',))
 
             if result.plugin == 'debian-qa' and result.data:
                 upload.package.in_debian = result.data.get('in_debian', False)
                 upload.package.full_clean()
                 upload.package.save()
 
+        PluginResults.objects.bulk_create(plugins.results)
+
         return upload
 
 #     def _overlap_with_other_distrib(self):
@@ -403,28 +656,50 @@ class Importer():
         and then create the database entries for the imported package.
         """
         plugins = PluginManager()
+        timer = StageTimer()
+
+        try:
+            with timer.stage('changes'):
+                self._validate_changes(changes)
+
+            with timer.stage('dsc'):
+                self._validate_dsc(changes)
+
+            with timer.stage('source'):
+                source = self._validate_source(changes)
+
+            with timer.stage('plugins'):
+                plugins.run(changes, source)
+
+            upload = self._accept_upload(changes, source, plugins, timer)
+        finally:
+            timer.record()
+
+        ImportTiming.objects.bulk_create(
+            ImportTiming(upload=upload, stage=stage, duration=duration)
+            for stage, duration in timer.durations.items()
+        )
 
-        self._validate_changes(changes)
-        self._validate_dsc(changes)
-        source = self._validate_source(changes)
-        plugins.run(changes, source)
-        upload = self._accept_upload(changes, source, plugins)
         return upload
 
-    def _accept_upload(self, changes, source, plugins):
+    def _accept_upload(self, changes, source, plugins, timer):
         git_ref = None
 
         # Install source in git tree
         if self.git_storage_path:
-            git_storage = GitStorage(self.git_storage_path,
-                                     source.control.source['Source'])
-            git_ref = git_storage.install(source)
+            with timer.stage('git'):
+                git_storage = GitStorage(self.git_storage_path,
+                                         source.control.source['Source'])
+                git_ref = git_storage.install(source)
 
         # Install to repository
-        self.repository.install(changes)
+        with timer.stage('repository'):
+            self.repository.install(changes)
 
         # Create DB entries
-        upload = self._create_db_entries(changes, source, plugins, git_ref)
+        with timer.stage('database'):
+            upload = self._create_db_entries(changes, source, plugins,
+                                             git_ref)
 
         return upload
 
@@ -508,3 +783,12 @@ class Importer():
                 ))
 
         return source
+
+
+class ImportTiming(models.Model):
+    """
+    Duration of an import stage of an upload.
+    """
+    upload = models.ForeignKey(PackageUpload, on_delete=models.CASCADE)
+    stage = models.CharField(max_length=32, verbose_name=_('Import stage'))
+    duration = models.FloatField(verbose_name=_('Duration (seconds)'))
@@ -28,15 +28,70 @@
 
 from celery import shared_task
 
+from logging import getLogger
+
 from django.conf import settings
+from django.core.cache import cache
 
 from debexpo.importer.models import Importer
-from debexpo.tools.cache import enforce_unique_instance
+from debexpo.tools.cache import enforce_unique_instance, ExceptionTaskRunning
+
+log = getLogger(__name__)
+
+IMPORTER_REQUESTED = 'importer-requested'
+
+
+def _process_spool():
+    success = True
+
+    # Do another pass if an upload completed while processing the spool
+    while True:
+        cache.delete(IMPORTER_REQUESTED)
+        importctl = Importer(settings.UPLOAD_SPOOL)
+
+        if not importctl.process_spool():
+            success = False
+
+        if not cache.get(IMPORTER_REQUESTED):
+            break
+
+    return success
+
+
+def _run_importer():
+    with enforce_unique_instance('importer'):
+        success = _process_spool()
+
+    # A trigger landing after the last check, before the lock was released,
+    # could not run the importer: check again once released.
+    while cache.get(IMPORTER_REQUESTED):
+        try:
+            with enforce_unique_instance('importer'):
+                if not _process_spool():
+                    success = False
+        except ExceptionTaskRunning:
+            # Another instance took the lock and handles the request
+            break
+
+    return success
 
 
 @shared_task
 def importer():
-    with enforce_unique_instance('importer'):
-        importctl = Importer(settings.UPLOAD_SPOOL)
+    return _run_importer()
+
+
+@shared_task
+def trigger_importer():
+    """
+    Run the importer as soon as an upload is complete.
+
+    If the importer is already running, request another pass from the running
+    instance instead.
+    """
+    cache.set(IMPORTER_REQUESTED, True, timeout=None)
 
-        return importctl.process_spool()
+    try:
+        return _run_importer()
+    except ExceptionTaskRunning:
+        log.debug('Importer already running, another pass requested')
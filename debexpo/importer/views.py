@@ -28,15 +28,20 @@
 #   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 #   OTHER DEALINGS IN THE SOFTWARE.
 
+from ipaddress import ip_address, ip_network
 from logging import getLogger
 
+from kombu.exceptions import OperationalError
+
 from django.conf import settings
 from django.http import HttpResponseNotAllowed, HttpResponseForbidden, \
     HttpResponse, HttpResponseServerError
 from django.views.decorators.csrf import csrf_exempt
 
+from debexpo.importer.metrics import render_metrics
 from debexpo.importer.models import Spool, ExceptionSpoolUploadDenied, \
     ExceptionSpool
+from debexpo.importer.tasks import trigger_importer
 
 log = getLogger(__name__)
 
@@ -54,13 +59,57 @@ def upload(request, name):
     except ExceptionSpool as e:
         return HttpResponseServerError(e)
 
-    while True:
-        chunk = request.read(4 * 1024 * 1024)
+    with fd:
+        while True:
+            chunk = request.read(4 * 1024 * 1024)
 
-        if not chunk:
-            break
+            if not chunk:
+                break
 
-        fd.write(chunk)
+            fd.write(chunk)
 
     log.info(f'New upload: {fd.name}')
+
+    # Start the import right away instead of waiting for the periodic task
+    if getattr(settings, 'IMPORTER_TRIGGER_ON_UPLOAD', True) and \
+            spool.is_upload_complete(name):
+        log.info(f'Upload complete, triggering importer: {fd.name}')
+
+        # The periodic task will pick the upload if the broker is unavailable
+        try:
+            trigger_importer.delay()
+        except OperationalError as e:  # pragma: no cover
+            log.warning(f'Failed to trigger importer: {e}')
+
     return HttpResponse()
+
+
+def metrics(request):
+    """
+    Importer metrics, in the Prometheus text format. Only served to
+    METRICS_ALLOWED_IPS.
+    """
+    if not _is_metrics_client(request.META.get('REMOTE_ADDR')):
+        return HttpResponseForbidden()
+
+    spool = None
+
+    if getattr(settings, 'UPLOAD_SPOOL', None):
+        try:
+            spool = Spool(settings.UPLOAD_SPOOL)
+        except ExceptionSpool as e:
+            log.warning(f'Spool unavailable for metrics: {e}')
+
+    return HttpResponse(render_metrics(spool),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
+
+
+def _is_metrics_client(address):
+    try:
+        address = ip_address(address)
+    except ValueError:
+        return False
+
+    return any(address in ip_network(network, strict=False)
+               for network in getattr(settings, 'METRICS_ALLOWED_IPS', ()))
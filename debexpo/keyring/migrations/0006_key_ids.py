@@ -0,0 +1,78 @@
+#   0006_key_ids.py - index long and short key IDs
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+from django.db import migrations, models
+
+
+def populate_key_ids(apps, schema_editor):
+    for name in ('Key', 'SubKey'):
+        model = apps.get_model('keyring', name)
+        keys = list(model.objects.all())
+
+        for key in keys:
+            fingerprint = key.fingerprint.upper()
+            key.long_id = fingerprint[-16:]
+            key.short_id = fingerprint[-8:]
+
+        model.objects.bulk_update(keys, ['long_id', 'short_id'],
+                                  batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keyring', '0005_alter_gpgalgo_minimal_size_requirement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='key',
+            name='long_id',
+            field=models.CharField(blank=True, db_index=True, editable=False,
+                                   max_length=16, verbose_name='Long ID'),
+        ),
+        migrations.AddField(
+            model_name='key',
+            name='short_id',
+            field=models.CharField(blank=True, db_index=True, editable=False,
+                                   max_length=8, verbose_name='Short ID'),
+        ),
+        migrations.AddField(
+            model_name='subkey',
+            name='long_id',
+            field=models.CharField(blank=True, db_index=True, editable=False,
+                                   max_length=16, verbose_name='Long ID'),
+        ),
+        migrations.AddField(
+            model_name='subkey',
+            name='short_id',
+            field=models.CharField(blank=True, db_index=True, editable=False,
+                                   max_length=8, verbose_name='Short ID'),
+        ),
+        migrations.RunPython(populate_key_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+#   0007_key_uids.py - store the user IDs of keys
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+
+from django.db import migrations, models
+
+from debexpo.tools.gnupg import GnuPG, ExceptionGnuPG
+
+
+def populate_key_uids(apps, schema_editor):
+    # Imported here: historical models do not provide model functions
+    from debexpo.keyring.models import get_uids
+
+    model = apps.get_model('keyring', 'Key')
+    keys = list(model.objects.all())
+
+    if not keys:
+        return
+
+    # A single keyring for all keys, keys that cannot be imported are left
+    # without user IDs
+    gpg = GnuPG()
+
+    for key in keys:
+        try:
+            gpg.import_key(key.key)
+        except ExceptionGnuPG:
+            pass
+
+    keys_data = {data.fpr: data for data in gpg.get_keys_data() or []}
+
+    for key in keys:
+        if key.fingerprint in keys_data:
+            key.uids = get_uids(keys_data[key.fingerprint])
+
+    model.objects.bulk_update(keys, ['uids'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keyring', '0006_key_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='key',
+            name='uids',
+            field=models.TextField(blank=True, editable=False,
+                                   verbose_name='User IDs'),
+        ),
+        migrations.RunPython(populate_key_uids, migrations.RunPython.noop),
+    ]
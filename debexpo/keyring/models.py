@@ -26,8 +26,15 @@
 #   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 #   OTHER DEALINGS IN THE SOFTWARE.
 
+import re
+from time import time_ns
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
 from debexpo.accounts.models import User
@@ -37,6 +44,29 @@ from debexpo.tools.gnupg import GnuPG, ExceptionGnuPG, \
 import logging
 log = logging.getLogger(__name__)
 
+KEYS_CACHE_VERSION = 'keys-version'
+GPG_ESCAPE = re.compile(r'\\x([0-9a-f]{2})', re.IGNORECASE)
+
+
+def get_uids(key_data):
+    """
+    Returns the user IDs of a key parsed by gpg, one per line, unescaping the
+    characters escaped in the gpg colon output.
+    """
+    return '\n'.join(GPG_ESCAPE.sub(lambda match: chr(int(match.group(1), 16)),
+                                    uid.name)
+                     for uid in key_data.uids.values())
+
+
+def get_key_ids(fingerprint):
+    """
+    Returns the long (16 hex digits) and short (8 hex digits) IDs of a
+    fingerprint.
+    """
+    fingerprint = fingerprint.upper()
+
+    return (fingerprint[-16:], fingerprint[-8:])
+
 
 class GPGAlgo(models.Model):
     name = models.TextField(max_length=10, verbose_name=_('Type'))
@@ -52,6 +82,26 @@ class GPGAlgo(models.Model):
 
 
 class KeyManager(models.Manager):
+    def get_keyring(self):
+        """
+        Returns the persistent keyring used to verify signatures, or None if
+        GPG_KEYRING is not configured.
+        """
+        if not getattr(settings, 'GPG_KEYRING', None):
+            return None
+
+        return GnuPG(settings.GPG_KEYRING)
+
+    def get_cache_version(self):
+        """
+        Returns the version of the keys, changed each time a key is modified.
+        Used to invalidate cached data computed from keys.
+        """
+        return cache.get_or_set(KEYS_CACHE_VERSION, time_ns, timeout=None)
+
+    def invalidate_cache(self):
+        cache.set(KEYS_CACHE_VERSION, time_ns(), timeout=None)
+
     def import_key(self, data):
         gpg = GnuPG()
 
@@ -85,12 +135,28 @@ class KeyManager(models.Manager):
 
         return size
 
+    def get_id_lookup(self, key_id, prefix=''):
+        """
+        Returns the lookup arguments matching a fingerprint, a long ID or a
+        short ID on indexed columns. prefix is prepended to the field names.
+        """
+        key_id = key_id.upper()
+
+        if len(key_id) == 16:
+            field = 'long_id'
+        elif len(key_id) == 8:
+            field = 'short_id'
+        else:
+            field = 'fingerprint'
+
+        return {f'{prefix}{field}': key_id}
+
     def get_key_by_fingerprint(self, fingerprint):
-        return self.filter(Q(fingerprint=fingerprint) |
-                           Q(subkey__fingerprint=fingerprint) |
-                           Q(fingerprint__endswith=fingerprint) |
-                           Q(subkey__fingerprint__endswith=fingerprint)) \
-                                .distinct().get()
+        lookup = self.get_id_lookup(fingerprint)
+
+        return self.get(Q(id__in=self.filter(**lookup).values('id')) |
+                        Q(id__in=SubKey.objects.filter(**lookup)
+                          .values('key_id')))
 
     def parse_key_data(self, data):
         key = self.import_key(data)
@@ -111,8 +177,15 @@ class Key(models.Model):
     key = models.TextField(verbose_name=_('OpenGPG key'))
     fingerprint = models.TextField(max_length=40, verbose_name=_('Fingerprint'),
                                    unique=True)
+    long_id = models.CharField(max_length=16, blank=True, editable=False,
+                               db_index=True, verbose_name=_('Long ID'))
+    short_id = models.CharField(max_length=8, blank=True, editable=False,
+                                db_index=True, verbose_name=_('Short ID'))
     last_updated = models.DateTimeField(verbose_name=_('Last update on'),
                                         auto_now=True)
+    # User IDs of the key, one per line, searched by the HKP interface
+    uids = models.TextField(blank=True, editable=False,
+                            verbose_name=_('User IDs'))
 
     # We store here the algorithm and the size to avoid creating a
     # GnuPG to get those information each time a user loads its
@@ -128,6 +201,9 @@ class Key(models.Model):
     def update_subkeys(self):
         keyring = KeyManager().import_key(self.key)
 
+        self.uids = get_uids(keyring)
+        self.save()
+
         SubKey.objects.filter(key=self).delete()
 
         for fingerprint in keyring.subkeys.keys():
@@ -137,8 +213,55 @@ class Key(models.Model):
             log.info(f'Binding subkey fingerprint {fingerprint} to key '
                      f'{self.fingerprint}')
 
+        self.update_keyring()
+
+    def update_keyring(self, keyring=None):
+        """
+        Replace this key in the persistent verification keyring, dropping any
+        subkey or uid no longer part of the stored key.
+        """
+        keyring = keyring or Key.objects.get_keyring()
+
+        if not keyring:
+            return
+
+        keyring.delete_key(self.fingerprint)
+        keyring.import_key(self.key)
+
+    def save(self, *args, **kwargs):
+        self.long_id, self.short_id = get_key_ids(self.fingerprint)
+
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        keyring = Key.objects.get_keyring()
+
+        if keyring:
+            keyring.delete_key(self.fingerprint)
+
+        return super().delete(*args, **kwargs)
+
 
 class SubKey(models.Model):
     key = models.ForeignKey(Key, on_delete=models.CASCADE)
     fingerprint = models.TextField(max_length=40, verbose_name=_('Fingerprint'),
                                    unique=True)
+    long_id = models.CharField(max_length=16, blank=True, editable=False,
+                               db_index=True, verbose_name=_('Long ID'))
+    short_id = models.CharField(max_length=8, blank=True, editable=False,
+                                db_index=True, verbose_name=_('Short ID'))
+
+    def save(self, *args, **kwargs):
+        self.long_id, self.short_id = get_key_ids(self.fingerprint)
+
+        return super().save(*args, **kwargs)
+
+
+# Using signals since keys are also deleted in cascade with their user. The
+# cache is invalidated again on commit, in case it was filled in between with
+# the previous state.
+@receiver([post_save, post_delete], sender=Key)
+@receiver([post_save, post_delete], sender=SubKey)
+def invalidate_keys_cache(sender, **kwargs):
+    Key.objects.invalidate_cache()
+    transaction.on_commit(Key.objects.invalidate_cache)
@@ -26,47 +26,207 @@
 #   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 #   OTHER DEALINGS IN THE SOFTWARE.
 
+from hashlib import sha256
+from logging import getLogger
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
 from django.views.generic import View
-from django.views.generic.detail import BaseDetailView
 from django.http import HttpResponseServerError, HttpResponse, \
                         HttpResponseBadRequest
-from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from debexpo.keyring.models import Key, GPG_ESCAPE
+from debexpo.tools.gnupg import GnuPG, ExceptionGnuPG
 
-from debexpo.keyring.models import Key
+log = getLogger(__name__)
 
+KEY_ID = re.compile(r'^(?:0x)?([0-9a-f]{8}|[0-9a-f]{16}|[0-9a-f]{40})$',
+                    re.IGNORECASE)
 
-class HKPSearchView(BaseDetailView):
-    model = Key
+
+class HKPView(View):
+    """
+    HKP keyserver (draft-shaw-openpgp-hkp) for the keys of users.
+
+    Keys are searched by fingerprint, long or short key ID (several can be
+    given at once), or by text matched against the user IDs of the keys. The
+    get operation returns the keys, index and vindex list them in the machine
+    readable format.
+
+    Responses are cached until a key is modified and support conditional
+    requests.
+    """
+    operations = ('get', 'index', 'vindex')
 
     def get(self, request, *args, **kwargs):
+        if 'op' not in self.request.GET:
+            return HttpResponseBadRequest("Missing 'op' query string")
+
+        op = self.request.GET['op']
+
+        if op not in self.operations:
+            return HttpResponseServerError('Not Implemented', status=501)
+
         if 'search' not in self.request.GET:
             return HttpResponseBadRequest("Missing 'search' query string")
 
-        try:
-            return super().get(request, *args, **kwargs)
-        except Key.MultipleObjectsReturned:
-            return HttpResponseServerError('Multiple matches found', status=500)
+        terms = self._get_terms()
 
-    def get_object(self, queryset=None):
-        key_id = self.request.GET['search'].replace('0x', '')
+        if any(len(term) < settings.HKP_MIN_SEARCH_LENGTH
+               for term in terms if not KEY_ID.match(term)):
+            return HttpResponseBadRequest('Search term too short')
 
-        try:
-            return Key.objects.get(fingerprint__endswith=key_id)
-        except Key.DoesNotExist:
-            pass
+        exact = self.request.GET.get('exact') == 'on'
+        query = '\n'.join([op, str(exact)] + terms)
+        key = f'hkp:{Key.objects.get_cache_version()}:' \
+              f'{sha256(query.encode()).hexdigest()}'
+        entry = cache.get(key)
 
-        return get_object_or_404(Key, subkey__fingerprint__endswith=key_id)
+        if entry is None:
+            entry = self._build_entry(op, terms, exact)
+            cache.set(key, entry, timeout=settings.HKP_CACHE_TIME)
 
-    def render_to_response(self, context, **response_kwargs):
-        return HttpResponse(self.object.key + '\n')
+        return self._build_response(entry)
 
+    def _get_terms(self):
+        terms = []
 
-class HKPView(View):
-    def get(self, request, *args, **kwargs):
-        if 'op' not in self.request.GET:
-            return HttpResponseBadRequest("Missing 'op' query string")
+        for search in self.request.GET.getlist('search'):
+            search = search.strip()
+            key_ids = [KEY_ID.match(term)
+                       for term in re.split(r'[\s,]+', search)]
+
+            if search and all(key_ids):
+                terms.extend(key_id.group(1).upper() for key_id in key_ids)
+            elif search:
+                terms.append(search.lower())
+
+        return terms
+
+    def _find_keys(self, term, exact):
+        keys = Key.objects.select_related('algorithm')
 
-        if self.request.GET['op'] == 'get':
-            return HKPSearchView.as_view()(request)
+        if KEY_ID.match(term):
+            found = list(keys.filter(**Key.objects.get_id_lookup(term)))
+
+            if found:
+                return found
+
+            return list(keys.filter(**Key.objects.get_id_lookup(term,
+                                                                'subkey__')))
+
+        # Only the user IDs published with the keys are searched, not the
+        # accounts of their owners
+        email = term.strip('<>')
+
+        if '@' in email and ' ' not in email:
+            keys = [key for key in keys.filter(uids__icontains=email)
+                    if any(uid == email or uid.endswith(f'<{email}>')
+                           for uid in key.uids.lower().splitlines())]
+        elif exact:
+            keys = [key for key in keys.filter(uids__icontains=term)
+                    if term in key.uids.lower().splitlines()]
         else:
-            return HttpResponseServerError('Not Implemented', status=501)
+            keys = keys.filter(uids__icontains=term)
+
+        return list(keys[:settings.HKP_MAX_RESULTS])
+
+    def _build_entry(self, op, terms, exact):
+        keys = {}
+
+        for term in terms:
+            found = self._find_keys(term, exact)
+
+            if op == 'get' and len(found) > 1:
+                return {'status': 500, 'content': 'Multiple matches found'}
+
+            keys.update((key.id, key) for key in found)
+
+        keys = list(keys.values())[:settings.HKP_MAX_RESULTS]
+
+        if not keys:
+            return {'status': 404, 'content': 'Not Found'}
+
+        if op == 'get':
+            content = ''.join(f'{key.key}\n' for key in keys)
+            content_type = 'application/pgp-keys'
+        else:
+            content = self._format_index(keys)
+            content_type = 'text/plain'
+
+        return {
+            'status': 200,
+            'content': content,
+            'content_type': content_type,
+            'etag': quote_etag(sha256(content.encode()).hexdigest()),
+            'last_modified': int(max(key.last_updated
+                                     for key in keys).timestamp()),
+        }
+
+    def _get_keys_data(self, keys):
+        # A single gpg run for all keys
+        gpg = GnuPG()
+
+        if gpg.is_unusable():
+            return {}
+
+        try:
+            gpg.import_key('\n'.join(key.key for key in keys))
+        except ExceptionGnuPG as e:
+            log.warning(f'Failed to read keys: {e}')
+            return {}
+
+        return {data.fpr: data for data in gpg.get_keys_data() or []}
+
+    def _format_flags(self, validity):
+        return validity if validity in ('r', 'e') else ''
+
+    def _format_uid(self, uid):
+        # Unescape gpg colon output then escape as required by HKP
+        uid = GPG_ESCAPE.sub(lambda match: chr(int(match.group(1), 16)), uid)
+
+        return quote(uid, safe=' !"#$&\'()*+,-./;<=>?@[\\]^_`{|}~')
+
+    def _format_index(self, keys):
+        data = self._get_keys_data(keys)
+        lines = [f'info:1:{len(keys)}']
+
+        for key in keys:
+            key_data = data.get(key.fingerprint)
+
+            if not key_data:
+                algorithm = key.algorithm.gpg_algorithm_id \
+                    if key.algorithm else ''
+                lines.append(f'pub:{key.fingerprint}:{algorithm}:{key.size}'
+                             ':::')
+                continue
+
+            pub = key_data.pub
+            lines.append(':'.join(('pub', key.fingerprint, pub[3], pub[2],
+                                   pub[5], pub[6],
+                                   self._format_flags(pub[1]))))
+
+            for uid in key_data.uids.values():
+                lines.append(':'.join(('uid', self._format_uid(uid.name),
+                                       uid.uid[5], uid.uid[6],
+                                       self._format_flags(uid.uid[1]))))
+
+        return '\n'.join(lines) + '\n'
+
+    def _build_response(self, entry):
+        response = HttpResponse(entry['content'], status=entry['status'],
+                                content_type=entry.get('content_type'))
+
+        if entry['status'] != 200:
+            return response
+
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+
+        return get_conditional_response(self.request, etag=entry['etag'],
+                                        last_modified=entry['last_modified'],
+                                        response=response)
@@ -0,0 +1,76 @@
+#   0002_packagelatestupload.py - track latest upload per distribution
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+
+from django.db import migrations, models
+from django.db.models import Max
+import django.db.models.deletion
+
+
+def populate_latest_uploads(apps, schema_editor):
+    PackageUpload = apps.get_model('packages', 'PackageUpload')
+    PackageLatestUpload = apps.get_model('packages', 'PackageLatestUpload')
+
+    PackageLatestUpload.objects.bulk_create([
+        PackageLatestUpload(package_id=entry['package'],
+                            distribution_id=entry['distribution'],
+                            uploaded=entry['latest'])
+        for entry in PackageUpload.objects
+        .values('package', 'distribution')
+        .annotate(latest=Max('uploaded'))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageLatestUpload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True,
+                                        serialize=False, verbose_name='ID')),
+                ('uploaded', models.DateTimeField(
+                    db_index=True, verbose_name='Latest upload date')),
+                ('distribution', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    to='packages.distribution')),
+                ('package', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    to='packages.package')),
+            ],
+            options={
+                'unique_together': {('package', 'distribution')},
+            },
+        ),
+        migrations.RunPython(populate_latest_uploads,
+                             migrations.RunPython.noop),
+    ]
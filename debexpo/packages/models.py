@@ -28,9 +28,13 @@
 #   OTHER DEALINGS IN THE SOFTWARE.
 
 import json
+from hashlib import sha256
 from os.path import join
 
+from debian.deb822 import Deb822, Changes
+
 from django.db import models
+from django.db.models import Max
 from django.utils.translation import gettext_lazy as _
 
 from debexpo.accounts.models import User
@@ -59,9 +63,29 @@ class Component(models.Model):
         return self.name
 
 
+class NameManager(models.Manager):
+    def get_or_create_many(self, names):
+        """
+        Returns a dictionary of objects by name, creating the missing ones. Runs
+        at most three queries whatever the number of names.
+        """
+        names = set(names)
+        objects = self.in_bulk(names, field_name='name')
+        missing = names - set(objects.keys())
+
+        if missing:
+            self.bulk_create([self.model(name=name) for name in missing],
+                             ignore_conflicts=True)
+            objects = self.in_bulk(names, field_name='name')
+
+        return objects
+
+
 class Section(models.Model):
     name = models.CharField(max_length=32, verbose_name=_('Name'), unique=True)
 
+    objects = NameManager()
+
     def __str__(self):
         return self.name
 
@@ -69,11 +93,31 @@ class Section(models.Model):
 class Priority(models.Model):
     name = models.CharField(max_length=32, verbose_name=_('Name'), unique=True)
 
+    objects = NameManager()
+
     def __str__(self):
         return self.name
 
 
 class PackageUploadManager(models.Manager):
+    def prefetch_dsc(self, uploads):
+        """
+        Fetch the dsc repository files of the given uploads of a package in a
+        single query.
+        """
+        uploads = list(uploads)
+
+        if not uploads:
+            return
+
+        dscs = {}
+        for dsc in RepositoryFile.objects.filter(
+                package=uploads[0].package.name, path__endswith='.dsc'):
+            dscs[(dsc.version, dsc.distribution)] = dsc
+
+        for upload in uploads:
+            upload._dsc = dscs.get((upload.version, upload.distribution.name))
+
     def create_from_changes(self, changes):
         upload = PackageUpload()
 
@@ -93,7 +137,23 @@ class PackageUploadManager(models.Manager):
 
 
 class PackageManager(models.Manager):
-    def create_from_package(self, upload, package):
+    def create_from_packages(self, upload, packages):
+        """
+        Returns the unsaved entries for several packages of an upload, looking
+        up their sections and priorities at once.
+        """
+        sections = Section.objects.get_or_create_many(
+            package['section'] for package in packages
+            if package.get('section'))
+        priorities = Priority.objects.get_or_create_many(
+            package['priority'] for package in packages
+            if package.get('priority'))
+
+        return [self.create_from_package(upload, package, sections, priorities)
+                for package in packages]
+
+    def create_from_package(self, upload, package, sections=None,
+                            priorities=None):
         if isinstance(self.model(), SourcePackage):
             entry = SourcePackage()
 
@@ -109,12 +169,18 @@ class PackageManager(models.Manager):
         entry.homepage = package.get('homepage')
 
         if package.get('section'):
-            entry.section = Section.objects.get_or_create(
-                name=package.get('section'))[0]
+            if sections is None:
+                sections = Section.objects.get_or_create_many(
+                    (package['section'],))
+
+            entry.section = sections[package['section']]
 
         if package.get('priority'):
-            entry.priority = Priority.objects.get_or_create(
-                name=package.get('priority'))[0]
+            if priorities is None:
+                priorities = Priority.objects.get_or_create_many(
+                    (package['priority'],))
+
+            entry.priority = priorities[package['priority']]
 
         entry.vcs = json.dumps(self._get_vcs_fields(package))
 
@@ -130,7 +196,28 @@ class PackageManager(models.Manager):
         return vcs
 
 
+class PackageQuerySet(models.QuerySet):
+    def with_uploads(self):
+        """
+        Returns distinct packages with their uploads, uploaders, distributions
+        and binaries prefetched, so that listing them runs a constant number of
+        queries.
+        """
+        uploads = PackageUpload.objects \
+            .select_related('uploader', 'distribution') \
+            .order_by('uploaded')
+        binaries = BinaryPackage.objects.order_by('pk')
+
+        return self.distinct().prefetch_related(
+            models.Prefetch('packageupload_set', queryset=uploads),
+            models.Prefetch('packageupload_set__binarypackage_set',
+                            queryset=binaries),
+        )
+
+
 class Package(models.Model):
+    objects = PackageQuerySet.as_manager()
+
     # At the time of writing, longest package name is 60 in bullseye/sid
     name = models.CharField(max_length=100, verbose_name=_('Name'), unique=True)
     needs_sponsor = models.BooleanField(default=False,
@@ -140,23 +227,47 @@ class Package(models.Model):
     def __str__(self):
         return self.name
 
-    def get_description(self):
-        upload = self.packageupload_set.latest('uploaded')
+    def _has_prefetched_uploads(self):
+        return 'packageupload_set' in getattr(self, '_prefetched_objects_cache',
+                                              {})
+
+    def _get_uploads(self):
+        if self._has_prefetched_uploads():
+            return sorted(self.packageupload_set.all(),
+                          key=lambda upload: upload.uploaded)
+
+        return self.packageupload_set \
+            .select_related('uploader', 'distribution') \
+            .order_by('uploaded')
 
-        if upload.binarypackage_set.count():
-            binary = upload.binarypackage_set.filter(name=self.name)
+    def get_latest_upload(self):
+        if self._has_prefetched_uploads():
+            uploads = self._get_uploads()
 
-            if not binary:
-                binary = upload.binarypackage_set.last()
+            if not uploads:
+                raise PackageUpload.DoesNotExist()
+
+            return uploads[-1]
+
+        return self.packageupload_set.latest('uploaded')
+
+    def get_description(self):
+        upload = self.get_latest_upload()
+        binaries = sorted(upload.binarypackage_set.all(),
+                          key=lambda binary: binary.pk)
+
+        for binary in binaries:
+            if binary.name == self.name:
                 return binary.description
-            else:
-                return binary.get().description
+
+        if binaries:
+            return binaries[-1].description
 
         return ''
 
     def get_full_description(self):
         description = []
-        upload = self.packageupload_set.latest('uploaded')
+        upload = self.get_latest_upload()
 
         for binary in upload.binarypackage_set.all():
             description.append('{} - {}'.format(binary.name,
@@ -167,9 +278,8 @@ class Package(models.Model):
     def get_versions(self):
         versions = {}
 
-        for item in self.packageupload_set.order_by('uploaded').values(
-                'version', 'distribution__name'):
-            versions[item['distribution__name']] = item['version']
+        for upload in self._get_uploads():
+            versions[upload.distribution.name] = upload.version
 
         return versions
 
@@ -178,10 +288,7 @@ class Package(models.Model):
                           distribution, version in self.get_versions().items()])
 
     def get_uploaders(self):
-        return set([
-            User.objects.get(pk=item['uploader'])
-            for item in self.packageupload_set.values('uploader')
-        ])
+        return set([upload.uploader for upload in self._get_uploads()])
 
 
 class PackageUpload(models.Model):
@@ -214,25 +321,152 @@ class PackageUpload(models.Model):
         return PackageUpload.objects.filter(
             package=self.package, uploaded__lt=self.uploaded).count() + 1
 
+    def get_dsc(self):
+        if not hasattr(self, '_dsc'):
+            try:
+                self._dsc = RepositoryFile.objects.get(
+                    package=self.package.name,
+                    version=self.version,
+                    distribution=self.distribution.name,
+                    path__endswith='.dsc'
+                )
+            except RepositoryFile.DoesNotExist:
+                self._dsc = None
+
+        return self._dsc
+
     def get_dsc_url(self):
-        try:
-            dsc = RepositoryFile.objects.get(
-                package=self.package.name,
-                version=self.version,
-                distribution=self.distribution.name,
-                path__endswith='.dsc'
-            )
-        except RepositoryFile.DoesNotExist:
+        dsc = self.get_dsc()
+
+        if not dsc:
             return
 
         return join('/', 'debian', str(dsc))
 
+    def get_source_package(self):
+        sources = self.sourcepackage_set.all()
+
+        if sources:
+            return sources[0]
+
     def get_dsc_name(self):
         dsc = self.get_dsc_url()
 
         if dsc:
             return dsc.split('/')[-1]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        PackageLatestUpload.objects.track(self)
+
+
+class PackageLatestUploadManager(models.Manager):
+    def track(self, upload):
+        """
+        Records upload as the latest one of its package and distribution.
+        """
+        self.update_or_create(package_id=upload.package_id,
+                              distribution_id=upload.distribution_id,
+                              defaults={'uploaded': upload.uploaded})
+
+    def refresh(self, pairs):
+        """
+        Recomputes the latest upload date of the given (package id,
+        distribution id) pairs, after their uploads have been removed.
+        """
+        pairs = set(pairs)
+
+        if not pairs:
+            return
+
+        latest = {
+            (entry['package'], entry['distribution']): entry['latest']
+            for entry in PackageUpload.objects
+            .filter(package__in=set(package for package, _ in pairs))
+            .values('package', 'distribution')
+            .annotate(latest=Max('uploaded'))
+            if (entry['package'], entry['distribution']) in pairs
+        }
+        entries = [entry for entry in self.filter(
+                       package__in=set(package for package, _ in pairs))
+                   if (entry.package_id, entry.distribution_id) in pairs]
+        updated = []
+        removed = []
+
+        for entry in entries:
+            uploaded = latest.get((entry.package_id, entry.distribution_id))
+
+            if uploaded:
+                entry.uploaded = uploaded
+                updated.append(entry)
+            else:
+                removed.append(entry.id)
+
+        self.bulk_update(updated, ['uploaded'])
+        self.filter(id__in=removed).delete()
+
+
+class PackageLatestUpload(models.Model):
+    """
+    Date of the latest upload of a package to a distribution, maintained to
+    find expired packages without going through all uploads.
+    """
+    class Meta:
+        unique_together = ('package', 'distribution')
+
+    objects = PackageLatestUploadManager()
+
+    package = models.ForeignKey(Package, on_delete=models.CASCADE)
+    distribution = models.ForeignKey(Distribution, on_delete=models.CASCADE)
+    uploaded = models.DateTimeField(verbose_name=_('Latest upload date'),
+                                    db_index=True)
+
+
+class NewQueueSnapshot(models.Model):
+    """
+    Last snapshot of the ftp-master NEW queue processed, used to only handle
+    the uploads added to the queue since.
+    """
+    url = models.URLField(unique=True, verbose_name=_('URL'))
+    etag = models.TextField(blank=True, null=True, verbose_name=_('ETag'))
+    last_modified = models.TextField(blank=True, null=True,
+                                     verbose_name=_('Last modified'))
+    fingerprint = models.CharField(max_length=64, blank=True,
+                                   verbose_name=_('Fingerprint'))
+    uploads = models.TextField(default='[]',
+                               verbose_name=_('Uploads in queue'))
+
+    @staticmethod
+    def _get_upload_key(changes):
+        return ' '.join(changes.get(field, '')
+                        for field in ('Source', 'Version', 'Distribution'))
+
+    def update(self, content, etag=None, last_modified=None):
+        """
+        Records content as the current state of the queue.
+
+        Returns the changes of the uploads added since the previous snapshot.
+        """
+        self.etag = etag
+        self.last_modified = last_modified
+        fingerprint = sha256(content).hexdigest()
+
+        if fingerprint == self.fingerprint:
+            return []
+
+        # Uploads are identified by source, version and distribution, other
+        # fields (such as Age) change on every snapshot
+        previous = set(json.loads(self.uploads))
+        packages = [Changes(package)
+                    for package in Deb822.iter_paragraphs(content)]
+        keys = [self._get_upload_key(changes) for changes in packages]
+
+        self.fingerprint = fingerprint
+        self.uploads = json.dumps(sorted(set(keys)))
+
+        return [changes for changes, key in zip(packages, keys)
+                if key not in previous]
+
 
 class SourcePackage(models.Model):
     # Links a PackageUpload
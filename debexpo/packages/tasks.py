@@ -34,12 +34,12 @@ from debian.deb822 import Changes
 from debian.debian_support import NativeVersion
 
 from django.conf import settings
-from django.db.models import Max, Q
 from django.db import transaction
 
-from debexpo.packages.models import Package, PackageUpload
+from debexpo.packages.models import Package, PackageUpload, \
+    PackageLatestUpload, NewQueueSnapshot
 from debexpo.repository.models import Repository
-from debexpo.tools.email import Email
+from debexpo.tools.email import Email, outbox
 from debexpo.bugs.models import Bug
 from debexpo.tools.gitstorage import GitStorage
 from debexpo.nntp.models import NNTPFeed
@@ -58,35 +58,50 @@ def remove_user_uploads(user):
 
 @transaction.atomic
 def remove_uploads(uploads):
-    removals = set()
+    """
+    Removes uploads, along with the versions and packages left without any
+    upload, using a fixed number of queries whatever the number of uploads.
+    """
     repository = Repository(settings.REPOSITORY)
     git_storage_path = getattr(settings, 'GIT_STORAGE', None)
+    ids = set(upload.id for upload in uploads)
+    uploads = PackageUpload.objects.filter(id__in=ids) \
+        .select_related('package', 'distribution', 'uploader')
 
-    for upload in uploads:
-        remove_version = not PackageUpload.objects.filter(
-            package=upload.package, version=upload.version) \
-            .exclude(id=upload.id)
-        remove_package = not PackageUpload.objects.filter(
-            package=upload.package).exclude(id=upload.id)
-        package = upload.package.name
-        distribution = upload.distribution.name
-        uploader = upload.uploader
-
-        if remove_version:
-            repository.remove(package, upload.version)
-        if remove_package:
-            if git_storage_path:
-                git_storage = GitStorage(git_storage_path, package)
-                git_storage.remove()
-
-            Bug.objects.remove_bugs(package)
-
-        upload.delete()
-
-        if remove_package:
-            Package.objects.get(name=package).delete()
+    removals = set()
+    pairs = set()
+    versions = set()
+    packages = set()
 
-        removals.add((package, distribution, uploader))
+    for upload in uploads:
+        removals.add((upload.package.name, upload.distribution.name,
+                      upload.uploader))
+        pairs.add((upload.package_id, upload.distribution_id))
+        versions.add((upload.package.name, upload.version))
+        packages.add(upload.package.name)
+
+    if not removals:
+        return removals
+
+    # Versions and packages still having uploads once those are removed
+    remaining = set(PackageUpload.objects.filter(package__name__in=packages)
+                    .exclude(id__in=ids)
+                    .values_list('package__name', 'version')
+                    .distinct())
+    removed_versions = versions - remaining
+    removed_packages = packages - set(package for package, _ in remaining)
+
+    repository.remove_versions(removed_versions)
+
+    if git_storage_path:
+        for package in removed_packages:
+            git_storage = GitStorage(git_storage_path, package)
+            git_storage.remove()
+
+    Bug.objects.remove_bugs(*removed_packages)
+    PackageUpload.objects.filter(id__in=ids).delete()
+    PackageLatestUpload.objects.refresh(pairs)
+    Package.objects.filter(name__in=removed_packages).delete()
 
     repository.update()
 
@@ -101,31 +116,39 @@ def remove_uploads(uploads):
 def remove_old_uploads():
     expiration_date = datetime.now(timezone.utc) - \
         timedelta(weeks=settings.MAX_AGE_UPLOAD_WEEKS)
-    packages = Package.objects \
-        .values('name', 'packageupload__distribution') \
-        .annotate(latest_upload=Max('packageupload__uploaded')) \
-        .filter(latest_upload__lt=expiration_date)
 
-    uploads = set()
+    while True:
+        expired = set(PackageLatestUpload.objects
+                      .filter(uploaded__lt=expiration_date)
+                      .order_by('uploaded')
+                      .values_list('package', 'distribution')
+                      [:settings.MAX_AGE_UPLOAD_BATCH_SIZE])
+
+        if not expired:
+            break
 
-    for package in packages:
-        uploads.update(PackageUpload.objects.filter(
-            package__name=package['name'],
-            distribution=package['packageupload__distribution']))
+        uploads = [upload for upload in PackageUpload.objects
+                   .filter(package__in=set(package for package, _ in expired))
+                   if (upload.package_id, upload.distribution_id) in expired]
 
-    removals = remove_uploads(uploads)
-    notify_uploaders(removals, reason='Your package found no sponsor for '
-                                      '20 weeks')
+        # Drop entries left without uploads
+        PackageLatestUpload.objects.refresh(expired)
+
+        removals = remove_uploads(uploads)
+        notify_uploaders(removals, reason='Your package found no sponsor for '
+                                          '20 weeks')
 
 
 def notify_uploaders(removals, reason):
-    for package, distribution, uploader in removals:
-        email = Email('email-upload-removed.html')
-        email.send(f'{package} has been removed from '
-                   f'{distribution} on {settings.SITE_NAME}',
-                   recipients=[uploader.email], package=package,
-                   distribution=distribution,
-                   reason=reason)
+    email = Email('email-upload-removed.html')
+
+    with outbox():
+        for package, distribution, uploader in removals:
+            email.send(f'{package} has been removed from '
+                       f'{distribution} on {settings.SITE_NAME}',
+                       recipients=[uploader.email], package=package,
+                       distribution=distribution,
+                       reason=reason)
 
 
 @shared_task
@@ -134,7 +157,8 @@ def remove_uploaded_packages(client=None):
     uploads_to_new = set()
 
     uploads_to_archive.update(get_packages_uploaded_to_archive(client))
-    uploads_to_new.update(get_packages_uploaded_to_new())
+    new_uploads, snapshot = get_packages_uploaded_to_new()
+    uploads_to_new.update(new_uploads)
 
     removals_from_archive = remove_uploads(uploads_to_archive)
     removals_from_new = remove_uploads(uploads_to_new)
@@ -151,25 +175,38 @@ def remove_uploaded_packages(client=None):
                      reason='Your package was uploaded to the '
                             'NEW queue')
 
+    # Only now the packages of the NEW queue are processed, the next run can
+    # start from its current state
+    if snapshot:
+        snapshot.full_clean()
+        snapshot.save()
+
 
 def get_packages_uploaded_to_new():
-    uploads = set()
+    """
+    Returns the uploads added to the NEW queue since the last snapshot, and
+    the updated snapshot. The snapshot is to be saved once the uploads are
+    processed.
+    """
+    accepted = []
     ftp_master = ClientFTPMaster()
+    snapshot, _ = NewQueueSnapshot.objects.get_or_create(
+        url=settings.FTP_MASTER_NEW_PACKAGES_URL)
 
     try:
-        packages = ftp_master.get_packages_uploaded_to_new()
+        packages = ftp_master.get_packages_uploaded_to_new(snapshot)
     except ExceptionClient as e:
         log.warning(f'Could not retrive package uploaded to new: {e}')
-        return []
+        return (set(), None)
 
     for changes in packages:
         try:
-            uploads.update(process_accepted_changes(changes))
+            accepted.append((changes, get_accepted_version(changes)))
         except Exception as e:
             log.warning(f'Failed to process package in NEW {changes} '
                         f'{e}')
 
-    return uploads
+    return (set(find_accepted_uploads(accepted)), snapshot)
 
 
 def get_packages_uploaded_to_archive(client):
@@ -180,13 +217,15 @@ def get_packages_uploaded_to_archive(client):
     # default one. This is for testing purposes only: easier than setting up a
     # testing NNTP server.
     if not client:  # pragma: no cover
-        client = NNTPClient()
+        # Only accepted uploads are relevant
+        client = NNTPClient(subject=r'^Accepted\s')
 
     if not client.connect_to_server():
         return []
 
     for feed in feeds:
         last = feed.last
+        failed = False
 
         for msg in client.unread_messages(feed.name, feed.last):
             try:
@@ -196,8 +235,14 @@ def get_packages_uploaded_to_archive(client):
                 log.warning('Failed to process message after '
                             f'#{last} on '
                             f'{feed.name}: {e}')
+                failed = True
             else:
                 last = msg['X-Debexpo-Message-Number']
+                failed = False
+
+        # Do not list again the articles filtered out by the client
+        if not failed and feed.name in client.scanned:
+            last = client.scanned[feed.name]
 
         feed.last = last
 
@@ -246,28 +291,50 @@ def convert_mail_to_changes(mail):
     return changes
 
 
-def process_accepted_changes(changes):
+def get_accepted_version(changes):
     if not changes or \
             'Source' not in changes \
             or 'Distribution' not in changes \
             or 'Version' not in changes:
         raise Exception(f'Cannot process accepted upload: {changes}')
 
-    uploads = PackageUpload.objects.filter(
-        Q(
-            package__name=changes['Source'],
-            distribution__name__in=(changes['Distribution'], 'UNRELEASED',)
-        ) | Q(
-            package__name=changes['Source'],
-            version=changes['Version']
-        )
-    )
+    return max([NativeVersion(version) for version in
+                changes['Version'].split(' ')])
+
+
+def is_superseded_by(upload, changes, version):
+    if upload.distribution.name not in (changes['Distribution'],
+                                        'UNRELEASED',) and \
+            upload.version != changes['Version']:
+        return False
+
+    return NativeVersion(upload.version) <= version or \
+        upload.distribution.name == 'UNRELEASED'
+
 
-    version = max([NativeVersion(version) for version in
-                   changes['Version'].split(' ')])
+def find_accepted_uploads(accepted):
+    """
+    Returns the uploads superseded by accepted, a list of (changes, version)
+    tuples. All source packages are looked up in a single query.
+    """
+    sources = {}
+
+    for changes, version in accepted:
+        sources.setdefault(changes['Source'], []).append((changes, version))
+
+    if not sources:
+        return []
+
+    uploads = PackageUpload.objects \
+        .filter(package__name__in=sources) \
+        .select_related('package', 'distribution')
 
     return [
         upload for upload in uploads
-        if NativeVersion(upload.version) <= NativeVersion(version) or
-        upload.distribution.name == 'UNRELEASED'
+        if any(is_superseded_by(upload, changes, version)
+               for changes, version in sources[upload.package.name])
     ]
+
+
+def process_accepted_changes(changes):
+    return find_accepted_uploads([(changes, get_accepted_version(changes))])
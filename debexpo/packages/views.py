@@ -35,6 +35,7 @@ import datetime
 from django.conf import settings
 from django.http import HttpResponseForbidden, HttpResponseRedirect, \
     HttpResponseNotAllowed
+from django.db.models import Prefetch, prefetch_related_objects
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
 from django.utils.translation import gettext as _, get_language
@@ -43,10 +44,12 @@ from django.contrib.auth.decorators import login_required
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework_extensions.mixins import NestedViewSetMixin
 
-from debexpo.packages.models import PackageUpload, Package, SourcePackage
+from debexpo.packages.models import PackageUpload, Package, SourcePackage, \
+    BinaryPackage
 from debexpo.packages.serializers import PackageSerializer, \
     PackageUploadSerializer
 from debexpo.comments.forms import CommentForm
+from debexpo.comments.models import Comment
 from debexpo.repository.tasks import remove_from_repository
 from debexpo.tools.gitstorage import GitStorage
 from debexpo.bugs.models import Bug
@@ -73,19 +76,19 @@ class PackageGroups(object):
         if (deltamin is not None and deltamax is not None):
             self.packages = [
                 x for x in packages if
-                x.packageupload_set.latest('uploaded').uploaded <= deltamin and
-                x.packageupload_set.latest('uploaded').uploaded > deltamax
+                x.get_latest_upload().uploaded <= deltamin and
+                x.get_latest_upload().uploaded > deltamax
             ]
         elif (deltamin is None and deltamax is not None):
             self.packages = [
                 x for x in packages if
-                x.packageupload_set.latest('uploaded').uploaded > deltamax
+                x.get_latest_upload().uploaded > deltamax
             ]
         # Last actual possibility
         elif (deltamin is not None and deltamax is None):  # pragma: no branch
             self.packages = [
                 x for x in packages if
-                x.packageupload_set.latest('uploaded').uploaded <= deltamin
+                x.get_latest_upload().uploaded <= deltamin
             ]
 
 
@@ -120,7 +123,7 @@ def _get_packages(key=None, value=None):
         query = query.none()
         log.warning('Could not apply filter: %s', key)
 
-    return set(query.all())
+    return set(query.with_uploads())
 
 
 def _get_timedeltas(packages):
@@ -147,10 +150,35 @@ def _get_timedeltas(packages):
     return deltas
 
 
+def _prefetch_package(package):
+    """
+    Load everything displayed on the package page in a fixed number of
+    queries, whatever the number of uploads.
+    """
+    uploads = PackageUpload.objects \
+        .select_related('uploader', 'distribution') \
+        .prefetch_related(
+            Prefetch('sourcepackage_set',
+                     queryset=SourcePackage.objects.select_related(
+                         'section', 'priority')),
+            Prefetch('binarypackage_set',
+                     queryset=BinaryPackage.objects.order_by('pk')),
+            'pluginresults_set',
+            Prefetch('comment_set',
+                     queryset=Comment.objects.select_related('user')),
+        )
+
+    prefetch_related_objects([package], Prefetch('packageupload_set',
+                                                 queryset=uploads))
+    PackageUpload.objects.prefetch_dsc(package.packageupload_set.all())
+
+
 def package(request, name):
     package = get_object_or_404(Package, name=name)
     form = CommentForm()
 
+    _prefetch_package(package)
+
     return render(request, 'package.html', {
         'settings': settings,
         'package': package,
@@ -262,16 +290,17 @@ class PackagesFeed(Feed):
 
     def item_title(self, item):
         return '%s %s' % (
-            item.name, item.packageupload_set.latest('uploaded').version)
+            item.name, item.get_latest_upload().version)
 
     def item_link(self, item):
         return self.request.build_absolute_uri(
                 reverse('package', kwargs={'name': item.name}))
 
     def item_description(self, item):
+        upload = item.get_latest_upload()
         desc = _('Package {} uploaded by {}.').format(
             item.name,
-            item.packageupload_set.latest('uploaded').uploader.name)
+            upload.uploader.name)
         desc += '<br/><br/>'
 
         if item.needs_sponsor:
@@ -279,11 +308,11 @@ class PackagesFeed(Feed):
         else:
             desc += _('Uploader is currently not looking for a sponsor.')
 
-        binary_package = item.packageupload_set.latest('uploaded') \
-            .binarypackage_set.filter(name=item.name)
+        binary_package = [binary for binary in upload.binarypackage_set.all()
+                          if binary.name == item.name]
 
         if binary_package:
-            desc += '<br/><br/>' + binary_package.get().description \
+            desc += '<br/><br/>' + binary_package[0].description \
                     .replace('\n', '<br/>')
 
         return desc
@@ -30,12 +30,21 @@
 
 from string import ascii_lowercase
 
-from debexpo.plugins.models import BasePlugin, PluginSeverity
+from django.conf import settings
+from django.core.cache import cache
+
+from debexpo.archive.models import ArchiveSources, ArchiveSuite, \
+    ArchivePackage
+from debexpo.plugins.models import BasePlugin, PluginSeverity, PluginResource
 from debexpo.tools.clients.tracker import ClientTracker, ExceptionClientTracker
 from debexpo.tools.clients import ExceptionClient
 
+LAST_UPLOAD_CACHE_PREFIX = 'debian-qa-last-upload'
+
 
 class PluginDebianQA(BasePlugin):
+    resource = PluginResource.network
+
     @property
     def name(self):
         return 'debian-qa'
@@ -88,10 +97,45 @@ class PluginDebianQA(BasePlugin):
 
         return package
 
+    def _get_last_upload(self, name):
+        key = f'{LAST_UPLOAD_CACHE_PREFIX}:{name}'
+        last_upload = cache.get(key)
+
+        if last_upload is None:
+            package = self._fetch_from_tracker(name)
+
+            if not package:
+                return None
+
+            last_upload = getattr(package, 'last_upload', '')
+            cache.set(key, last_upload,
+                      timeout=settings.DEBIAN_QA_LAST_UPLOAD_CACHE_TIME)
+
+        return last_upload or None
+
+    def _fetch_package(self, name):
+        # Use the local archive index when available. The tracker is then only
+        # used for the date of the last upload, kept in cache, or when the
+        # package is missing from an outdated index.
+        if not ArchiveSources.objects.is_available():
+            return self._fetch_from_tracker(name)
+
+        package = ArchivePackage.objects.get_package(name)
+
+        if not package:
+            if ArchiveSuite.objects.is_fresh():
+                return None
+
+            return self._fetch_from_tracker(name)
+
+        package.last_upload = self._get_last_upload(name)
+
+        return package
+
     def run(self, changes, source):
         """Run the Debian QA tests"""
 
-        self.package = self._fetch_from_tracker(changes.source)
+        self.package = self._fetch_package(changes.source)
 
         self.outcome = ''
         self.data = {'in_debian': bool(self.package)}
@@ -31,15 +31,26 @@
 from subprocess import TimeoutExpired, CalledProcessError
 from os.path import dirname
 
-from debexpo.plugins.models import BasePlugin, PluginSeverity
+from debexpo.plugins.models import BasePlugin, PluginSeverity, PluginResource
 from debexpo.tools.proc import debexpo_exec
 
 
 class PluginDiffClean(BasePlugin):
+    resource = PluginResource.process
+
     @property
     def name(self):
         return 'diff-clean'
 
+    def get_cache_inputs(self, changes, source):
+        for item in changes.files.files:
+            if str(item).endswith('.diff.gz'):
+                checksum = item.checksums.get('sha256')
+
+                return [checksum] if checksum else None
+
+        return []
+
     def _run_diffstat(self, diff_file):
         try:
             output = debexpo_exec("diffstat", ["-p1", diff_file],
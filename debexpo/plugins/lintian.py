@@ -29,15 +29,42 @@
 #   OTHER DEALINGS IN THE SOFTWARE.
 
 from bisect import insort
+from os import stat
 from os.path import dirname
 from collections import defaultdict
+from functools import lru_cache
+from shutil import which
 from subprocess import CalledProcessError, TimeoutExpired
 
-from debexpo.plugins.models import BasePlugin, PluginSeverity
+from debexpo.plugins.models import BasePlugin, PluginSeverity, PluginResource
+from debexpo.tools.files import CheckSumedFile, ExceptionCheckSumedFile
 from debexpo.tools.proc import debexpo_exec
 
 
+def _get_lintian_version():
+    # Cached for the installed lintian binary: upgrading lintian replaces it
+    path = which('lintian')
+
+    if not path:
+        return None
+
+    info = stat(path)
+
+    return _read_lintian_version(path, info.st_dev, info.st_ino,
+                                 info.st_mtime_ns)
+
+
+@lru_cache(maxsize=4)
+def _read_lintian_version(path, *identity):
+    try:
+        return debexpo_exec(path, ['--version']).strip()
+    except (OSError, CalledProcessError, TimeoutExpired):
+        return None
+
+
 class PluginLintian(BasePlugin):
+    resource = PluginResource.process
+
     levels = {
         'X': {'name': 'Experimental', 'severity': PluginSeverity.info,
               'outcome': 'Package has lintian experimental tags'},
@@ -57,6 +84,28 @@ class PluginLintian(BasePlugin):
     def name(self):
         return 'lintian'
 
+    def get_cache_inputs(self, changes, source):
+        # Lintian checks the changes, the uploaded files and the target
+        # distribution
+        try:
+            inputs = [changes.distribution, f'{changes} ' + CheckSumedFile(
+                changes.filename).compute_checksums(('sha256',))['sha256']]
+        except ExceptionCheckSumedFile:
+            return None
+
+        for item in changes.files.files:
+            checksum = item.checksums.get('sha256')
+
+            if not checksum:
+                return None
+
+            inputs.append(f'{item} {checksum}')
+
+        return sorted(inputs)
+
+    def get_version(self):
+        return _get_lintian_version()
+
     def _run_lintian(self, changes, source):
         try:
             output = debexpo_exec("lintian",
@@ -28,17 +28,23 @@
 #   OTHER DEALINGS IN THE SOFTWARE.
 
 from abc import ABCMeta, abstractmethod
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger
 from enum import Enum
+from hashlib import sha256
 from json import dumps, loads
 from os.path import abspath, dirname, isfile, join
+from time import perf_counter, thread_time
 from traceback import format_exc
 
-from django.db import models
+from django.core.cache import cache
+from django.db import models, connection
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
 from debexpo.packages.models import PackageUpload
+from debexpo.tools.cache import increment_counter
 from debexpo.tools.debian.changes import Changes
 from debexpo.tools.debian.source import Source
 
@@ -72,6 +78,23 @@ class PluginSeverity(int, Enum):
                 cls.failed.tuple,)
 
 
+class PluginResource(Enum):
+    """
+    Main resource a plugin spends its time on.
+    """
+    # Runs in the interpreter only: no gain running it concurrently.
+    python = 'python'
+    # Spends its time waiting on external programs.
+    process = 'process'
+    # Spends its time waiting on network requests.
+    network = 'network'
+
+
+PluginTiming = namedtuple('PluginTiming', ['wall', 'cpu'])
+
+PLUGIN_CACHE_PREFIX = 'plugin-results'
+
+
 class PluginResults(models.Model):
     upload = models.ForeignKey(PackageUpload, on_delete=models.CASCADE)
 
@@ -110,6 +133,7 @@ class PluginResults(models.Model):
 class PluginManager():
     def __init__(self):
         self.plugins = []
+        self.timings = {}
 
         self._load_plugins()
 
@@ -125,13 +149,126 @@ class PluginManager():
                             f'{module_name}: {format_exc()}')
 
     def run(self, changes, source):
-        for plugin in self.plugins:
-            try:
-                plugin.run(changes, source)
-            except Exception as e:
-                log.warning(f'Plugin {plugin.name} failed: {format_exc()}')
-                plugin.add_result(plugin.name, str(e), None,
-                                  PluginSeverity.failed)
+        """
+        Run all plugins on an upload.
+
+        When IMPORTER_PLUGIN_WORKERS is greater than 1, plugins waiting on
+        external programs or network run concurrently in a thread pool while
+        pure-Python plugins run in the calling thread. Results are always
+        returned in the configured plugin order.
+        """
+        workers = getattr(settings, 'IMPORTER_PLUGIN_WORKERS', 1)
+        concurrent = []
+
+        if workers > 1:
+            concurrent = [plugin for plugin in self.plugins
+                          if plugin.resource != PluginResource.python]
+
+        if not concurrent:
+            for plugin in self.plugins:
+                self._run_plugin(plugin, changes, source)
+
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._run_plugin_in_thread, plugin,
+                                       changes, source)
+                       for plugin in concurrent]
+
+            for plugin in self.plugins:
+                if plugin not in concurrent:
+                    self._run_plugin(plugin, changes, source)
+
+            for future in futures:
+                future.result()
+
+    def _run_plugin_in_thread(self, plugin, changes, source):
+        try:
+            self._run_plugin(plugin, changes, source)
+        finally:
+            # Each thread uses its own database connection
+            connection.close()
+
+    def _run_plugin(self, plugin, changes, source):
+        wall = perf_counter()
+        cpu = thread_time()
+
+        try:
+            key = self._get_cache_key(plugin, changes, source)
+
+            if key and self._load_cached_results(plugin, key):
+                return
+
+            plugin.run(changes, source)
+
+            if key:
+                self._store_cached_results(plugin, key)
+        except Exception as e:
+            log.warning(f'Plugin {plugin.name} failed: {format_exc()}')
+            plugin.add_result(plugin.name, str(e), None,
+                              PluginSeverity.failed)
+        finally:
+            self.timings[plugin.name] = PluginTiming(perf_counter() - wall,
+                                                     thread_time() - cpu)
+            log.debug(f'Plugin {plugin.name} ran in '
+                      f'{self.timings[plugin.name].wall:.3f}s '
+                      f'({self.timings[plugin.name].cpu:.3f}s CPU)')
+
+    def _get_cache_key(self, plugin, changes, source):
+        if not getattr(settings, 'IMPORTER_PLUGIN_CACHE_TIME', 0):
+            return None
+
+        inputs = plugin.get_cache_inputs(changes, source)
+
+        if inputs is None:
+            return None
+
+        version = plugin.get_version()
+
+        if version is None:
+            return None
+
+        digest = sha256()
+
+        for item in inputs:
+            digest.update(item.encode() + b'\0')
+
+        return f'{PLUGIN_CACHE_PREFIX}:{plugin.name}:{version}:' \
+               f'{digest.hexdigest()}'
+
+    def _load_cached_results(self, plugin, key):
+        results = cache.get(key)
+
+        if results is None:
+            increment_counter(f'{PLUGIN_CACHE_PREFIX}:misses')
+            return False
+
+        increment_counter(f'{PLUGIN_CACHE_PREFIX}:hits')
+        plugin.results = [PluginResults(plugin=plugin.name, test=test,
+                                        outcome=outcome, json=json,
+                                        severity=severity)
+                          for test, outcome, json, severity in results]
+        log.debug(f'Plugin {plugin.name} results loaded from cache')
+
+        return True
+
+    def _store_cached_results(self, plugin, key):
+        cache.set(key, [(result.test, result.outcome, result.json,
+                         result.severity) for result in plugin.results],
+                  timeout=settings.IMPORTER_PLUGIN_CACHE_TIME)
+
+    @staticmethod
+    def get_cache_stats():
+        """
+        Returns the number of plugin runs served from (hits) or missing from
+        (misses) the results cache.
+        """
+        counters = ('hits', 'misses')
+        stats = cache.get_many([f'{PLUGIN_CACHE_PREFIX}:{counter}'
+                                for counter in counters])
+
+        return {counter: stats.get(f'{PLUGIN_CACHE_PREFIX}:{counter}', 0)
+                for counter in counters}
 
     @property
     def results(self):
@@ -144,6 +281,8 @@ class PluginManager():
 
 
 class BasePlugin(metaclass=ABCMeta):
+    resource = PluginResource.python
+
     def __init__(self):
         self.results = []
 
@@ -158,6 +297,22 @@ class BasePlugin(metaclass=ABCMeta):
         # We cannot cover abstract methods
         pass  # pragma: nocover
 
+    def get_cache_inputs(self, changes: Changes, source: Source):
+        """
+        Returns a list of strings identifying the content the plugin results
+        depend on, or None if its results must not be cached (the default).
+
+        Results are reused for uploads with the same inputs and plugin version.
+        """
+        return None
+
+    def get_version(self):
+        """
+        Returns the version of the plugin, or of the tool it runs, used to
+        invalidate cached results. None disables caching.
+        """
+        return ''
+
     def add_result(self, test, outcome, data=None, severity=None):
         """
         Adds a PluginResult for a passed test to the result list.
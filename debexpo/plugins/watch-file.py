@@ -32,11 +32,13 @@ from subprocess import TimeoutExpired, CalledProcessError
 import os
 from xml.etree import ElementTree
 
-from debexpo.plugins.models import BasePlugin, PluginSeverity
+from debexpo.plugins.models import BasePlugin, PluginSeverity, PluginResource
 from debexpo.tools.proc import debexpo_exec
 
 
 class PluginWatchFile(BasePlugin):
+    resource = PluginResource.process
+
     @property
     def name(self):
         return 'watch-file'
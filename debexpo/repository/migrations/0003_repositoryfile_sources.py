@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repository', '0002_change_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repositoryfile',
+            name='sources',
+            field=models.TextField(blank=True, null=True,
+                                   verbose_name='Sources entry'),
+        ),
+    ]
@@ -39,6 +39,7 @@ from django.db import transaction, models
 from django.utils.translation import gettext_lazy as _
 
 from debexpo.tools.debian.dsc import Dsc
+from debexpo.tools.files import CheckSumedFile, install_file
 from debexpo.tools.cache import enforce_unique_instance
 
 log = logging.getLogger(__name__)
@@ -79,6 +80,11 @@ class RepositoryFile(models.Model):
     size = models.IntegerField(verbose_name=_('Size'))
     sha256sum = models.CharField(max_length=64, verbose_name=_('SHA256'))
 
+    # Sources entry computed from the dsc at install time, to avoid parsing
+    # again all dsc in the pool when generating the Sources files.
+    sources = models.TextField(null=True, blank=True,
+                               verbose_name=_('Sources entry'))
+
     objects = RepositoryFileManager()
 
     class Meta:
@@ -155,6 +161,32 @@ class Repository():
         # Get a nice rfc822 output of this source, now Sources, entry.
         return source.dump()
 
+    def _get_sources_entry(self, repository_file):
+        """
+        Returns the Sources entry for a dsc file, using the entry stored at
+        install time when available.
+
+        ``repository_file``
+            RepositoryFile instance of the dsc.
+        """
+        if not repository_file.sources:
+            # Entries installed before the Sources entry was stored in the
+            # database are computed and saved once.
+            repository_file.sources = self._dsc_to_sources(repository_file)
+
+            if repository_file.sources:
+                repository_file.save(update_fields=['sources'])
+
+            return repository_file.sources
+
+        filename = join(self.repository, repository_file.path)
+
+        if not isfile(filename):
+            log.critical(f'Cannot find file {filename}')
+            return ''
+
+        return repository_file.sources
+
     def get_sources_file(self, distribution, component):
         """
         Does a query to find all packages that fit the criteria of distribution
@@ -177,7 +209,7 @@ class Repository():
 
         # Loop through dsc files.
         for dsc in dscfiles:
-            packages_entry = self._dsc_to_sources(dsc)
+            packages_entry = self._get_sources_entry(dsc)
             if not packages_entry.strip():
                 log.warn('Eek, broken packages entry: %s', dsc)
                 continue
@@ -262,6 +294,14 @@ class Repository():
             for previous_entry in previous_entries:
                 self.remove(previous_entry.package, previous_entry.version)
 
+    def _is_installed(self, sumed_file, dest):
+        if not isfile(dest) or 'sha256' not in sumed_file.checksums:
+            return False
+
+        installed = CheckSumedFile(dest).compute_checksums(('sha256',))
+
+        return installed['sha256'] == sumed_file.checksums['sha256']
+
     def _install_new_entries(self, files_to_install, pool_dir, changes):
         dest_dir = join(self.repository, pool_dir)
 
@@ -269,13 +309,22 @@ class Repository():
             if not isdir(dest_dir):
                 makedirs(dest_dir)
 
-            copy(sumed_file.filename, dest_dir)
-            chmod(join(dest_dir, basename(sumed_file.filename)), 0o644)
+            dest = join(dest_dir, basename(sumed_file.filename))
+
+            # Re-uploads of an identical file (ie. orig tarball) are no-ops.
+            # The spool files are removed after the import, so they are
+            # linked into the pool.
+            if not self._is_installed(sumed_file, dest):
+                install_file(sumed_file.filename, dest, 0o644, owned=True)
+
             # And create a new one
             entry = RepositoryFile.objects.create_from_file(sumed_file,
                                                             pool_dir,
                                                             changes)
             if entry:
+                if entry.path.endswith('.dsc'):
+                    entry.sources = self._dsc_to_sources(entry)
+
                 entry.full_clean()
                 entry.save()
 
@@ -308,13 +357,51 @@ class Repository():
         if version:
             repository_files = repository_files.filter(version=version)
 
+        self._remove_files(list(repository_files))
+
+    @transaction.atomic
+    def remove_versions(self, versions):
+        """
+        Removes several versions of packages from the repository at once.
+
+        ``versions``
+            Iterable of (package, version) tuples.
+        """
+        versions = set(versions)
+        packages = set(package for package, _ in versions)
+
+        self._remove_files([
+            repository_file for repository_file in
+            RepositoryFile.objects.filter(package__in=packages)
+            if (repository_file.package, repository_file.version) in versions
+        ])
+
+    def _remove_files(self, repository_files):
+        if not repository_files:
+            return
+
+        ids = set(repository_file.id for repository_file in repository_files)
+        paths = set(repository_file.path
+                    for repository_file in repository_files)
+
+        # Files still referenced by other packages or versions (ie. orig
+        # tarballs) are kept in the pool
+        shared = set(RepositoryFile.objects.filter(path__in=paths)
+                     .exclude(id__in=ids)
+                     .values_list('path', flat=True))
+
+        unlinked = set()
+
         for repository_file in repository_files:
             path = join(self.repository, repository_file.path)
-            if isfile(path):
-                if not repository_file.is_shared():
+
+            if repository_file.path in unlinked or isfile(path):
+                if repository_file.path not in shared and \
+                        repository_file.path not in unlinked:
                     unlink(path)
+                    unlinked.add(repository_file.path)
 
                 self.pending.add((repository_file.distribution,
                                   repository_file.component,))
 
-            repository_file.delete()
+        RepositoryFile.objects.filter(id__in=ids).delete()
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
     'debexpo.plugins',
     'debexpo.bugs',
     'debexpo.nntp',
+    'debexpo.archive',
     'rest_framework',
     'django_filters',
 ]
@@ -163,6 +164,10 @@ SMTP_PORT = 25
 # SMTP_PASSWORD = 'CHANGEME'
 
 NNTP_SERVER = 'news.gmane.io'
+NNTP_PORT = 119
+# Messages listed at once and concurrent connections to fetch them
+NNTP_BATCH_SIZE = 500
+NNTP_WORKERS = 4
 
 # Debexpo User model
 AUTH_USER_MODEL = 'accounts.User'
@@ -195,6 +200,14 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'debexpo.packages.tasks.remove_uploaded_packages',
         'schedule': 60 * 10,  # Every 10 minutes
     },
+    'refresh-bugs': {
+        'task': 'debexpo.bugs.tasks.refresh_bugs',
+        'schedule': 60 * 60,  # Every hours
+    },
+    'refresh-archive-index': {
+        'task': 'debexpo.archive.tasks.refresh_archive_index',
+        'schedule': 60 * 60,  # Every hours
+    },
 }
 
 # Account registration expiration
@@ -203,6 +216,13 @@ REGISTRATION_EXPIRATION_DAYS = 7
 # Email update token expiration (2 days to get at the very least 24h)
 EMAIL_CHANGE_TIMEOUT_DAYS = 2
 
+# Emails are delivered by a celery task in batches of EMAIL_BATCH_SIZE
+# messages. Failed messages are retried EMAIL_MAX_RETRIES times, after
+# EMAIL_RETRY_DELAY seconds, doubled on each retry
+EMAIL_BATCH_SIZE = 100
+EMAIL_MAX_RETRIES = 5
+EMAIL_RETRY_DELAY = 60
+
 # Plugins to load
 IMPORTER_PLUGINS = (
     ('debexpo.plugins.distribution', 'PluginDistribution',),
@@ -225,17 +245,75 @@ LIMIT_SIZE_DOWNLOAD = 100 * 1024 * 1024
 # Bug plugin settings
 BUGS_REPORT_NOT_OPEN = True
 
+# Refresh bugs status from the BTS after NN seconds
+BUGS_SYNC_TIME = 6 * 60 * 60
+
+# Number of bugs fetched from the BTS in a single request
+BUGS_SYNC_BATCH_SIZE = 500
+
 # Debian tracker access
 TRACKER_URL = 'https://tracker.debian.org'
 FTP_MASTER_NEW_PACKAGES_URL = 'https://ftp-master.debian.org/new.822'
 FTP_MASTER_API_URL = 'https://api.ftp-master.debian.org'
 
+# HKP keyserver: responses are cached for HKP_CACHE_TIME seconds or until a
+# key is modified, and searches return at most HKP_MAX_RESULTS keys. Text
+# searches need at least HKP_MIN_SEARCH_LENGTH characters
+HKP_CACHE_TIME = 24 * 60 * 60
+HKP_MAX_RESULTS = 100
+HKP_MIN_SEARCH_LENGTH = 3
+
+# Local index of the Debian archive, used instead of querying ftp-master and
+# the tracker for each upload. It is built from the Sources files (plain, gzip
+# or xz) of all suites of a local mirror (DEBIAN_ARCHIVE_MIRROR, its root
+# directory) and of DEBIAN_ARCHIVE_SOURCES, mapping suites to Sources files.
+# Suites not refreshed for DEBIAN_ARCHIVE_INDEX_MAX_AGE seconds are outdated and
+# looked up remotely. The date of the last upload of indexed packages is taken
+# from the tracker and kept DEBIAN_QA_LAST_UPLOAD_CACHE_TIME seconds.
+DEBIAN_ARCHIVE_MIRROR = None
+DEBIAN_ARCHIVE_SOURCES = {}
+DEBIAN_ARCHIVE_INDEX_MAX_AGE = 3 * 60 * 60
+DEBIAN_QA_LAST_UPLOAD_CACHE_TIME = 24 * 60 * 60
+
+# Cache network resources (in seconds, 0 disables the cache). Can be set per
+# client with HTTP_CACHE_TIME_<CLIENT>
+HTTP_CACHE_TIME = 0
+HTTP_CACHE_TIME_FTP_MASTER = 15 * 60
+HTTP_CACHE_TIME_TRACKER = 60 * 60
+
 # Cleanup package older than NN weeks
 MAX_AGE_UPLOAD_WEEKS = 20
 
+# Number of expired package/distribution removed at once
+MAX_AGE_UPLOAD_BATCH_SIZE = 100
+
 # Cleanup incoming queue
 QUEUE_EXPIRED_TIME = 6 * 60 * 60  # File TTL is 6 hours
 
+# Reject uploads still missing files after NN seconds without any progress
+QUEUE_INCOMPLETE_TIME = 10 * 60
+
+# Number of source packages imported concurrently by the importer
+IMPORTER_WORKERS = 1
+
+# Number of plugins waiting on external programs or network run concurrently
+# on an upload (1 runs all plugins sequentially)
+IMPORTER_PLUGIN_WORKERS = 4
+
+# Keep results of plugins supporting it for identical uploads (in seconds, 0
+# disables the cache)
+IMPORTER_PLUGIN_CACHE_TIME = 7 * 24 * 60 * 60
+
+# Run the importer as soon as all files of an upload are in the spool
+IMPORTER_TRIGGER_ON_UPLOAD = True
+
+# Upper bounds (in seconds) of the histogram buckets of import stage durations,
+# exported on /metrics
+IMPORTER_METRICS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Addresses or networks allowed to read /metrics (empty disables the endpoint)
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
 # API settings
 REST_FRAMEWORK = {
     # Filtering
@@ -80,6 +80,9 @@ REPOSITORY = '/var/lib/debexpo/repository'
 # Git storage (comment to disable)
 GIT_STORAGE = '/var/lib/debexpo/git'
 
+# Persistent keyring used to verify signatures (comment to disable)
+GPG_KEYRING = '/var/lib/debexpo/keyring'
+
 # Email settings
 # https://docs.djangoproject.com/en/2.2/ref/settings/#email
 
@@ -74,6 +74,18 @@ REPOSITORY = '/tmp/debexpo/repository'
 # Git storage location
 GIT_STORAGE = '/tmp/debexpo/git'
 
+# Persistent keyring used to verify signatures, set to a temporary directory
+# by the test controllers
+GPG_KEYRING = None
+
+# Don't reuse plugin results between tests
+IMPORTER_PLUGIN_CACHE_TIME = 0
+
+# Don't cache network resources between tests
+HTTP_CACHE_TIME_FTP_MASTER = 0
+HTTP_CACHE_TIME_TRACKER = 0
+DEBIAN_QA_LAST_UPLOAD_CACHE_TIME = 0
+
 # Use fakeredis for testing
 CACHES = {
     "default": {
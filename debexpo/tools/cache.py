@@ -31,6 +31,10 @@ from contextlib import contextmanager
 from django.core.cache import cache
 
 
+class ExceptionTaskRunning(Exception):
+    pass
+
+
 @contextmanager
 def enforce_unique_instance(task, timeout=2*60*60, blocking=False):
     # timeout in seconds, default 2 hours.
@@ -39,8 +43,23 @@ def enforce_unique_instance(task, timeout=2*60*60, blocking=False):
     # Calling tasks in tests is done synchronisly, without risks of concurrency.
     # This has to be tested manually
     if not lock.acquire(blocking=blocking):  # pragma: no cover
-        raise Exception(f'Task {task} is already running. Aborting.')
+        raise ExceptionTaskRunning(f'Task {task} is already running. '
+                                   'Aborting.')
     try:
         yield lock
     finally:
         lock.release()
+
+
+def increment_counter(key, delta=1):
+    """
+    Atomically increment a counter kept in the cache, without expiration.
+    Shared by all processes, unlike in-memory counters.
+    """
+    cache.add(key, 0, timeout=None)
+
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Key evicted in between
+        cache.add(key, delta, timeout=None)
@@ -27,13 +27,34 @@
 #   OTHER DEALINGS IN THE SOFTWARE.
 
 import json
-from urllib.request import urlopen
-from urllib.parse import urlencode
+from hashlib import sha256
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from logging import getLogger
+from threading import local
+from time import perf_counter, time
+from urllib.error import HTTPError
+from urllib.request import Request, getproxies, proxy_bypass, urlopen
+from urllib.parse import urlencode, urljoin, urlsplit
 from tempfile import NamedTemporaryFile
 from os import replace
 from os.path import dirname
 
 from django.conf import settings
+from django.core.cache import cache
+
+from debexpo.tools.cache import increment_counter
+
+log = getLogger(__name__)
+
+# Keep cached resources having validators this long after they expired, to be
+# revalidated with a conditional request.
+HTTP_CACHE_STALE_TIME = 24 * 60 * 60
+
+HTTP_CACHE_PREFIX = 'http-client'
+HTTP_METRICS_PREFIX = 'http-client-metrics'
+HTTP_REDIRECT_CODES = (301, 302, 303, 307, 308)
+HTTP_MAX_REDIRECTS = 5
+HTTP_TIMEOUT = 30
 
 
 class ExceptionClient(Exception):
@@ -50,15 +71,124 @@ class ExceptionClientSize(ExceptionClient):
 
 
 class ClientHTTP():
-    def _connect(self, url):
+    """
+    HTTP client keeping connections alive per host and thread.
+
+    Resources retrieved with fetch_resource() are cached for
+    HTTP_CACHE_TIME_<NAME> seconds (HTTP_CACHE_TIME for clients without
+    specific setting), limited by the Cache-Control header sent by the server.
+    Expired resources are revalidated using their ETag or Last-Modified header.
+    """
+    name = 'http'
+
+    _pool = local()
+
+    def _get_connection(self, scheme, netloc):
+        connections = getattr(self._pool, 'connections', None)
+
+        if connections is None:
+            connections = self._pool.connections = {}
+
+        connection = connections.get((scheme, netloc))
+
+        if not connection:
+            if scheme == 'https':
+                connection = HTTPSConnection(netloc, timeout=HTTP_TIMEOUT)
+            elif scheme == 'http':
+                connection = HTTPConnection(netloc, timeout=HTTP_TIMEOUT)
+            else:
+                raise ExceptionClient(f'Unsupported url scheme: {scheme}')
+
+            connections[(scheme, netloc)] = connection
+
+        return connection
+
+    def _drop_connection(self, scheme, netloc):
+        connections = getattr(self._pool, 'connections', {})
+        connection = connections.pop((scheme, netloc), None)
+
+        if connection:
+            connection.close()
+
+    def _abort(self, request):
+        # The connection still holds the rest of the response, it cannot be
+        # used for another request.
+        request.close()
+
+        if request.url:
+            parts = urlsplit(request.url)
+            self._drop_connection(parts.scheme, parts.netloc)
+
+    def _uses_proxy(self, parts):
+        return parts.scheme in getproxies() and \
+            not proxy_bypass(parts.hostname or '')
+
+    def _send_with_proxy(self, url, headers):
         try:
-            request = urlopen(url, timeout=30)
-        except IOError as e:
+            return urlopen(Request(url, headers=headers), timeout=HTTP_TIMEOUT)
+        except HTTPError as e:
+            return e
+
+    def _send(self, url, headers):
+        parts = urlsplit(url)
+
+        if self._uses_proxy(parts):
+            return self._send_with_proxy(url, headers)
+
+        target = parts.path or '/'
+
+        if parts.query:
+            target = f'{target}?{parts.query}'
+
+        connection = self._get_connection(parts.scheme, parts.netloc)
+        # Only a connection already opened by a previous request can have been
+        # closed by the server in between
+        reused = connection.sock is not None
+
+        try:
+            connection.request('GET', target, headers=headers)
+            response = connection.getresponse()
+            response.url = url
+
+            return response
+        except (HTTPException, OSError):
+            self._drop_connection(parts.scheme, parts.netloc)
+
+            if not reused:
+                raise
+
+        return self._send(url, headers)
+
+    def _request(self, url, headers):
+        for redirect in range(HTTP_MAX_REDIRECTS + 1):
+            response = self._send(url, headers)
+            location = response.headers.get('Location')
+
+            if response.status not in HTTP_REDIRECT_CODES or not location:
+                return response
+
+            response.read()
+            url = urljoin(url, location)
+
+        raise ExceptionClient('Too many redirects')
+
+    def _connect(self, url, headers=None):
+        try:
+            request = self._request(url, headers or {})
+        except (HTTPException, IOError) as e:
             raise ExceptionClient('Failed to connect to network resource.\n'
                                   f'Url was: {url}\n\n{e}')
 
-        size = request.info().get('Content-Length')
+        if request.status >= 400:
+            self._abort(request)
+            raise ExceptionClient('Failed to connect to network resource.\n'
+                                  f'Url was: {url}\n\n'
+                                  f'HTTP Error {request.status}: '
+                                  f'{request.reason}')
+
+        size = request.headers.get('Content-Length')
         if size and int(size) > settings.LIMIT_SIZE_DOWNLOAD:
+            self._abort(request)
             raise ExceptionClientSize(url)
 
         return request
@@ -72,18 +202,194 @@ class ClientHTTP():
 
         # Catch network interruption issues.
         # Excluded from testing since recreating those condition are complex
-        except IOError as e:  # pragma: no cover
+        except (HTTPException, IOError) as e:  # pragma: no cover
             raise ExceptionClient('Failed to connect to network resource.\n'
                                   f'Url was: {url}\n\n{e}')
 
         return content
 
+    def _read_all(self, url, request):
+        chunks = []
+        size = 0
+
+        while True:
+            chunk = self._read(url, request, 4 * 1024 * 1024)
+
+            if not chunk:
+                break
+
+            chunks.append(chunk)
+            size += len(chunk)
+
+            if size > settings.LIMIT_SIZE_DOWNLOAD:
+                self._abort(request)
+                raise ExceptionClientSize(url)
+
+        return b''.join(chunks)
+
+    def _get_cache_time(self):
+        return getattr(settings, f'HTTP_CACHE_TIME_{self.name.upper()}',
+                       getattr(settings, 'HTTP_CACHE_TIME', 0))
+
+    def _get_freshness(self, request, cache_time):
+        directives = {}
+        cache_control = request.headers.get('Cache-Control') or ''
+
+        for directive in cache_control.split(','):
+            name, _, value = directive.strip().partition('=')
+            directives[name.lower()] = value
+
+        if 'no-store' in directives:
+            return None
+
+        if 'no-cache' in directives:
+            return 0
+
+        try:
+            return min(cache_time, int(directives['max-age']))
+        except (KeyError, ValueError):
+            return cache_time
+
+    def _store(self, key, url, request, content, cache_time):
+        freshness = self._get_freshness(request, cache_time)
+
+        if freshness is None:
+            return
+
+        entry = {
+            'url': url,
+            'content': content,
+            'expires': time() + freshness,
+            'etag': request.headers.get('ETag'),
+            'last_modified': request.headers.get('Last-Modified'),
+        }
+        timeout = freshness
+
+        if entry['etag'] or entry['last_modified']:
+            timeout += HTTP_CACHE_STALE_TIME
+
+        if timeout > 0:
+            cache.set(key, entry, timeout=timeout)
+
+    def _get_endpoint(self, url):
+        parts = urlsplit(url)
+        path = parts.path.strip('/').split('/')[0]
+
+        return f'{self.name}:{parts.netloc}/{path}'
+
+    def _record(self, url, elapsed, hit):
+        # Counters are kept in the cache to be shared by all processes
+        endpoint = self._get_endpoint(url)
+        endpoints = cache.get(f'{HTTP_METRICS_PREFIX}:endpoints') or []
+
+        if endpoint not in endpoints:
+            cache.set(f'{HTTP_METRICS_PREFIX}:endpoints',
+                      sorted(set(endpoints) | {endpoint}), timeout=None)
+
+        increment_counter(f'{HTTP_METRICS_PREFIX}:{endpoint}:requests')
+        increment_counter(f'{HTTP_METRICS_PREFIX}:{endpoint}:hits', int(hit))
+        # Redis only increments integers, the time is kept in microseconds
+        increment_counter(f'{HTTP_METRICS_PREFIX}:{endpoint}:time',
+                          round(elapsed * 1000000))
+
+        log.debug(f'Fetched {url} in {elapsed:.3f}s '
+                  f'({"cached" if hit else "not cached"})')
+
+    @classmethod
+    def get_stats(cls):
+        """
+        Returns, for each endpoint, the number of requests, how many of them
+        were served from the cache and the total time spent in seconds.
+        """
+        endpoints = cache.get(f'{HTTP_METRICS_PREFIX}:endpoints') or []
+        values = cache.get_many([f'{HTTP_METRICS_PREFIX}:{endpoint}:{field}'
+                                 for endpoint in endpoints
+                                 for field in ('requests', 'hits', 'time')])
+        stats = {}
+
+        for endpoint in endpoints:
+            prefix = f'{HTTP_METRICS_PREFIX}:{endpoint}'
+            stats[endpoint] = {
+                'requests': values.get(f'{prefix}:requests', 0),
+                'hits': values.get(f'{prefix}:hits', 0),
+                'time': values.get(f'{prefix}:time', 0) / 1000000,
+            }
+
+        return stats
+
     def fetch_resource(self, url, params=None):
         if params:
             url = f'{url}?{urlencode(params)}'
 
-        request = self._connect(url)
-        return self._read(url, request)
+        cache_time = self._get_cache_time()
+        key = f'{HTTP_CACHE_PREFIX}:{sha256(url.encode()).hexdigest()}'
+        entry = cache.get(key) if cache_time else None
+        headers = {}
+        start = perf_counter()
+
+        if entry and entry['url'] == url:
+            if entry['expires'] > time():
+                self._record(url, perf_counter() - start, True)
+
+                return entry['content']
+
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        else:
+            entry = None
+
+        request = self._connect(url, headers)
+
+        if entry and request.status == 304:
+            request.read()
+            self._store(key, url, request, entry['content'], cache_time)
+            self._record(url, perf_counter() - start, True)
+
+            return entry['content']
+
+        content = self._read_all(url, request)
+
+        if cache_time:
+            self._store(key, url, request, content, cache_time)
+
+        self._record(url, perf_counter() - start, False)
+
+        return content
+
+    def fetch_modified_resource(self, url, etag=None, last_modified=None):
+        """
+        Fetches url, bypassing the cache, unless it was not modified since the
+        response with the given ETag or Last-Modified header.
+
+        Returns a (content, etag, last_modified) tuple, content being None when
+        the resource was not modified.
+        """
+        headers = {}
+        start = perf_counter()
+
+        if etag:
+            headers['If-None-Match'] = etag
+
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        request = self._connect(url, headers)
+
+        if request.status == 304:
+            request.read()
+            content = None
+        else:
+            content = self._read_all(url, request)
+            etag = last_modified = None
+
+        self._record(url, perf_counter() - start, content is None)
+
+        return (content,
+                request.headers.get('ETag') or etag,
+                request.headers.get('Last-Modified') or last_modified)
 
     def download_to_file(self, url, filename):
         request = self._connect(url)
@@ -99,6 +405,7 @@ class ClientHTTP():
                 tempfile.write(chunk)
 
                 if tempfile.tell() > settings.LIMIT_SIZE_DOWNLOAD:
+                    self._abort(request)
                     raise ExceptionClientSize(url)
 
         replace(tempfile.name, filename)
@@ -36,6 +36,8 @@ from debexpo.tools.clients import ClientHTTP, ExceptionClientSize, \
 
 
 class ClientDebianArchive(ClientHTTP):
+    name = 'debian_archive'
+
     def fetch_from_pool(self, package, component, filename, dest_dir):
         pool = repository.Repository.get_pool(package)
         url = f'{settings.DEBIAN_ARCHIVE_URL}/pool/{component}/{pool}/' \
@@ -39,6 +39,8 @@ log = getLogger(__name__)
 
 
 class ClientFTPMasterAPI(ClientJsonAPI):
+    name = 'ftp_master'
+
     def get_origin_files(self, name, version):
         api = settings.FTP_MASTER_API_URL
         pool = repository.Repository.get_pool(name)
@@ -85,8 +87,27 @@ class ClientFTPMasterAPI(ClientJsonAPI):
 
 
 class ClientFTPMaster(ClientHTTP):
-    def get_packages_uploaded_to_new(self):
+    name = 'ftp_master'
+
+    def get_packages_uploaded_to_new(self, snapshot=None):
+        """
+        Returns the changes of the packages in the NEW queue.
+
+        With a snapshot of the queue, only the packages added since are
+        returned and the snapshot is updated (but not saved). The queue is
+        only downloaded if it changed.
+        """
         packages = []
+
+        if snapshot:
+            content, etag, last_modified = self.fetch_modified_resource(
+                snapshot.url, snapshot.etag, snapshot.last_modified)
+
+            if content is None:
+                return packages
+
+            return snapshot.update(content, etag, last_modified)
+
         content = self.fetch_resource(settings.FTP_MASTER_NEW_PACKAGES_URL)
 
         for package in Deb822.iter_paragraphs(content):
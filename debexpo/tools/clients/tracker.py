@@ -41,6 +41,8 @@ class ExceptionClientTracker(Exception):
 
 
 class ClientTracker(ClientHTTP):
+    name = 'tracker'
+
     def fetch_package(self, package):
         url = f'{settings.TRACKER_URL}/pkg/{package}'
         html = self.fetch_resource(url)
@@ -37,6 +37,7 @@ from debian.debian_support import NativeVersion
 from os.path import dirname, abspath, basename, join
 from os import replace, unlink
 
+from debexpo.archive.models import ArchivePackage
 from debexpo.bugs.models import Bug
 from debexpo.accounts.models import User
 from debexpo.tools.files import GPGSignedFile
@@ -196,9 +197,15 @@ class Changes(GPGSignedFile):
             raise ExceptionChanges(e)
 
     def assert_newer(self):
-        client = ClientFTPMasterAPI()
-        versions = client.get_existing_versions_for(self.source,
-                                                    self.distribution)
+        # Use the local archive index when it holds the distribution and is up
+        # to date
+        versions = ArchivePackage.objects.get_versions(self.source,
+                                                       self.distribution)
+
+        if versions is None:
+            client = ClientFTPMasterAPI()
+            versions = client.get_existing_versions_for(self.source,
+                                                        self.distribution)
 
         if versions:
             # There can be multiple version for a single distribution, let's
@@ -35,6 +35,7 @@ from logging import getLogger
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+import debexpo.archive.models as archive
 import debexpo.repository.models as repository
 from debexpo.tools.clients import ExceptionClient
 from debexpo.tools.clients.ftp_master import ClientFTPMasterAPI
@@ -80,16 +81,28 @@ class Origin():
                                         str(origin),
                                         self.dest_dir)
 
-    def validate(self, source_origin_files):
+    def _get_archive_origin_files(self):
+        # Use the local archive index when available. Unless all its suites are
+        # up to date, ftp-master is queried when it has no entry.
+        if archive.ArchiveSources.objects.is_available():
+            origin_files = archive.ArchiveOrigin.objects.get_origin_files(
+                self.package, self.version)
+
+            if origin_files or archive.ArchiveSuite.objects.is_fresh():
+                return origin_files
+
         client = ClientFTPMasterAPI()
-        archive_origin_files = []
 
         try:
-            archive_origin_files = client.get_origin_files(self.package,
-                                                           self.version)
+            return client.get_origin_files(self.package, self.version)
         except ExceptionClient as e:
             log.warning(_('Failed to retrive origin info: {e}').format(e=e))
 
+        return []
+
+    def validate(self, source_origin_files):
+        archive_origin_files = self._get_archive_origin_files()
+
         if archive_origin_files:
             for source_file in source_origin_files:
                 self._assert_same_file(source_file, archive_origin_files)
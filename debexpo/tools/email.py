@@ -34,13 +34,66 @@ Holds helper class for sending email.
 """
 
 import logging
+from contextlib import contextmanager
+from threading import local
+
+from kombu.exceptions import OperationalError
 
 from django.conf import settings
-from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 
+from debexpo.base.tasks import send_emails
+
 log = logging.getLogger(__name__)
 
+_outbox = local()
+
+
+@contextmanager
+def outbox():
+    """
+    Holds the emails sent in this context, then hands them to the delivery
+    task in batches of EMAIL_BATCH_SIZE. Each batch is sent over a single
+    connection to the mail server.
+
+    Nested contexts are merged into the outermost one. Outboxes are per
+    thread.
+    """
+    if hasattr(_outbox, 'messages'):
+        yield
+        return
+
+    _outbox.messages = []
+
+    try:
+        yield
+    except BaseException:
+        # Still deliver the emails sent so far, without hiding the original
+        # error behind a broker failure
+        try:
+            _dispatch(_outbox.__dict__.pop('messages'))
+        except OperationalError as e:
+            log.error(f'Failed to queue emails: {e}')
+
+        raise
+    else:
+        _dispatch(_outbox.__dict__.pop('messages'))
+
+
+def _dispatch(messages):
+    for index in range(0, len(messages), settings.EMAIL_BATCH_SIZE):
+        send_emails.delay(messages[index:index + settings.EMAIL_BATCH_SIZE])
+
+
+def queue_email(message):
+    """
+    Queue a message for delivery, in the current outbox if any.
+    """
+    if hasattr(_outbox, 'messages'):
+        _outbox.messages.append(message)
+    else:
+        send_emails.delay([message])
+
 
 class Email():
     def __init__(self, template):
@@ -56,9 +109,9 @@ class Email():
              from_email=None,
              reply_to=None,
              bounce_to=None,
-             headers={}, **kwargs):
+             headers=None, **kwargs):
         """
-        Sends the email.
+        Renders the email and queues it for delivery.
 
         ``recipients``
             List of email addresses of recipients.
@@ -72,18 +125,20 @@ class Email():
         if not bounce_to:
             bounce_to = getattr(settings, 'DEFAULT_BOUNCE_EMAIL')
 
-        headers['From'] = from_email
+        headers = dict(headers or {})
+        headers['From'] = str(from_email)
 
+        # Rendered now, in the current language, and sent as JSON to the task
         body = self._render_content(recipients, **kwargs)
-        self.email = EmailMessage(
-            subject,
-            body,
-            from_email=bounce_to,
-            to=recipients,
-            reply_to=reply_to,
-            headers=headers
-        )
-        self.email.send()
+        self.email = {
+            'subject': str(subject),
+            'body': body,
+            'from_email': str(bounce_to),
+            'to': list(recipients),
+            'reply_to': list(reply_to) if reply_to else None,
+            'headers': headers,
+        }
+        queue_email(self.email)
 
     def _render_content(self, recipients, **kwargs):
         log.debug('Getting mail template: %s' % self.template)
@@ -26,14 +26,26 @@
 #   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 #   OTHER DEALINGS IN THE SOFTWARE.
 
-from os.path import basename, join, isfile
-from os import replace, unlink
+from os.path import basename, dirname, join, isfile, lexists
+from os import replace, unlink, stat, fstat, link, close, chmod
+from fcntl import ioctl
+from shutil import copy2, copystat
+from stat import S_IMODE, S_IWUSR, S_IWGRP, S_IWOTH
+from secrets import token_hex
+from tempfile import mkstemp
 import hashlib
 
+from django.conf import settings
+from django.core.cache import cache
 from django.utils.translation import gettext_lazy as _
 
 from debexpo.keyring.models import Key
-from debexpo.tools.gnupg import GnuPG, ExceptionGnuPGNoPubKey
+from debexpo.tools.gnupg import GnuPG, ExceptionGnuPG, ExceptionGnuPGNoPubKey
+
+CHECKSUM_BUFFER_SIZE = 1024 * 1024
+
+# ioctl request to clone (reflink) a file, from linux/fs.h
+FICLONE = 0x40049409
 
 
 class ExceptionCheckSumedFile(Exception):
@@ -76,24 +88,80 @@ class GPGSignedFile():
     def __init__(self, filename):
         self.filename = filename
         self.key = None
+        self._signature = None
+
+    @classmethod
+    def verify_signatures(cls, signed_files):
+        """
+        Verify the signatures of several files at once against the persistent
+        keyring. The results are then used by authenticate() instead of
+        running gpg once per file.
+        """
+        keyring = Key.objects.get_keyring()
+
+        if not keyring or not signed_files:
+            return
+
+        results = keyring.verify_many([signed_file.filename
+                                       for signed_file in signed_files])
+
+        for signed_file in signed_files:
+            signed_file._signature = results.get(signed_file.filename)
 
     def authenticate(self):
+        keyring = Key.objects.get_keyring()
+
+        if keyring:
+            self._verify_with_keyring(keyring)
+            return
+
         lookup = self._lookup_fingerprint()
+        self.key = self._get_signing_key(lookup)
+
+        self.keyring = GnuPG()
+        self.keyring.import_key(self.key.key)
+        self.keyring.verify_sig(self.filename)
 
+    def _verify_with_keyring(self, keyring):
+        # Verify against the persistent keyring: a single gpg call when the
+        # signing key is already known, none if verify_signatures() was used.
+        signature, self._signature = self._signature, None
+
+        try:
+            if isinstance(signature, ExceptionGnuPG):
+                raise signature
+
+            fingerprint = signature or keyring.verify_sig(self.filename)
+        except ExceptionGnuPGNoPubKey as lookup:
+            # The key was not synced to the keyring yet
+            self.key = self._get_signing_key(lookup)
+            self.key.update_keyring(keyring)
+            keyring.verify_sig(self.filename)
+        else:
+            try:
+                self.key = Key.objects.get(fingerprint=fingerprint)
+            except Key.DoesNotExist:
+                # The key was removed from the database, purge it from the
+                # keyring and report the file as signed by an unknown key.
+                if not keyring.delete_key(fingerprint):
+                    raise ExceptionGnuPG(_('Unable to remove key {fingerprint}'
+                                           ' from keyring').format(
+                                               fingerprint=fingerprint))
+                self._verify_with_keyring(keyring)
+
+        self.keyring = keyring
+
+    def _get_signing_key(self, lookup):
         try:
             if lookup.fingerprint:
                 search = lookup.fingerprint
             else:
                 search = lookup.long_id
 
-            self.key = Key.objects.get_key_by_fingerprint(search)
+            return Key.objects.get_key_by_fingerprint(search)
         except Key.DoesNotExist:
             raise lookup
 
-        self.keyring = GnuPG()
-        self.keyring.import_key(self.key.key)
-        self.keyring.verify_sig(self.filename)
-
     def _lookup_fingerprint(self):
         gpg = GnuPG()
 
@@ -133,34 +201,73 @@ class CheckSumedFile():
             checksum = self.checksums.get(method)
 
             if checksum:
-                hash_function = getattr(hashlib, method)
-                validator = hash_function()
-
-                try:
-                    data = open(self.filename, 'rb')
-                except FileNotFoundError:
-                    raise ExceptionCheckSumedFileNoFile(_(
-                        '{filename} is missing from '
-                        'upload').format(filename=basename(self.filename)))
-                else:
-                    with data:
-                        while True:
-                            chunk = data.read(10240)
-
-                            if not chunk:
-                                break
-
-                            validator.update(chunk)
+                computed = self.compute_checksums((method,))[method]
 
-                if validator.hexdigest() != checksum:
+                if computed != checksum:
                     raise ExceptionCheckSumedFileFailedSum(
-                        self.filename, checksum, validator.hexdigest()
+                        self.filename, checksum, computed
                     )
                 else:
                     return True
 
         raise ExceptionCheckSumedFileNoMethod(self.filename)
 
+    def compute_checksums(self, methods=METHODS):
+        """
+        Returns a dictionary of the file digests for the given methods.
+
+        All missing digests are computed in a single read of the file. Results
+        are cached by device, inode, size, modification and change times so
+        that the same file is not hashed again.
+        """
+        try:
+            key = self._get_cache_key()
+        except FileNotFoundError:
+            raise ExceptionCheckSumedFileNoFile(_(
+                '{filename} is missing from '
+                'upload').format(filename=basename(self.filename)))
+
+        digests = cache.get(key) or {}
+        missing = [method for method in methods if method not in digests]
+
+        if missing:
+            digests.update(self._hash_file(missing))
+            self._store_checksums(key, digests)
+
+        return {method: digests[method] for method in methods}
+
+    def _store_checksums(self, key, digests):
+        cache.set(key, digests, timeout=settings.QUEUE_EXPIRED_TIME)
+
+    def _get_cache_key(self):
+        return self._get_cache_key_from(stat(self.filename))
+
+    @staticmethod
+    def _get_cache_key_from(info):
+        # The change time cannot be set by users and protects against a new
+        # file reusing the inode, size and modification time of a removed one.
+        return f'checksum:{info.st_dev}:{info.st_ino}:{info.st_size}:' \
+               f'{info.st_mtime_ns}:{info.st_ctime_ns}'
+
+    def _hash_file(self, methods):
+        validators = [(method, getattr(hashlib, method)())
+                      for method in methods]
+        buffer = bytearray(CHECKSUM_BUFFER_SIZE)
+        view = memoryview(buffer)
+
+        with open(self.filename, 'rb', buffering=0) as data:
+            while True:
+                size = data.readinto(buffer)
+
+                if not size:
+                    break
+
+                for method, validator in validators:
+                    validator.update(view[:size])
+
+        return {method: validator.hexdigest()
+                for method, validator in validators}
+
     def __str__(self):
         return basename(self.filename)
 
@@ -168,10 +275,144 @@ class CheckSumedFile():
         if not isfile(self.filename):
             return
 
+        digests = cache.get(self._get_cache_key())
+
         dest = join(destdir, basename(self.filename))
         replace(self.filename, dest)
         self.filename = dest
 
+        # Renaming the file updates its change time, keep known digests
+        if digests:
+            self._store_checksums(self._get_cache_key(), digests)
+
     def remove(self):
         if isfile(self.filename):
             unlink(self.filename)
+
+
+class CheckSumedFileWriter():
+    """
+    File opened for writing, hashed while it is written.
+
+    Data goes to a private file in the same directory, created exclusively and
+    moved in place on close: concurrent writers of the same name never share
+    a file. The digests are then recorded as if computed by CheckSumedFile,
+    which does not need to read the file again to validate it. The private
+    file is discarded if the writer exits on an error.
+    """
+    def __init__(self, filename, methods=CheckSumedFile.METHODS):
+        self.name = filename
+        self.size = 0
+        self._partial = join(dirname(filename),
+                             f'.{basename(filename)}.{token_hex(8)}')
+        self._fd = open(self._partial, 'xb')
+        self._validators = [(method, getattr(hashlib, method)())
+                            for method in methods]
+
+    def write(self, data):
+        self._fd.write(data)
+        self.size += len(data)
+
+        for method, validator in self._validators:
+            validator.update(data)
+
+    def close(self):
+        if self._fd.closed:
+            return
+
+        written = fstat(self._fd.fileno())
+        self._fd.close()
+        replace(self._partial, self.name)
+
+        # Another writer could have replaced the file since
+        try:
+            info = stat(self.name)
+        except FileNotFoundError:
+            return
+
+        if (info.st_dev, info.st_ino) != (written.st_dev, written.st_ino):
+            return
+
+        CheckSumedFile(self.name)._store_checksums(
+            CheckSumedFile._get_cache_key_from(info), {
+                method: validator.hexdigest()
+                for method, validator in self._validators
+            })
+
+    def abort(self):
+        self._fd.close()
+
+        if lexists(self._partial):
+            unlink(self._partial)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type:
+            self.abort()
+        else:
+            self.close()
+
+
+def install_file(src, dest, mode=None, owned=False):
+    """
+    Install src as dest, avoiding to copy its data when possible.
+
+    A hard link shares the inode between both paths. It is used when src and
+    the destination directory have the same owner, and either src is owned by
+    the caller, which discards it once installed (ie. a spool file), or src is
+    read-only: nothing can then modify the installed file through src. A
+    reflink is used on filesystems supporting it and the file is copied
+    otherwise. When given, mode is applied to dest. dest is replaced
+    atomically.
+    """
+    fd, tmp = mkstemp(dir=dirname(dest), prefix=f'.{basename(dest)}.')
+    close(fd)
+
+    try:
+        unlink(tmp)
+
+        if not _link_file(src, tmp, mode, owned):
+            if not _clone_file(src, tmp):
+                copy2(src, tmp)
+
+        if mode is not None:
+            chmod(tmp, mode)
+
+        replace(tmp, dest)
+    except BaseException:
+        if lexists(tmp):
+            unlink(tmp)
+        raise
+
+
+def _link_file(src, dest, mode, owned):
+    try:
+        info = stat(src)
+
+        if info.st_uid != stat(dirname(dest)).st_uid:
+            return False
+
+        # Changing the mode of the link would change the one of src
+        if not owned and (info.st_mode & (S_IWUSR | S_IWGRP | S_IWOTH) or
+                          mode not in (None, S_IMODE(info.st_mode))):
+            return False
+
+        link(src, dest)
+    except OSError:
+        return False
+
+    return True
+
+
+def _clone_file(src, dest):
+    try:
+        with open(src, 'rb') as source, open(dest, 'wb') as target:
+            ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        return False
+
+    copystat(src, dest)
+
+    return True
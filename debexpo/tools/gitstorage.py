@@ -25,6 +25,7 @@
 from io import BytesIO
 from os import makedirs, walk
 from os.path import isdir, join, relpath
+from functools import partial
 from logging import getLogger
 from shutil import rmtree, copytree
 
@@ -32,6 +33,8 @@ from dulwich.repo import Repo
 from dulwich.patch import write_tree_diff
 from dulwich.index import get_unstaged_changes
 
+from debexpo.tools.files import install_file
+
 fileToIgnore = []
 log = getLogger(__name__)
 
@@ -69,7 +72,8 @@ class GitStorage():
             rmtree(self.source_dir)
 
         try:
-            copytree(source.get_source_dir(), self.source_dir)
+            copytree(source.get_source_dir(), self.source_dir,
+                     copy_function=partial(install_file, owned=True))
         # After dpkg 1.20.0, this will be catched by dpkg-source -x
         except IOError:  # pragma: no cover
             pass
@@ -45,6 +45,13 @@ from debexpo.tools.proc import debexpo_exec
 
 log = logging.getLogger(__name__)
 
+ERR_SIG_RE = re.compile(r'\[GNUPG:\] ERRSIG (?P<long_id>\w+)'
+                        r' .* (?P<fingerprint>[\w-]+)$')
+NO_DATA_RE = re.compile(r'\[GNUPG:\] NODATA')
+VALID_SIG_RE = re.compile(r'\[GNUPG:\] VALIDSIG .* (?P<fingerprint>\w+)$')
+FILE_START_RE = re.compile(r'\[GNUPG:\] FILE_START ')
+FILE_ERROR_RE = re.compile(r'\[GNUPG:\] FILE_ERROR ')
+
 
 class ExceptionGnuPG(Exception):
     pass
@@ -81,14 +88,24 @@ class ExceptionGnuPGNoPubKey(ExceptionGnuPG):
 
 
 class GnuPG():
-    def __init__(self):
+    def __init__(self, home=None):
         """
         Wrapper for certain GPG operations.
 
         Meant to be instantiated only once.
+
+        ``home``
+            persistent GnuPG home directory to use. When unset, a temporary
+            home directory is created and removed with this object.
         """
         self.gpg_path = settings.GPG_PATH
-        self.gpg_home = tempfile.TemporaryDirectory()
+
+        if home:
+            os.makedirs(home, mode=0o700, exist_ok=True)
+            self.gpg_home = home
+        else:
+            self._tmp_home = tempfile.TemporaryDirectory()
+            self.gpg_home = self._tmp_home.name
 
         if self.gpg_path is None:
             log.error('debexpo.gpg_path is not set in configuration file' +
@@ -132,11 +149,61 @@ class GnuPG():
         """
         args = ['--verify', signed_file]
         (output, status) = self._run(args)
-        output = output.splitlines()
 
-        err_sig_re = re.compile(r'\[GNUPG:\] ERRSIG (?P<long_id>\w+)'
-                                r' .* (?P<fingerprint>[\w-]+)$')
-        err_sig = list(filter(None, map(err_sig_re.match, output)))
+        return self._parse_verify(signed_file, output.splitlines())
+
+    def verify_many(self, signed_files):
+        """
+        Verify several clearsigned files using a single gpg invocation.
+
+        Returns a dictionary mapping each path to the fingerprint that signed
+        the file if the signature is valid, or to the ExceptionGnuPG exception
+        verify_sig() would have thrown for that file.
+
+        ``signed_files``
+             list of paths to signed files
+        """
+        results = {}
+
+        if not signed_files:
+            return results
+
+        args = ['--verify-files', '--'] + list(signed_files)
+        (output, status) = self._run(args)
+
+        # gpg reports each file between FILE_START and FILE_DONE status lines,
+        # in the order they were given.
+        reports = []
+        for line in output.splitlines():
+            if FILE_START_RE.match(line):
+                reports.append([])
+            elif reports:
+                reports[-1].append(line)
+
+        for index, signed_file in enumerate(signed_files):
+            if index >= len(reports):
+                results[signed_file] = ExceptionGnuPG(
+                    _('Unknown GPG error. Output was:'
+                      ' {output}').format(output=output.splitlines()))
+                continue
+
+            report = reports[index]
+
+            if any(map(FILE_ERROR_RE.match, report)):
+                results[signed_file] = ExceptionGnuPG(
+                    _('{filename}: cannot open file').format(
+                        filename=os.path.basename(signed_file)))
+                continue
+
+            try:
+                results[signed_file] = self._parse_verify(signed_file, report)
+            except ExceptionGnuPG as e:
+                results[signed_file] = e
+
+        return results
+
+    def _parse_verify(self, signed_file, output):
+        err_sig = list(filter(None, map(ERR_SIG_RE.match, output)))
 
         if err_sig:
             fingerprint = err_sig[0].group('fingerprint')
@@ -147,17 +214,13 @@ class GnuPG():
 
             raise ExceptionGnuPGNoPubKey(signed_file, fingerprint, long_id)
 
-        no_data_re = re.compile(r'\[GNUPG:\] NODATA')
-        no_data = list(filter(None, map(no_data_re.match,
-                                        output)))
+        no_data = list(filter(None, map(NO_DATA_RE.match, output)))
         if no_data:
             raise ExceptionGnuPGNotSignedFile(
                 _('{filename}: not a GPG signed file').format(
                     filename=os.path.basename(signed_file)))
 
-        valid_sig_re = re.compile(r'\[GNUPG:\] VALIDSIG .*'
-                                  r' (?P<fingerprint>\w+)$')
-        valid_sig = list(filter(None, map(valid_sig_re.match, output)))
+        valid_sig = list(filter(None, map(VALID_SIG_RE.match, output)))
 
         if not valid_sig:
             raise ExceptionGnuPG(_('Unknown GPG error. Output was:'
@@ -185,6 +248,21 @@ class GnuPG():
 
         return (output, status)
 
+    def delete_key(self, fingerprint):
+        """
+        Remove the public key with the given fingerprint from the keyring
+
+        ```fingerprint```
+            fingerprint of the key to remove
+
+        Returns True if the key was removed, False if it was not found
+        """
+        args = ['--yes', '--delete-keys', fingerprint]
+
+        (output, status) = self._run(args)
+
+        return status == 0
+
     def _run(self, args, stdin=None):
         """
         Run gpg with the given stdin and arguments and return the output and
@@ -205,7 +283,7 @@ class GnuPG():
         output = None
 
         env = os.environ.copy()
-        env['GNUPGHOME'] = self.gpg_home.name
+        env['GNUPGHOME'] = self.gpg_home
 
         cmd = [
             '--batch',
@@ -41,16 +41,112 @@ import email.mime.text
 import email.parser
 import logging
 import nntplib
+from concurrent.futures import ThreadPoolExecutor
+from re import search
+from threading import Lock, local
 
 from django.conf import settings
 
 log = logging.getLogger(__name__)
 
+# Headers needed to decode the body of a message
+MIME_HEADERS = ('Content-Type', 'Content-Transfer-Encoding')
+
 
 class NNTPClient():
-    def __init__(self):
+    """
+    Reads new messages from NNTP groups.
+
+    Messages are listed by batches of NNTP_BATCH_SIZE with XOVER. When a
+    subject pattern is given, only the bodies of matching messages are
+    retrieved, using up to NNTP_WORKERS concurrent connections. The number of
+    the last article listed on each group is kept in scanned, so that readers
+    can skip the articles not matching the subject.
+    """
+    def __init__(self, subject=None):
         self.connected = False
         self.server = settings.NNTP_SERVER
+        self.port = getattr(settings, 'NNTP_PORT', nntplib.NNTP_PORT)
+        self.subject = subject
+        self.scanned = {}
+        self._workers = local()
+        self._worker_connections = []
+        self._lock = Lock()
+
+    def _is_relevant(self, overview):
+        if not self.subject:
+            return True
+
+        return bool(search(self.subject, overview.get('subject', '')))
+
+    def _get_mime_headers(self, start, end):
+        headers = {}
+
+        for header in MIME_HEADERS:
+            (_, values) = self.nntp.xhdr(header, f'{start}-{end}')
+
+            for (msg_num, value) in values:
+                if value and value != '(none)':
+                    headers.setdefault(int(msg_num), {})[header] = value
+
+        return headers
+
+    def _fetch_body(self, message_id):
+        # Runs in worker threads, each with its own connection
+        nntp = getattr(self._workers, 'nntp', None)
+
+        if not nntp:
+            nntp = self._workers.nntp = nntplib.NNTP(self.server, self.port)
+
+            with self._lock:
+                self._worker_connections.append(nntp)
+
+        (_, response) = nntp.body(message_id)
+
+        return response.lines
+
+    def _close_workers(self):
+        for nntp in self._worker_connections:
+            try:
+                nntp.quit()
+            except Exception as e:
+                log.debug(f'Failed to close NNTP connection: {e}')
+
+        self._worker_connections = []
+
+    def _build_message(self, overview, headers, lines):
+        headers = dict(headers)
+        headers['Subject'] = overview.get('subject', '')
+        headers['Message-ID'] = overview['message-id']
+        raw = b''.join(f'{name}: {value}\n'.encode('utf-8', 'surrogateescape')
+                       for name, value in headers.items())
+
+        body = b''.join(line + b'\n' for line in lines)
+
+        return email.parser.BytesParser().parsebytes(raw + b'\n' + body)
+
+    def _fetch_messages(self, executor, start, end):
+        (_, messages) = self.nntp.xover(str(start), str(end))
+        messages = [(msg_num, overview) for (msg_num, overview) in messages
+                    if self._is_relevant(overview)]
+
+        if not messages:
+            return
+
+        headers = self._get_mime_headers(start, end)
+        message_ids = [overview['message-id'] for (_, overview) in messages]
+
+        if executor:
+            bodies = executor.map(self._fetch_body, message_ids)
+        else:
+            bodies = (self.nntp.body(message_id)[1].lines
+                      for message_id in message_ids)
+
+        for (msg_num, overview), lines in zip(messages, bodies):
+            ep = self._build_message(overview, headers.get(msg_num, {}), lines)
+            ep['X-Debexpo-Message-ID'] = overview['message-id']
+            ep['X-Debexpo-Message-Number'] = msg_num
+            yield ep
 
     def unread_messages(self, list_name, changed_since):
         if not self.connected:
@@ -68,20 +164,32 @@ class NNTPClient():
                       self.server, e))
             return
 
+        workers = getattr(settings, 'NNTP_WORKERS', 1)
+        batch_size = getattr(settings, 'NNTP_BATCH_SIZE', 500)
+        executor = None
+
+        if workers > 1:
+            executor = ThreadPoolExecutor(max_workers=workers)
+
         try:
-            (_, messages) = self.nntp.xover(str(changed_since), str(last))
-
-            for (msg_num, overview) in messages:
-                (_, response) = self.nntp.article(overview['message-id'])
-                ep = email.parser.BytesParser() \
-                    .parsebytes(b"\n".join(response.lines))
-                ep['X-Debexpo-Message-ID'] = overview['message-id']
-                ep['X-Debexpo-Message-Number'] = msg_num
-                yield ep
+            start = int(changed_since)
+
+            if start < 0:
+                raise ValueError(f'invalid message number {changed_since}')
+
+            for start in range(start, last + 1, batch_size):
+                end = min(start + batch_size - 1, last)
+
+                yield from self._fetch_messages(executor, start, end)
+                self.scanned[list_name] = end
         except Exception as e:
             log.error("Failed to communicate with NNTP server {}: {}".format(
                       self.server, e))
             return
+        finally:
+            if executor:
+                executor.shutdown()
+                self._close_workers()
 
     def connect_to_server(self):
         if self.connected:
@@ -89,7 +197,7 @@ class NNTPClient():
             return False
 
         try:
-            self.nntp = nntplib.NNTP(self.server)
+            self.nntp = nntplib.NNTP(self.server, self.port)
         except Exception as e:
             log.error("Connecting to NNTP server {} failed: {}".format(
                       self.server, e))
@@ -47,7 +47,7 @@ from debexpo.packages.views import package, packages, packages_my, \
     PackageViewSet, PackageUploadViewSet
 from debexpo.comments.views import subscribe, unsubscribe, subscriptions, \
     comment
-from debexpo.importer.views import upload
+from debexpo.importer.views import upload, metrics
 
 api = ExtendedDefaultRouter()
 api.register(r'packages', PackageViewSet) \
@@ -159,6 +159,9 @@ urlpatterns = [
     # Upload
     url(r'^upload/(?P<name>.+)$', upload, name='upload'),
 
+    # Importer metrics
+    url(r'^metrics$', metrics, name='metrics'),
+
     # Redirects
     url(r'^my/$', lambda request: HttpResponsePermanentRedirect(
         reverse('profile')), name='my'),
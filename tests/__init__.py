@@ -38,11 +38,13 @@ this file will be loaded to setup the test environment.
 from os import walk
 from os.path import join
 from logging import getLogger
-from socketserver import TCPServer
+from socketserver import TCPServer, ThreadingTCPServer, StreamRequestHandler
 from http.server import SimpleHTTPRequestHandler, BaseHTTPRequestHandler
+from tempfile import TemporaryDirectory
 from threading import Thread
+from time import sleep
 
-from django.test import TransactionTestCase, TestCase
+from django.test import TransactionTestCase, TestCase, override_settings
 # import tempfile
 # from datetime import datetime
 # from unittest import TestCase
@@ -99,6 +101,32 @@ Xcgnuh6Rlywt6uiaFIGYnGefYPGXRAA=
     _GPG_UIDS = [('primary id', 'primary@example.org'),
                  ('Test user', 'email@example.com')]
 
+    @classmethod
+    def setUpClass(cls):
+        # Each test class gets its own persistent keyring, so that keys do
+        # not leak between classes, test runs or parallel test processes
+        cls._keyring = TemporaryDirectory(prefix='debexpo-keyring-')
+        cls._keyring_settings = override_settings(GPG_KEYRING=cls._keyring.name)
+        cls._keyring_settings.enable()
+
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._cleanup_keyring()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls._cleanup_keyring()
+
+    @classmethod
+    def _cleanup_keyring(cls):
+        cls._keyring_settings.disable()
+        cls._keyring.cleanup()
+
     def _add_gpg_key(self, user, data, fingerprint, algo, size):
         key = Key()
         key.key = data
@@ -279,6 +307,119 @@ class TestingHTTPServer():
         self.httpd.shutdown()
 
 
+class FakeNNTPHandler(StreamRequestHandler):
+    """
+    Minimal NNTP server serving the articles of a single group: enough to
+    test and benchmark NNTPClient.
+    """
+    # Buffer responses, flushed once per command
+    wbufsize = -1
+
+    def _send(self, *lines):
+        for line in lines:
+            self.wfile.write(f'{line}\r\n'.encode())
+
+    def _range(self, spec):
+        start, end = spec.split('-')
+
+        for number in range(max(int(start), 1),
+                            min(int(end), len(self.server.articles)) + 1):
+            yield number, self.server.articles[number - 1]
+
+    def _article(self, msgid, head=True):
+        number = int(msgid.strip('<>').split('@')[0])
+        subject, headers, body = self.server.articles[number - 1]
+
+        if head:
+            self._send(f'220 {number} {msgid}',
+                       f'Subject: {subject}', f'Message-ID: {msgid}',
+                       *[f'{name}: {value}'
+                         for name, value in headers.items()], '')
+        else:
+            self._send(f'222 {number} {msgid}')
+
+        self._send(*[f'.{line}' if line.startswith('.') else line
+                     for line in body.splitlines()])
+        self._send('.')
+
+    def _overview(self, spec):
+        self._send('224 Overview information follows')
+        for number, (subject, headers, body) in self._range(spec):
+            self._send(f'{number}\t{subject}\tuploader@example.com\t'
+                       f'Thu, 01 Jan 2026 00:00:00 +0000\t<{number}@fake>\t\t'
+                       f'{len(body)}\t{len(body.splitlines())}')
+        self._send('.')
+
+    def _headers(self, args):
+        header, spec = args.split(' ')
+        self._send('221 Header follows')
+        for number, (subject, headers, body) in self._range(spec):
+            self._send(f'{number} {headers.get(header, "(none)")}')
+        self._send('.')
+
+    def handle(self):
+        self._send('200 Fake NNTP server ready')
+        self.wfile.flush()
+
+        for line in self.rfile:
+            command, _, args = line.decode().strip().partition(' ')
+            command = command.upper()
+            self.server.commands.append(command)
+            sleep(self.server.latency)
+
+            if command == 'QUIT':
+                self._send('205 Bye')
+                return
+            elif command == 'CAPABILITIES':
+                self._send('101 Capability list:', 'VERSION 2', 'READER', '.')
+            elif command == 'GROUP':
+                count = len(self.server.articles)
+                self._send(f'211 {count} 1 {count} {args}')
+            elif command == 'XOVER':
+                self._overview(args)
+            elif command == 'XHDR':
+                self._headers(args)
+            elif command == 'ARTICLE':
+                self._article(args)
+            elif command == 'BODY':
+                self._article(args, head=False)
+            else:
+                self._send('500 Unknown command')
+
+            self.wfile.flush()
+
+
+class TestingNNTPServer():
+    def __init__(self, articles, latency=0):
+        """
+        ``articles``
+            List of (subject, headers, body) tuples.
+
+        ``latency``
+            Delay, in seconds, before answering each command.
+        """
+        self.server = ThreadingTCPServer(('localhost', 0), FakeNNTPHandler)
+        self.server.daemon_threads = True
+        self.server.articles = articles
+        self.server.latency = latency
+        self.server.commands = []
+        _, self.port = self.server.server_address
+        self.thread = Thread(target=self.server.serve_forever)
+
+    @property
+    def commands(self):
+        return self.server.commands
+
+    def __enter__(self):
+        self.thread.start()
+
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+
 class TransactionTestController(DefaultTestController,
                                 TransactionTestCase):
     serialized_rollback = True
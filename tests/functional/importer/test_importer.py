@@ -31,18 +31,22 @@ UploadController test cases.
 """
 
 # from os import makedirs
-from os.path import join
+from os.path import join, isfile
 from os import utime, unlink
 from time import time
 from glob import glob
 
 from django.conf import settings
 from django.core import mail
+from django.core.cache import cache
 from django.test import override_settings
+from django.urls import reverse
 
 from tests.functional.importer import TestImporterController
 
-from debexpo.importer.models import Importer, ExceptionImporterRejected
+from debexpo.importer.metrics import METRICS_PREFIX, STAGES
+from debexpo.importer.models import Importer, ExceptionImporterRejected, \
+    ImportTiming
 from debexpo.tools.debian.changes import Changes
 
 
@@ -92,13 +96,56 @@ r1JREXlgQRuRdd5ZWSvIxKaKGVbYCw==
         self.assert_package_not_in_repo('hello', '1.0-1')
 
     def test_import_package_missing_file_in_changes(self):
-        self.import_package('missing-file-in-changes')
-        self.assert_importer_failed()
+        # Incomplete uploads are left in the incoming queue
+        self._upload_package(join(self.data_dir, 'missing-file-in-changes'))
+        incoming = glob(join(str(self.spool), 'incoming', '*'))
+        filename = glob(join(str(self.spool), 'incoming', '*.changes'))[0]
+
+        for path in incoming:
+            utime(path)
+
+        with self.settings(REPOSITORY=self.repository,
+                           GIT_STORAGE=self.gitstorage):
+            self.assertTrue(Importer(str(self.spool)).process_spool())
+
+        self.assert_no_email()
+        self.assertTrue(isfile(filename))
+
+        # Until they stall
+        stalled = time() - settings.QUEUE_INCOMPLETE_TIME
+
+        for path in incoming:
+            utime(path, (stalled, stalled))
+
+        with self.settings(REPOSITORY=self.repository,
+                           GIT_STORAGE=self.gitstorage):
+            self.assertFalse(Importer(str(self.spool)).process_spool())
+
         self.assert_email_with('hello_1.0-1.debian.tar.xz is missing from'
                                ' upload')
         self.assert_package_count('hello', '1.0-1', 0)
         self.assert_package_not_in_repo('hello', '1.0-1')
 
+    def test_import_package_missing_file_superseded(self):
+        # An incomplete upload is replaced by a new upload of the same version
+        self._upload_package(join(self.data_dir, 'missing-file-in-changes'))
+        previous = time() - 60
+
+        for path in glob(join(str(self.spool), 'incoming', '*')):
+            utime(path, (previous, previous))
+
+        self._upload_package(join(self.data_dir, 'ok'), 'new')
+        utime(glob(join(str(self.spool), 'incoming', 'new',
+                        '*.changes'))[0])
+
+        with self.settings(REPOSITORY=self.repository,
+                           GIT_STORAGE=self.gitstorage):
+            self.assertTrue(Importer(str(self.spool)).process_spool())
+
+        self.assertEquals(len(mail.outbox), 1)
+        self.assert_email_with('Your upload of the package')
+        self.assert_package_count('hello', '1.0-1', 1)
+
     def test_import_package_wrong_checksum_in_changes(self):
         self.import_package('wrong-checksum-in-changes')
         self.assert_importer_failed()
@@ -211,6 +258,11 @@ r1JREXlgQRuRdd5ZWSvIxKaKGVbYCw==
         self.assert_package_count('hello', '1.0-1', 1)
         self.assert_package_in_repo('hello', '1.0-1')
 
+        # Durations of all stages are recorded with the upload
+        self.assertEquals(set(ImportTiming.objects.filter(
+            upload__package__name='hello').values_list('stage', flat=True)),
+            set(STAGES))
+
     def test_import_package_not_signed_ok_no_user(self):
         self.import_source_package('hello', skip_gpg=True)
         self.assert_importer_failed()
@@ -225,6 +277,24 @@ r1JREXlgQRuRdd5ZWSvIxKaKGVbYCw==
         self.assert_package_count('hello', '1.0-1', 0)
         self.assert_package_not_in_repo('hello', '1.0-1')
 
+    def test_import_package_metrics(self):
+        cache.delete_many([f'{METRICS_PREFIX}:{stage}:{name}'
+                           for stage in STAGES
+                           for name in ['sum'] + [f'bucket:{index}'
+                                                  for index in range(20)]])
+        self.import_package('not-signed')
+        self.assert_importer_failed()
+
+        # Rejected uploads are timed up to the failed stage
+        metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('debexpo_importer_stage_duration_seconds_count'
+                      '{stage="changes"} 1', metrics)
+        self.assertIn('debexpo_importer_stage_duration_seconds_bucket'
+                      '{stage="changes",le="+Inf"} 1', metrics)
+        self.assertIn('debexpo_importer_stage_duration_seconds_count'
+                      '{stage="dsc"} 0', metrics)
+        self.assertFalse(ImportTiming.objects.exists())
+
     def test_import_package_unknown_key(self):
         self.import_package('unknown-key')
         self.assert_importer_failed()
@@ -522,15 +592,23 @@ r1JREXlgQRuRdd5ZWSvIxKaKGVbYCw==
         deb = join(self.spool.get_queue_dir('incoming'), 'file.deb')
         deb_expired = join(self.spool.get_queue_dir('incoming'), 'old.deb')
         txt = join(self.spool.get_queue_dir('incoming'), 'file.txt')
+        partial = join(self.spool.get_queue_dir('incoming'), '.file.dsc.1')
+        partial_expired = join(self.spool.get_queue_dir('incoming'),
+                               '.old.dsc.1')
         expired = time() - 6 * 60 * 60 - 1
 
-        for path in (deb, deb_expired, txt,):
+        for path in (deb, deb_expired, txt, partial, partial_expired,):
             with open(path, 'w'):
                 pass
 
         utime(deb_expired, (expired, expired))
+        utime(partial_expired, (expired, expired))
 
         importer = Importer(str(self.spool))
         importer.process_spool()
 
+        # Uploads in progress are kept
+        self.assertTrue(isfile(partial))
+        self.assertFalse(isfile(partial_expired))
+        unlink(partial)
         unlink(deb)
@@ -28,13 +28,18 @@
 #   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 #   OTHER DEALINGS IN THE SOFTWARE.
 
+from hashlib import sha256
 from logging import getLogger
 import os
 from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
 from django.conf import settings
+from django.core import mail
 from django.urls import reverse
 
+from debexpo.tools.debian.changes import Changes
+from debexpo.tools.files import CheckSumedFile
 from tests import TestController
 
 log = getLogger(__name__)
@@ -146,6 +151,24 @@ C7NQGzfRMFLSPxIHVzhHvJUo6vNZ+AA=
             os.remove(os.path.join(settings.UPLOAD_SPOOL,
                                    'incoming', 'testfile2.dsc'))
 
+    def testUploadChecksums(self):
+        """
+        Tests whether digests of uploaded files are recorded while they are
+        uploaded.
+        """
+        response = self.client.put(reverse('upload', args=['testfile2.dsc']),
+                                   data='contents')
+        self.assertEqual(response.status_code, 200)
+
+        sumed_file = CheckSumedFile(os.path.join(settings.UPLOAD_SPOOL,
+                                                 'incoming', 'testfile2.dsc'))
+        sumed_file.add_checksum('sha256', sha256(b'contents').hexdigest())
+
+        with patch.object(CheckSumedFile, '_hash_file') as hashed:
+            self.assertTrue(sumed_file.validate())
+
+        hashed.assert_not_called()
+
     def testDuplicatedUpload(self, with_subkey=False):
         """
         Tests whether a re-uploads of the same file failed with error code 403.
@@ -231,6 +254,38 @@ C7NQGzfRMFLSPxIHVzhHvJUo6vNZ+AA=
         if not with_subkey:
             self.testDuplicatedUpload(True)
 
+    def testOwnershipIndexed(self):
+        """
+        Tests whether changes validation is cached between uploads.
+        """
+        for filename, data in (('vitetris_0.58.0-1.dsc', 'contents'),
+                               ('testfile.changes', self._CHANGES_CONTENT)):
+            response = self.client.put(reverse('upload', args=[filename]),
+                                       data=data)
+            self.assertEqual(response.status_code, 200)
+
+        with patch.object(Changes, 'authenticate', autospec=True,
+                          side_effect=Changes.authenticate) as authenticate:
+            for filename in ('vitetris_0.58.0-1.dsc', 'testfile.changes',
+                             'vitetris_0.58.0-1.dsc'):
+                response = self.client.put(reverse('upload',
+                                                   args=[filename]),
+                                           data='contents')
+                self.assertEqual(response.status_code, 403)
+
+            # Changes is validated once, then its ownership is indexed
+            self.assertEqual(authenticate.call_count, 1)
+
+        # Modifying the changes invalidates the index
+        with open(os.path.join(settings.UPLOAD_SPOOL, 'incoming',
+                               'testfile.changes'), 'w') as fd:
+            fd.write(self._UNSIGNED_CHANGES_CONTENT)
+
+        response = self.client.put(reverse('upload',
+                                           args=['vitetris_0.58.0-1.dsc']),
+                                   data='contents')
+        self.assertEqual(response.status_code, 200)
+
     def testUploadNonwritableQueue(self):
         """
         Tests whether an uploads with an nonwritable queue fails.
@@ -243,3 +298,91 @@ C7NQGzfRMFLSPxIHVzhHvJUo6vNZ+AA=
             data='contents')
 
         self.assertEqual(response.status_code, 500)
+
+    def _put_files(self, directory, filenames):
+        for filename in filenames:
+            with open(os.path.join(directory, filename), 'rb') as fd:
+                response = self.client.put(reverse('upload', args=[filename]),
+                                           data=fd.read())
+
+            self.assertEqual(response.status_code, 200)
+
+    def testUploadTriggersImporter(self):
+        """
+        Tests whether the importer is started once all files of an upload are
+        present in the spool.
+        """
+        data_dir = os.path.join(os.path.dirname(__file__), 'data', 'ok')
+        incoming = os.path.join(settings.UPLOAD_SPOOL, 'incoming')
+        files = sorted(os.listdir(data_dir))
+        changes = [filename for filename in files
+                   if filename.endswith('.changes')]
+        others = [filename for filename in files
+                  if not filename.endswith('.changes')]
+        repository = TemporaryDirectory()
+        gitstorage = TemporaryDirectory()
+
+        with self.settings(REPOSITORY=repository.name,
+                           GIT_STORAGE=gitstorage.name):
+            # The changes is uploaded first, upload is not yet complete
+            self._put_files(data_dir, changes + others[:-1])
+            self.assertEqual(sorted(os.listdir(incoming)),
+                             sorted(changes + others[:-1]))
+            self.assertFalse(mail.outbox)
+
+            # Last file completes the upload: importer processes it
+            self._put_files(data_dir, others[-1:])
+            self.assertFalse(os.listdir(incoming))
+            self.assertTrue(mail.outbox)
+
+    def testUploadNoTrigger(self):
+        """
+        Tests whether the importer is not started when disabled.
+        """
+        data_dir = os.path.join(os.path.dirname(__file__), 'data', 'ok')
+        incoming = os.path.join(settings.UPLOAD_SPOOL, 'incoming')
+        files = sorted(os.listdir(data_dir))
+
+        with self.settings(IMPORTER_TRIGGER_ON_UPLOAD=False):
+            self._put_files(data_dir, files)
+
+        self.assertEqual(sorted(os.listdir(incoming)), files)
+        self.assertFalse(mail.outbox)
+
+    def testMetricsSpool(self):
+        """
+        Tests whether the metrics export the state of the spool.
+        """
+        data_dir = os.path.join(os.path.dirname(__file__), 'data', 'ok')
+
+        with self.settings(IMPORTER_TRIGGER_ON_UPLOAD=False):
+            self._put_files(data_dir, ['hello_1.0-1_amd64.changes'])
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+        metrics = response.content.decode()
+        self.assertIn('debexpo_importer_spool_queue_depth{queue="incoming"} 1',
+                      metrics)
+        self.assertIn('debexpo_importer_spool_queue_depth'
+                      '{queue="processing"} 0', metrics)
+        self.assertIn('debexpo_importer_spool_oldest_age_seconds'
+                      '{queue="processing"} 0', metrics)
+
+    def testMetricsForbidden(self):
+        """
+        Tests whether the metrics are hidden from other addresses.
+        """
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='192.0.2.1')
+        self.assertEqual(response.status_code, 403)
+
+        with self.settings(METRICS_ALLOWED_IPS=('192.0.2.0/24',)):
+            response = self.client.get(reverse('metrics'),
+                                       REMOTE_ADDR='192.0.2.1')
+            self.assertEqual(response.status_code, 200)
+
+            response = self.client.get(reverse('metrics'))
+            self.assertEqual(response.status_code, 403)
@@ -57,3 +57,14 @@ class TestHKP(TransactionTestController, LiveServerTestCase):
             '0xCA11AB1E'])
         self.assertIn('FAILURE recv-keys', output)
         self.assertEquals(2, status)
+
+    def test_gpg_search_keys(self):
+        gpg = GnuPG()
+
+        (output, status) = gpg._run(args=[
+            '--keyserver',
+            'hkp://' + self.live_server_url.split('/')[2],
+            '--search-keys',
+            'email@example.com'])
+        self.assertIn(self._GPG_FINGERPRINT[-16:], output)
+        self.assertEquals(0, status)
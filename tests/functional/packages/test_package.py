@@ -27,14 +27,19 @@
 #   OTHER DEALINGS IN THE SOFTWARE.
 
 from django.core import mail
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.test import override_settings
 from django.conf import settings
 
 from tests import TestController
 from debexpo.accounts.models import User
-from debexpo.packages.models import Package, PackageUpload, BinaryPackage
+from debexpo.packages.models import Package, PackageUpload, BinaryPackage, \
+    SourcePackage
 from debexpo.comments.models import PackageSubscription, UploadOutcome, Comment
+from debexpo.plugins.models import PluginResults, PluginSeverity
+from debexpo.repository.models import RepositoryFile
 
 
 class TestPackageController(TestController):
@@ -360,3 +365,59 @@ class TestPackageController(TestController):
 
 #    def test_package_info_data(self):
 #        self.test_package_info(data=True)
+
+    def _add_upload(self, version):
+        previous = PackageUpload.objects.filter(package__name='testpackage') \
+            .latest('uploaded')
+        upload = PackageUpload.objects.create(
+            uploader=previous.uploader,
+            package=previous.package,
+            version=version,
+            distribution=previous.distribution,
+            component=previous.component,
+            changes='changelog',
+            closes='943216')
+
+        SourcePackage.objects.create(
+            upload=upload, maintainer='Test User <email@example.com>',
+            homepage='https://example.org',
+            vcs='{"Vcs-Browser": "https://example.org/git"}')
+        BinaryPackage.objects.create(upload=upload, name='testpackage',
+                                     description='Test package')
+        PluginResults.objects.create(upload=upload, plugin='default',
+                                     test='test', outcome='outcome',
+                                     severity=PluginSeverity.info)
+        Comment.objects.create(upload=upload, user=previous.uploader,
+                               text='comment', uploaded=False,
+                               outcome=UploadOutcome.ready.value)
+        RepositoryFile.objects.create(
+            package='testpackage', version=version, component='main',
+            distribution=upload.distribution.name,
+            path=f'pool/main/t/testpackage/testpackage_{version}.dsc',
+            size=0, sha256sum='0' * 64)
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('package',
+                                               args=['testpackage']))
+
+        self.assertEquals(response.status_code, 200)
+
+        return (len(queries), response)
+
+    def test_constant_queries(self):
+        self.client.post(reverse('login'), self._AUTHDATA)
+        self._add_upload('1.0-2')
+        (before, response) = self._count_queries()
+
+        for version in ('1.0-3', '1.0-4', '1.0-5'):
+            self._add_upload(version)
+
+        (after, response) = self._count_queries()
+        self.assertEquals(before, after)
+
+        for text in ('Upload #5', 'testpackage_1.0-5.dsc', 'Vcs-Browser',
+                     'https://example.org', 'comment'):
+            self.assertIn(text, str(response.content))
+
+        RepositoryFile.objects.all().delete()
@@ -26,10 +26,14 @@
 #   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 #   OTHER DEALINGS IN THE SOFTWARE.
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from tests import TestController
-from debexpo.packages.models import Package
+from debexpo.accounts.models import User
+from debexpo.packages.models import Package, PackageUpload, BinaryPackage, \
+    Distribution, Component
 
 
 class TestPackagesController(TestController):
@@ -182,3 +186,53 @@ class TestPackagesController(TestController):
         self.assertIn('text/html', response['Content-Type'])
         self.assertIn('testpackage', str(response.content))
         self.assertNotIn('anotherpackage', str(response.content))
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEquals(200, response.status_code)
+
+        return len(queries)
+
+    def _add_packages(self, count):
+        user = User.objects.get(email='email@example.com')
+
+        for index in range(count):
+            package = Package.objects.create(name=f'extra{index}',
+                                             needs_sponsor=True)
+
+            for version in ('1.0-1', '1.0-2'):
+                upload = PackageUpload.objects.create(
+                    uploader=user,
+                    package=package,
+                    version=version,
+                    distribution=Distribution.objects.get_or_create(
+                        name='unstable')[0],
+                    component=Component.objects.get_or_create(
+                        name='main')[0],
+                    closes='')
+                BinaryPackage.objects.create(upload=upload,
+                                             name=f'extra{index}',
+                                             description='Extra package')
+
+    def test_constant_queries(self):
+        Package.objects.filter(name='testpackage').update(needs_sponsor=True)
+        urls = (
+            reverse('packages'),
+            reverse('index'),
+            reverse('packages_feed', kwargs={'feed': 'feed'}),
+        )
+        before = [self._count_queries(url) for url in urls]
+
+        self._add_packages(5)
+
+        after = [self._count_queries(url) for url in urls]
+        self.assertEquals(before, after)
+
+        response = self.client.get(reverse('packages'))
+        self._assert_content(response, 'extra4', '1.0-2 (unstable)',
+                             'Extra package')
+
+        for index in range(5):
+            Package.objects.get(name=f'extra{index}').delete()
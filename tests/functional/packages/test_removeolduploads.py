@@ -29,16 +29,26 @@ import datetime
 import logging
 from email import message_from_string
 from http.server import BaseHTTPRequestHandler
+from os import makedirs
+from os.path import isfile, join
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
 from django.conf import settings
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 
 # from debexpo.lib.email import Email
 from debexpo.accounts.models import User
 from debexpo.packages.models import Package, PackageUpload, Distribution, \
-                                    Component
+                                    Component, PackageLatestUpload, \
+                                    NewQueueSnapshot
+from debexpo.nntp.models import NNTPFeed
+from debexpo.repository.models import RepositoryFile
 from tests import TestController, TestingHTTPServer
-from debexpo.packages.tasks import remove_old_uploads, remove_uploaded_packages
+from debexpo.packages.tasks import remove_old_uploads, \
+    remove_uploaded_packages, remove_uploads, get_packages_uploaded_to_new
 from debexpo.tools.email import Email
 
 log = logging.getLogger(__name__)
@@ -47,6 +57,11 @@ Version: 1.0.0
 Distribution: unstable
 
 Source: Missing-other-fields'''
+PACKAGE_IN_NEW_HTOP = '''
+
+Source: htop
+Version: 0.9.0
+Distribution: unstable'''
 
 
 class TestCronjobRemoveOldUploads(TestController):
@@ -109,6 +124,8 @@ class TestCronjobRemoveOldUploads(TestController):
 
         PackageUpload.objects.filter(id=upload.id).update(
             uploaded=date.replace(tzinfo=datetime.timezone.utc))
+        PackageLatestUpload.objects.refresh([(package.id,
+                                              upload.distribution_id)])
 
     def _assert_cronjob_success(self):
         packages = Package.objects.all()
@@ -168,6 +185,99 @@ class TestCronjobRemoveOldUploads(TestController):
                 remove_uploaded_packages(FakeNNTPClient([]))
         self._assert_cronjob_success()
 
+    def _remove_uploaded_to_new(self, httpd):
+        with self.settings(FTP_MASTER_NEW_PACKAGES_URL='http://localhost:'
+                                                       f'{httpd.port}'):
+            remove_uploaded_packages(FakeNNTPClient([]))
+
+    def test_package_in_new_not_modified(self):
+        self._setup_packages()
+        FTPMasterPackageInNewETagHTTPHandler.requests = []
+
+        with TestingHTTPServer(FTPMasterPackageInNewETagHTTPHandler) as httpd:
+            self._remove_uploaded_to_new(httpd)
+            self._create_package('tmux', '1.0.0', 'unstable', False)
+            self._remove_uploaded_to_new(httpd)
+
+        # The queue is revalidated and the new upload is kept
+        self.assertEquals(FTPMasterPackageInNewETagHTTPHandler.requests,
+                          [None, '"new-1"'])
+        self._expect_package_removal((('tmux', '1.0.0', 'UNRELEASED'),))
+        self._assert_cronjob_success()
+
+    def test_package_in_new_incremental(self):
+        self._setup_packages()
+        FTPMasterPackageInNewChangingHTTPHandler.content = PACKAGE_IN_NEW
+
+        with TestingHTTPServer(FTPMasterPackageInNewChangingHTTPHandler) \
+                as httpd:
+            self._remove_uploaded_to_new(httpd)
+            self._create_package('tmux', '1.0.0', 'unstable', False)
+
+            # Same queue, no validators
+            self._remove_uploaded_to_new(httpd)
+
+            # Only htop was added to the queue
+            FTPMasterPackageInNewChangingHTTPHandler.content = \
+                PACKAGE_IN_NEW.replace('unstable', 'unstable\nAge: 1 hour') \
+                + PACKAGE_IN_NEW_HTOP
+            self._remove_uploaded_to_new(httpd)
+
+        self._expect_package_removal((('tmux', '1.0.0', 'UNRELEASED'),
+                                      ('htop', '0.9.0', 'unstable')))
+        self._assert_cronjob_success()
+
+    def test_package_in_new_removal_failed(self):
+        self._setup_packages()
+        FTPMasterPackageInNewChangingHTTPHandler.content = PACKAGE_IN_NEW
+
+        with TestingHTTPServer(FTPMasterPackageInNewChangingHTTPHandler) \
+                as httpd:
+            with patch('debexpo.packages.tasks.remove_uploads',
+                       side_effect=OSError('Failed')):
+                self.assertRaises(OSError, self._remove_uploaded_to_new,
+                                  httpd)
+
+            # The snapshot was not updated, the queue is processed again
+            self.assertFalse(NewQueueSnapshot.objects.exclude(
+                fingerprint='').exists())
+            self._remove_uploaded_to_new(httpd)
+
+        self.assertTrue(NewQueueSnapshot.objects.exclude(
+            fingerprint='').exists())
+        self._expect_package_removal((('tmux', '1.0.0', 'unstable'),
+                                      ('tmux', '1.0.0', 'UNRELEASED')))
+        self._assert_cronjob_success()
+
+    def test_package_in_new_single_query(self):
+        self._setup_packages()
+        FTPMasterPackageInNewChangingHTTPHandler.content = \
+            PACKAGE_IN_NEW + PACKAGE_IN_NEW_HTOP + \
+            PACKAGE_IN_NEW_HTOP.replace('htop', 'zsh') \
+                               .replace('0.9.0', '1.0.0') \
+                               .replace('unstable', 'experimental')
+
+        with TestingHTTPServer(FTPMasterPackageInNewChangingHTTPHandler) \
+                as httpd:
+            with self.settings(FTP_MASTER_NEW_PACKAGES_URL='http://localhost:'
+                                                           f'{httpd.port}'):
+                with CaptureQueriesContext(connection) as queries:
+                    uploads, snapshot = get_packages_uploaded_to_new()
+
+        self.assertEquals(len([
+            query for query in queries.captured_queries
+            if 'FROM "packages_packageupload"' in query['sql']
+        ]), 1)
+        self.assertEquals(set((upload.package.name, upload.version,
+                               upload.distribution.name)
+                              for upload in uploads), {
+            ('tmux', '1.0.0', 'unstable'),
+            ('tmux', '1.0.0', 'UNRELEASED'),
+            ('htop', '0.9.0', 'unstable'),
+            ('zsh', '1.0.0', 'unstable'),
+            ('zsh', '1.0.0', 'experimental'),
+        })
+
     def test_package_in_new_double_version(self):
         self._setup_packages()
 
@@ -204,6 +314,16 @@ class TestCronjobRemoveOldUploads(TestController):
         )
         self._assert_cronjob_success()
 
+    def test_remove_uploads_feed_scanned(self):
+        self._setup_packages()
+        feeds = {feed.name: int(feed.last)
+                 for feed in NNTPFeed.objects.all()}
+        self.remove_upload_accepted([('htop', '1.0.0', 'unstable')])
+
+        # Feeds are read up to the last scanned article
+        for feed in NNTPFeed.objects.all():
+            self.assertEquals(int(feed.last), feeds[feed.name] + 100)
+
     def test_remove_uploads_server_down(self):
         self._setup_packages()
         self.remove_upload_accepted([], True)
@@ -232,6 +352,36 @@ class TestCronjobRemoveOldUploads(TestController):
         remove_old_uploads()
         self._assert_cronjob_success()
 
+    def test_remove_uploads_expired_batches(self):
+        self._setup_packages(include_expired=True)
+        self._create_package('screen', '1.0.0', 'unstable', True)
+
+        with self.settings(MAX_AGE_UPLOAD_BATCH_SIZE=1):
+            remove_old_uploads()
+
+        self._assert_cronjob_success()
+
+    def test_latest_upload_tracking(self):
+        def get_latest(distribution):
+            return PackageLatestUpload.objects.get(
+                package__name='htop', distribution__name=distribution).uploaded
+
+        self._setup_packages()
+        uploads = PackageUpload.objects.filter(package__name='htop',
+                                               distribution__name='unstable')
+
+        self.assertEquals(get_latest('unstable'), uploads[0].uploaded)
+
+        # Removing the latest upload falls back to the previous one
+        remove_uploads([uploads[0]])
+        self.assertEquals(get_latest('unstable'), uploads[0].uploaded)
+
+        # Removing all uploads of a distribution drops its entry
+        remove_uploads(uploads)
+        self.assertFalse(PackageLatestUpload.objects.filter(
+            package__name='htop', distribution__name='unstable').exists())
+        self.assertTrue(get_latest('buster-backports'))
+
     def test_remove_uploads_keep_other_dists(self):
         removed_packages = [
                 ('htop', '1.0.0', 'unstable'),
@@ -264,6 +414,74 @@ class TestCronjobRemoveOldUploads(TestController):
         self._expect_package_removal(removed_packages)
         self._assert_cronjob_success()
 
+    def _create_repository_file(self, repository, name, version, filename):
+        path = join('pool', 'main', name[0], name, filename)
+
+        makedirs(join(repository, 'pool', 'main', name[0], name),
+                 exist_ok=True)
+        with open(join(repository, path), 'w'):
+            pass
+
+        RepositoryFile.objects.create(package=name, version=version,
+                                      component='main',
+                                      distribution='unstable', path=path,
+                                      size=0, sha256sum='0' * 64,
+                                      sources=f'Package: {name}\n')
+
+        return join(repository, path)
+
+    def _remove_uploads(self, count):
+        with TemporaryDirectory() as repository:
+            files = {}
+
+            for index in range(count):
+                name = f'package{index}'
+
+                for version in ('1.0-1', '1.0-2'):
+                    self._create_package(name, version, 'unstable', False)
+                    files[(name, version)] = self._create_repository_file(
+                        repository, name, version, f'{name}_{version}.dsc')
+
+                # Shared orig tarball
+                orig = f'{name}_1.0.orig.tar.gz'
+                for version in ('1.0-1', '1.0-2'):
+                    self._create_repository_file(repository, name, version,
+                                                 orig)
+
+                files[(name, 'orig')] = join(repository, 'pool', 'main',
+                                             name[0], name, orig)
+
+            # Remove all uploads of even packages and the first version of odd
+            # ones
+            uploads = [upload for upload in PackageUpload.objects.all()
+                       if int(upload.package.name[7:]) % 2 == 0 or
+                       upload.version == '1.0-1']
+
+            with self.settings(REPOSITORY=repository):
+                with CaptureQueriesContext(connection) as queries:
+                    removals = remove_uploads(uploads)
+
+            self.assertEquals(len(removals), count)
+
+            for (name, version), path in files.items():
+                removed = int(name[7:]) % 2 == 0 or version == '1.0-1'
+                self.assertEquals(isfile(path), not removed)
+
+            self.assertEquals(
+                set(Package.objects.values_list('name', flat=True)),
+                set(f'package{index}' for index in range(count)
+                    if index % 2))
+
+        return len(queries)
+
+    def test_remove_uploads_constant_queries(self):
+        few = self._remove_uploads(4)
+
+        Package.objects.all().delete()
+        RepositoryFile.objects.all().delete()
+
+        self.assertEquals(few, self._remove_uploads(40))
+
 
 class FTPMasterPackageInNewDoubleVersionHTTPHandler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -280,6 +498,33 @@ class FTPMasterPackageInNewHTTPHandler(BaseHTTPRequestHandler):
         self.wfile.write(bytes(PACKAGE_IN_NEW, 'UTF-8'))
 
 
+class FTPMasterPackageInNewETagHTTPHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        etag = self.headers.get('If-None-Match')
+        self.requests.append(etag)
+
+        if etag == '"new-1"':
+            self.send_response(304, 'Not Modified')
+            self.end_headers()
+            return
+
+        self.send_response(200, 'OK')
+        self.send_header('ETag', '"new-1"')
+        self.end_headers()
+        self.wfile.write(bytes(PACKAGE_IN_NEW, 'UTF-8'))
+
+
+class FTPMasterPackageInNewChangingHTTPHandler(BaseHTTPRequestHandler):
+    content = PACKAGE_IN_NEW
+
+    def do_GET(self):
+        self.send_response(200, 'OK')
+        self.end_headers()
+        self.wfile.write(bytes(self.content, 'UTF-8'))
+
+
 class FTPMasterPackageInNewErrorHTTPHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         self.send_response(500, 'Internal Server Error')
@@ -296,6 +541,7 @@ class FakeNNTPClient():
         self.garbage = garbage
         self.template = template
         self.content_type = content_type
+        self.scanned = {}
 
     def connect_to_server(self):
         return not self.down
@@ -305,6 +551,7 @@ class FakeNNTPClient():
 
     def unread_messages(self, name, last):
         self.iter += 1
+        self.scanned[name] = int(last) + 100
 
         if self.iter == 1:
             if self.garbage:
@@ -31,6 +31,7 @@ from os.path import join, abspath, dirname, isfile
 from stat import S_IMODE
 from os import replace, unlink, stat, chmod
 from shutil import copytree
+from unittest.mock import patch
 from logging import getLogger
 from gzip import GzipFile
 from lzma import LZMAFile
@@ -226,6 +227,86 @@ class TestRepositoryController(TestController):
 
         self._repo_remove_package(**self.package)
 
+    def test_sources_entry_stored(self):
+        self._repo_install_package(**self.package)
+        dsc = RepositoryFile.objects.get(path__endswith='.dsc')
+
+        self.assertIn('Package: hello', dsc.sources)
+        self.assertIn('Directory: pool/main/h/hello', dsc.sources)
+
+        # Regenerating Sources files must not parse dsc again
+        with patch.object(Repository, '_dsc_to_sources',
+                          side_effect=Exception('dsc parsed')):
+            self.repository.pending.add(('unstable', 'main'))
+            self.repository.update()
+
+        self._assert_package_in_repo([self.package])
+
+        # Entries without a stored Sources entry are computed once
+        dsc.sources = None
+        dsc.save()
+        self.repository.pending.add(('unstable', 'main'))
+        self.repository.update()
+
+        dsc.refresh_from_db()
+        self.assertIn('Package: hello', dsc.sources)
+        self._assert_package_in_repo([self.package])
+
+        self._repo_remove_package(**self.package)
+
+    def test_reinstall_identical_files(self):
+        # Install the prebuilt package from a spool-like directory
+        spool_dir = TemporaryDirectory()
+        copytree(join(abspath(dirname(__file__)), '..', 'importer', 'data',
+                      'ok'), join(spool_dir.name, 'ok'))
+        changes = Changes(self._find_all('.changes', spool_dir.name)[0])
+        changes.parse_dsc()
+
+        self.repository.install(changes)
+        self.repository.update()
+
+        pool_files = self._find_all('', join(str(self.repository), 'pool'))
+        inodes = {pool_file: stat(pool_file).st_ino
+                  for pool_file in pool_files}
+
+        self.assertEquals(len(pool_files), 3)
+        self._assert_package_in_repo([self.package])
+
+        # Installing the same files again does not touch the pool
+        with patch('debexpo.repository.models.install_file') as install_file:
+            self.repository.install(changes)
+
+        install_file.assert_not_called()
+        self.assertEquals(inodes, {pool_file: stat(pool_file).st_ino
+                                   for pool_file in pool_files})
+
+        self._repo_remove_package(**self.package)
+
+    def test_install_links_spool_files(self):
+        spool_dir = TemporaryDirectory()
+        copytree(join(abspath(dirname(__file__)), '..', 'importer', 'data',
+                      'ok'), join(spool_dir.name, 'ok'))
+        changes = Changes(self._find_all('.changes', spool_dir.name)[0])
+        changes.parse_dsc()
+
+        for spool_file in [changes.files.dsc] + changes.dsc.files.files:
+            chmod(spool_file.filename, 0o600)
+
+        self.repository.install(changes)
+        self.repository.update()
+
+        # Spool files are linked into the pool, not copied
+        pool_dir = join(str(self.repository), 'pool', 'main', 'h', 'hello')
+
+        for spool_file in [changes.files.dsc] + changes.dsc.files.files:
+            pool_file = join(pool_dir, str(spool_file))
+
+            self.assertEquals(stat(pool_file).st_ino,
+                              stat(spool_file.filename).st_ino)
+            self.assertEquals(S_IMODE(stat(pool_file).st_mode), 0o644)
+
+        self._repo_remove_package(**self.package)
+
     def test_dsc_link(self):
         package = self.package
         package['name'] = 'testpackage'
@@ -0,0 +1,317 @@
+#   test_archive.py - Test the archive index
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+from datetime import timedelta
+from gzip import open as gzip_open
+from os import makedirs, symlink
+from os.path import join
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.utils.timezone import now
+
+from tests import TestController
+
+from debexpo.archive.models import ArchiveSources, ArchiveSuite, \
+    ArchivePackage, ArchiveOrigin
+from debexpo.archive.tasks import refresh_archive_index
+from debexpo.plugins.debianqa import PluginDebianQA
+from debexpo.tools.debian.changes import Changes, ExceptionChanges
+from debexpo.tools.clients.ftp_master import ClientFTPMasterAPI
+from debexpo.tools.debian.origin import Origin, ExceptionOrigin
+from debexpo.tools.files import CheckSumedFile
+
+HELLO = """Package: hello
+Version: {version}
+Maintainer: Santiago Vila <sanvila@debian.org>
+Uploaders: Jane Doe <jane@example.org>, "Doe, John" <john@example.org>
+Checksums-Sha256:
+ {sha256} 1 hello_{version}.dsc
+ {sha256} 2 hello_2.10.orig.tar.gz
+ {sha256} 3 hello_2.10.orig.tar.gz.asc
+ {sha256} 4 hello_{version}.debian.tar.xz
+"""
+HTOP = """Package: htop
+Version: 3.0.0-1
+Maintainer: Daniel Lange <dl@example.org>
+Checksums-Sha256:
+ {sha256} 1 htop_3.0.0-1.dsc
+ {sha256} 2 htop_3.0.0.orig.tar.xz
+"""
+
+
+class TestArchiveIndex(TestController):
+    def setUp(self):
+        self.mirror = TemporaryDirectory()
+        self.sid = join(self.mirror.name, 'dists', 'sid', 'main', 'source')
+        self.experimental = join(self.mirror.name, 'dists', 'experimental',
+                                 'main', 'source')
+
+        makedirs(self.sid)
+        makedirs(self.experimental)
+        symlink('sid', join(self.mirror.name, 'dists', 'unstable'))
+
+        self._write_sources(join(self.sid, 'Sources'), [
+            HELLO.format(version='2.10-2', sha256='a' * 64),
+            HELLO.format(version='2.10-3', sha256='a' * 64),
+            HTOP.format(sha256='b' * 64),
+        ])
+        self._write_sources(join(self.experimental, 'Sources.gz'), [
+            HELLO.format(version='2.10-4', sha256='a' * 64),
+        ], gzip_open)
+
+    def tearDown(self):
+        self.mirror.cleanup()
+
+    def _write_sources(self, filename, paragraphs, opener=open):
+        with opener(filename, 'wb') as sources:
+            sources.write('\n'.join(paragraphs).encode())
+
+    def _refresh(self, **kwargs):
+        kwargs.setdefault('DEBIAN_ARCHIVE_MIRROR', self.mirror.name)
+
+        with self.settings(**kwargs):
+            refresh_archive_index()
+
+    def _outdate(self):
+        ArchiveSuite.objects.update(refreshed=now() - timedelta(days=1))
+
+    def test_archive_unavailable(self):
+        self.assertFalse(ArchiveSources.objects.is_available())
+        self.assertEquals(ArchivePackage.objects.get_versions('hello',
+                                                              'unstable'),
+                          None)
+
+    def test_archive_versions(self):
+        self._refresh()
+
+        self.assertTrue(ArchiveSources.objects.is_available())
+        self.assertEquals(ArchiveSources.objects.count(), 2)
+
+        for suite in ('sid', 'unstable'):
+            self.assertEquals(ArchivePackage.objects.get_versions('hello',
+                                                                  suite),
+                              ['2.10-2', '2.10-3'])
+
+        self.assertEquals(ArchivePackage.objects.get_versions('hello',
+                                                              'experimental'),
+                          ['2.10-4'])
+        self.assertEquals(ArchivePackage.objects.get_versions('zsh',
+                                                              'unstable'),
+                          [])
+        self.assertEquals(ArchivePackage.objects.get_versions('hello',
+                                                              'bookworm'),
+                          None)
+
+    def test_archive_outdated(self):
+        self._refresh()
+        self.assertTrue(ArchiveSuite.objects.is_fresh())
+        self.assertTrue(ArchiveSuite.objects.is_fresh('unstable'))
+        self.assertFalse(ArchiveSuite.objects.is_fresh('bookworm'))
+
+        self._outdate()
+        self.assertFalse(ArchiveSuite.objects.is_fresh())
+        self.assertEquals(ArchivePackage.objects.get_versions('hello',
+                                                              'unstable'),
+                          None)
+
+        # Suites with missing Sources files are not refreshed
+        self._refresh(DEBIAN_ARCHIVE_SOURCES={
+            'experimental': [join(self.sid, 'Sources.missing')],
+        })
+        self.assertTrue(ArchiveSuite.objects.is_fresh('unstable'))
+        self.assertFalse(ArchiveSuite.objects.is_fresh('experimental'))
+        self.assertFalse(ArchiveSuite.objects.is_fresh())
+
+    def test_archive_package(self):
+        self._refresh()
+
+        package = ArchivePackage.objects.get_package('hello')
+
+        self.assertEquals(package.version, '2.10-4')
+        self.assertEquals(package.maintainers, ['Doe, John', 'Jane Doe',
+                                                'Santiago Vila'])
+        self.assertEquals(ArchivePackage.objects.get_package('zsh'), None)
+
+    def test_archive_origin_files(self):
+        self._refresh()
+
+        origin_files = ArchiveOrigin.objects.get_origin_files('hello', '2.10')
+
+        self.assertEquals([str(origin) for origin in origin_files],
+                          ['hello_2.10.orig.tar.gz',
+                           'hello_2.10.orig.tar.gz.asc'])
+        self.assertEquals(origin_files[0].checksums['sha256'], 'a' * 64)
+        self.assertEquals(ArchiveOrigin.objects.get_origin_files('hello',
+                                                                 '2.1'),
+                          [])
+
+    def test_archive_refresh_incremental(self):
+        self._refresh()
+
+        htop = ArchivePackage.objects.get(name='htop')
+        self._write_sources(join(self.sid, 'Sources'), [
+            HELLO.format(version='2.10-3', sha256='a' * 64),
+            HTOP.format(sha256='b' * 64),
+            HTOP.format(sha256='c' * 64).replace('3.0.0', '3.0.1'),
+        ])
+
+        with patch.object(ArchiveSources, '_parse', autospec=True,
+                          side_effect=ArchiveSources._parse) as parsed:
+            self._refresh()
+
+        # Only the modified file is read again
+        self.assertEquals(parsed.call_count, 1)
+        self.assertEquals(parsed.call_args[0][0].path,
+                          join(self.sid, 'Sources'))
+
+        # And only differences are written
+        self.assertEquals(ArchivePackage.objects.get(name='htop',
+                                                     version='3.0.0-1').id,
+                          htop.id)
+        self.assertEquals(ArchivePackage.objects.get_versions('hello', 'sid'),
+                          ['2.10-3'])
+        self.assertEquals(ArchivePackage.objects.get_versions('htop', 'sid'),
+                          ['3.0.0-1', '3.0.1-1'])
+        self.assertEquals(
+            ArchiveOrigin.objects.get_origin_files('htop', '3.0.1')[0]
+            .checksums['sha256'], 'c' * 64)
+
+    def test_archive_refresh_removed(self):
+        self._refresh()
+        self._refresh(DEBIAN_ARCHIVE_MIRROR=None,
+                      DEBIAN_ARCHIVE_SOURCES={
+                          'bookworm': [join(self.sid, 'Sources')],
+                      })
+
+        self.assertEquals(ArchiveSources.objects.count(), 1)
+        self.assertEquals(ArchivePackage.objects.get_versions('hello',
+                                                              'bookworm'),
+                          ['2.10-2', '2.10-3'])
+        self.assertEquals(ArchivePackage.objects.get_versions('hello',
+                                                              'unstable'),
+                          None)
+
+        self._refresh(DEBIAN_ARCHIVE_MIRROR=None)
+
+        self.assertFalse(ArchiveSources.objects.is_available())
+        self.assertFalse(ArchivePackage.objects.exists())
+
+    def test_archive_assert_newer(self):
+        self._refresh()
+
+        with self.settings(FTP_MASTER_API_URL='http://no-nxdomain'):
+            self.assertRaises(ExceptionChanges, Changes.assert_newer,
+                              SimpleNamespace(source='hello',
+                                              version='2.10-3',
+                                              distribution='unstable'))
+            Changes.assert_newer(SimpleNamespace(source='hello',
+                                                 version='2.10-4',
+                                                 distribution='unstable'))
+
+        # Outdated suites are looked up on ftp-master
+        self._outdate()
+
+        with patch.object(ClientFTPMasterAPI, 'get_existing_versions_for',
+                          return_value=['2.10-4']) as get_versions:
+            self.assertRaises(ExceptionChanges, Changes.assert_newer,
+                              SimpleNamespace(source='hello',
+                                              version='2.10-4',
+                                              distribution='unstable'))
+            get_versions.assert_called_once_with('hello', 'unstable')
+
+    def test_archive_origin_validate(self):
+        self._refresh()
+        origin_file = CheckSumedFile('hello_2.10.orig.tar.gz')
+        origin_file.add_checksum('sha256', 'd' * 64)
+
+        with self.settings(FTP_MASTER_API_URL='http://no-nxdomain'):
+            origin = Origin('hello', '2.10', 'main', self.mirror.name)
+            self.assertRaises(ExceptionOrigin, origin.validate,
+                              [origin_file])
+            self.assertFalse(origin.is_new)
+
+            origin = Origin('zsh', '5.8', 'main', self.mirror.name)
+            origin.validate([origin_file])
+            self.assertTrue(origin.is_new)
+
+    def test_archive_origin_fallback(self):
+        self._refresh()
+        origin_file = CheckSumedFile('zsh_5.8.orig.tar.xz')
+        origin_file.add_checksum('sha256', 'd' * 64)
+        archive_file = CheckSumedFile('zsh_5.8.orig.tar.xz')
+        archive_file.add_checksum('sha256', 'e' * 64)
+
+        with patch.object(ClientFTPMasterAPI, 'get_origin_files',
+                          return_value=[archive_file]) as get_origin_files:
+            # Packages missing from an up to date index are new
+            origin = Origin('zsh', '5.8', 'main', self.mirror.name)
+            origin.validate([origin_file])
+            self.assertTrue(origin.is_new)
+            get_origin_files.assert_not_called()
+
+            # And looked up on ftp-master when the index is outdated
+            self._outdate()
+            origin = Origin('zsh', '5.8', 'main', self.mirror.name)
+            self.assertRaises(ExceptionOrigin, origin.validate,
+                              [origin_file])
+            self.assertFalse(origin.is_new)
+            get_origin_files.assert_called_once_with('zsh', '5.8')
+
+    def test_archive_debian_qa(self):
+        self._refresh()
+
+        with self.settings(TRACKER_URL='http://no-nxdomain'):
+            package = PluginDebianQA()._fetch_package('hello')
+
+            self.assertIn('Jane Doe', package.maintainers)
+            self.assertEquals(package.last_upload, None)
+
+        tracker = SimpleNamespace(name='zsh', last_upload='2020-01-01')
+
+        with patch.object(PluginDebianQA, '_fetch_from_tracker',
+                          return_value=tracker) as fetch:
+            # Packages missing from an up to date index are not in Debian
+            self.assertEquals(PluginDebianQA()._fetch_package('zsh'), None)
+            fetch.assert_not_called()
+
+            # The date of the last upload is kept in cache
+            with self.settings(DEBIAN_QA_LAST_UPLOAD_CACHE_TIME=60):
+                for i in range(2):
+                    package = PluginDebianQA()._fetch_package('hello')
+                    self.assertEquals(package.last_upload, '2020-01-01')
+
+            fetch.assert_called_once_with('hello')
+            fetch.reset_mock()
+
+            # Packages missing from an outdated index are looked up on the
+            # tracker
+            self._outdate()
+            self.assertEquals(PluginDebianQA()._fetch_package('zsh'), tracker)
+            fetch.assert_called_once_with('zsh')
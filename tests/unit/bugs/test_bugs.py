@@ -26,9 +26,36 @@
 #   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 #   OTHER DEALINGS IN THE SOFTWARE.
 
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.utils.timezone import now
+
 from tests import TestController
 
-from debexpo.bugs.models import Bug
+from debexpo.bugs.models import Bug, BugStatus
+from debexpo.bugs.tasks import refresh_bugs
+
+
+def fake_bug(number, subject='FTBFS: with foo', package='package1',
+             source='package1'):
+    return SimpleNamespace(
+        bug_num=number,
+        subject=subject,
+        pending='pending',
+        severity='serious',
+        package=package,
+        source=source,
+        originator='Submitter <submitter@example.com>',
+        owner='',
+        date=datetime(2020, 1, 1),
+        log_modified=datetime(2020, 1, 2),
+    )
+
+
+def fake_get_status(numbers):
+    return [fake_bug(number) for number in numbers]
 
 
 class TestBugs(TestController):
@@ -68,3 +95,65 @@ class TestBugs(TestController):
         )
 
         self.assertEquals(len(packages), 0)
+
+    @patch('debexpo.bugs.models.get_status', side_effect=fake_get_status)
+    def test_fetch_bugs_cached(self, get_status):
+        bugs = Bug.objects.fetch_bugs(['2', '1', 'nan'])
+
+        self.assertEquals([bug.number for bug in bugs], [1, 2])
+        self.assertEquals(bugs[0].status, BugStatus.pending)
+        self.assertEquals(list(bugs[0].sources.values_list('name', flat=True)),
+                          ['package1'])
+        get_status.assert_called_once_with([1, 2])
+
+        # Fresh bugs are not fetched again
+        bugs = Bug.objects.fetch_bugs(['1', '2', '3'])
+
+        self.assertEquals([bug.number for bug in bugs], [1, 2, 3])
+        get_status.assert_called_with([3])
+
+        # Stale bugs are
+        Bug.objects.filter(number=1).update(
+            synced=now() - timedelta(days=1))
+        Bug.objects.fetch_bugs(['1', '2'])
+
+        get_status.assert_called_with([1])
+        self.assertEquals(get_status.call_count, 3)
+
+    @patch('debexpo.bugs.models.get_status', side_effect=fake_get_status)
+    def test_sync_bugs_batches(self, get_status):
+        with self.settings(BUGS_SYNC_BATCH_SIZE=2):
+            bugs = Bug.objects.sync_bugs([3, 1, 2])
+
+        self.assertEquals(len(bugs), 3)
+        self.assertEquals([call.args[0] for call in get_status.call_args_list],
+                          [[1, 2], [3]])
+
+    def test_sync_bugs_update(self):
+        with patch('debexpo.bugs.models.get_status',
+                   return_value=[fake_bug(1)]):
+            Bug.objects.sync_bugs([1])
+
+        with patch('debexpo.bugs.models.get_status',
+                   return_value=[fake_bug(1, subject='ITP: newname -- desc',
+                                          package='wnpp', source='wnpp')]):
+            Bug.objects.sync_bugs([1])
+
+        bug = Bug.objects.get(number=1)
+
+        self.assertEquals(bug.subject, 'ITP: newname -- desc')
+        self.assertEquals(list(bug.packages.values_list('name', flat=True)),
+                          ['newname'])
+        self.assertEquals(list(bug.sources.values_list('name', flat=True)),
+                          ['newname'])
+
+    @patch('debexpo.bugs.models.get_status', side_effect=fake_get_status)
+    def test_refresh_bugs(self, get_status):
+        self._setup_example_user()
+        self._setup_example_package()
+
+        refresh_bugs()
+        refresh_bugs()
+
+        get_status.assert_called_once_with([943216])
+        self.assertTrue(Bug.objects.filter(number=943216).exists())
@@ -0,0 +1,201 @@
+#   test_importer.py - unit tests for the importer spool processing
+#
+#   This file is part of debexpo
+#   https://salsa.debian.org/mentors.debian.net-team/debexpo
+#
+#   Copyright © 2026 Debexpo contributors
+#
+#   Permission is hereby granted, free of charge, to any person
+#   obtaining a copy of this software and associated documentation
+#   files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use,
+#   copy, modify, merge, publish, distribute, sublicense, and/or sell
+#   copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following
+#   conditions:
+#
+#   The above copyright notice and this permission notice shall be
+#   included in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+#   OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+#   HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+#   WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+#   OTHER DEALINGS IN THE SOFTWARE.
+
+from types import SimpleNamespace
+from threading import current_thread, Lock
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from debexpo.accounts.models import User
+from debexpo.importer.models import Importer, Spool
+from debexpo.importer.tasks import importer, IMPORTER_REQUESTED
+from debexpo.packages.models import BinaryPackage, Distribution, Section
+from debexpo.plugins.models import PluginResults
+
+from tests import TestController
+
+
+class ImporterRecorder(Importer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.processed = []
+        self.lock = Lock()
+
+    def _process_changes(self, changes):
+        with self.lock:
+            self.processed.append((changes.source, changes.version,
+                                   current_thread().name))
+
+        return changes.version != 'reject'
+
+
+class TestImporterSpool(TestController):
+    def setUp(self):
+        self.spool_dir = TemporaryDirectory()
+        self.all_changes = [
+            SimpleNamespace(source='hello', version='1.0-1'),
+            SimpleNamespace(source='other', version='1.0-1'),
+            SimpleNamespace(source='hello', version='1.0-2'),
+        ]
+
+    def _process_spool(self, workers, all_changes):
+        importer = ImporterRecorder(self.spool_dir.name, skip_gpg=True)
+
+        with self.settings(IMPORTER_WORKERS=workers):
+            with patch.object(Spool, 'changes_to_process',
+                              return_value=all_changes):
+                success = importer.process_spool()
+
+        return (importer, success)
+
+    def test_group_by_source(self):
+        importer = Importer()
+        queues = importer._group_by_source(self.all_changes)
+
+        self.assertEquals([[(changes.source, changes.version)
+                            for changes in queue] for queue in queues],
+                          [[('hello', '1.0-1'), ('hello', '1.0-2')],
+                           [('other', '1.0-1')]])
+
+    def test_process_spool_sequential(self):
+        importer, success = self._process_spool(1, self.all_changes)
+
+        self.assertTrue(success)
+        self.assertEquals([item[:2] for item in importer.processed],
+                          [('hello', '1.0-1'), ('hello', '1.0-2'),
+                           ('other', '1.0-1')])
+        self.assertEquals(set(item[2] for item in importer.processed),
+                          set([current_thread().name]))
+
+    def test_process_spool_concurrent(self):
+        importer, success = self._process_spool(2, self.all_changes)
+        processed = [item[:2] for item in importer.processed]
+
+        self.assertTrue(success)
+        self.assertEquals(len(processed), 3)
+
+        # Uploads of the same source are processed in order by a single worker
+        hello = [item for item in importer.processed if item[0] == 'hello']
+        self.assertEquals([item[1] for item in hello], ['1.0-1', '1.0-2'])
+        self.assertEquals(len(set(item[2] for item in hello)), 1)
+        self.assertNotIn(current_thread().name,
+                         [item[2] for item in importer.processed])
+
+    def test_process_spool_concurrent_rejected(self):
+        self.all_changes.append(SimpleNamespace(source='other',
+                                                version='reject'))
+        importer, success = self._process_spool(2, self.all_changes)
+
+        self.assertFalse(success)
+        self.assertEquals(len(importer.processed), 4)
+
+    def test_importer_requested_after_lock(self):
+        passes = []
+
+        def process_spool():
+            passes.append(True)
+
+            # Trigger landing after the last check of the flag, before the
+            # lock is released
+            if len(passes) == 1:
+                cache.set(IMPORTER_REQUESTED, True, timeout=None)
+            else:
+                cache.delete(IMPORTER_REQUESTED)
+
+            return True
+
+        with patch('debexpo.importer.tasks._process_spool',
+                   side_effect=process_spool):
+            self.assertTrue(importer())
+
+        self.assertEquals(len(passes), 2)
+        self.assertFalse(cache.get(IMPORTER_REQUESTED))
+
+
+class TestImporterDBEntries(TestController):
+    def setUp(self):
+        self._setup_example_user()
+        Distribution.objects.get_or_create(name='unstable')
+
+    def tearDown(self):
+        self._remove_example_user()
+
+    def _create_db_entries(self, version, binaries):
+        changes = SimpleNamespace(
+            source='hello',
+            uploader=User.objects.get(email='email@example.com'),
+            version=version,
+            distribution='unstable',
+            files=SimpleNamespace(files=[SimpleNamespace(component='main')]),
+            changes='hello (1.0-1) unstable; urgency=medium',
+            closes='',
+        )
+        packages = [{'package': f'hello{index}', 'architecture': 'any',
+                     'description': 'A binary', 'section': f'section{index}',
+                     'priority': 'optional'} for index in range(binaries)]
+        control = SimpleNamespace(
+            get_source_package=lambda: {'maintainer': 'Maintainer '
+                                                      '<email@example.com>',
+                                        'section': 'section0'},
+            get_binary_packages=lambda: packages,
+        )
+        plugins = SimpleNamespace(results=[
+            PluginResults(plugin='test', test=f'test{index}', outcome='ok',
+                          data={}, severity=1) for index in range(binaries)])
+
+        with CaptureQueriesContext(connection) as queries:
+            upload = Importer()._create_db_entries(
+                changes, SimpleNamespace(control=control), plugins, None)
+
+        return upload, len(queries)
+
+    def test_create_db_entries(self):
+        upload, _ = self._create_db_entries('1.0-1', 3)
+
+        self.assertEquals(BinaryPackage.objects.filter(upload=upload).count(),
+                          3)
+        self.assertEquals(PluginResults.objects.filter(upload=upload).count(),
+                          3)
+        self.assertEquals(
+            BinaryPackage.objects.get(upload=upload, name='hello2')
+            .section.name, 'section2')
+
+    def test_create_db_entries_constant_queries(self):
+        # Create the package, component and priority first
+        self._create_db_entries('1.0-1', 1)
+
+        Section.objects.all().delete()
+        _, few = self._create_db_entries('1.0-2', 2)
+        Section.objects.all().delete()
+        _, many = self._create_db_entries('1.0-3', 20)
+
+        self.assertEquals(few, many)
@@ -27,11 +27,24 @@
 #   OTHER DEALINGS IN THE SOFTWARE.
 
 from tests import TestController
+from hashlib import sha256
+from os import chmod, environ, replace
+from os.path import basename, join
+from tempfile import TemporaryDirectory
+from threading import Barrier, current_thread, main_thread
 from types import SimpleNamespace
+from unittest.mock import patch
 
 from debexpo.plugins.models import PluginManager, BasePlugin, PluginSeverity, \
-    PluginResults, ExceptionPlugin
+    PluginResults, ExceptionPlugin, PluginResource
 from debexpo.plugins.maintaineremail import PluginMaintainerEmail
+from debexpo.plugins.lintian import PluginLintian, _get_lintian_version
+from debexpo.tools.files import CheckSumedFile
+
+
+class ChangesStub(SimpleNamespace):
+    def __str__(self):
+        return basename(self.filename)
 
 
 class PluginBad(BasePlugin):
@@ -56,7 +69,93 @@ class PluginFails(BasePlugin):
         self.failed('failing')
 
 
+class PluginConcurrent(BasePlugin):
+    resource = PluginResource.process
+    barrier = Barrier(2, timeout=10)
+
+    @property
+    def name(self):
+        return 'plugin-concurrent'
+
+    def run(self, changes, source):
+        # Only passes if another plugin runs at the same time
+        self.barrier.wait()
+        self.add_result('thread', current_thread() != main_thread())
+
+
+class PluginConcurrentNetwork(PluginConcurrent):
+    resource = PluginResource.network
+
+    @property
+    def name(self):
+        return 'plugin-concurrent-network'
+
+
+class PluginMainThread(BasePlugin):
+    @property
+    def name(self):
+        return 'plugin-main-thread'
+
+    def run(self, changes, source):
+        self.add_result('thread', current_thread() != main_thread())
+
+
+class PluginCached(BasePlugin):
+    runs = 0
+    version = '1.0'
+
+    @property
+    def name(self):
+        return 'plugin-cached'
+
+    def get_cache_inputs(self, changes, source):
+        return [changes.digest]
+
+    def get_version(self):
+        return self.version
+
+    def run(self, changes, source):
+        PluginCached.runs += 1
+        self.add_result('cached-test', 'passing', {'digest': changes.digest},
+                        PluginSeverity.warning)
+
+
 class TestPluginManager(TestController):
+    concurrent_plugins = (
+        ('tests.unit.importer.test_plugins', 'PluginMainThread'),
+        ('tests.unit.importer.test_plugins', 'PluginConcurrent'),
+        ('tests.unit.importer.test_plugins', 'PluginFails'),
+        ('tests.unit.importer.test_plugins', 'PluginConcurrentNetwork'),
+    )
+
+    def test_plugin_manager_concurrent(self):
+        with self.settings(IMPORTER_PLUGINS=self.concurrent_plugins,
+                           IMPORTER_PLUGIN_WORKERS=2):
+            plugins = PluginManager()
+            plugins.run(None, None)
+
+        # Results are in plugins order
+        self.assertEquals([(result.plugin, result.outcome)
+                           for result in plugins.results],
+                          [('plugin-main-thread', False),
+                           ('plugin-concurrent', True),
+                           ('plugin-fails', 'failing'),
+                           ('plugin-concurrent-network', True)])
+
+        # With per-plugin timings
+        self.assertEquals(set(plugins.timings.keys()),
+                          set(plugin.name for plugin in plugins.plugins))
+        for timing in plugins.timings.values():
+            self.assertGreaterEqual(timing.wall, 0)
+            self.assertGreaterEqual(timing.cpu, 0)
+
+    def test_plugin_manager_sequential(self):
+        with self.settings(IMPORTER_PLUGINS=self.concurrent_plugins[:1],
+                           IMPORTER_PLUGIN_WORKERS=1):
+            plugins = PluginManager()
+            plugins.run(None, None)
+
+        self.assertEquals(plugins.results[0].outcome, False)
 
     def test_plugin_manager_import_inexistent_plugin(self):
         with self.settings(IMPORTER_PLUGINS=(('debexpo.plugins.not-a-plugin',
@@ -117,3 +216,90 @@ class TestPluginMaintainerEmail(TestController):
             plugin.run(changes, None)
 
         self.assertIn('No maintainer address found', str(e.exception))
+
+    def _run_cached(self, digest):
+        with self.settings(IMPORTER_PLUGINS=(
+                ('tests.unit.importer.test_plugins', 'PluginCached'),),
+                IMPORTER_PLUGIN_CACHE_TIME=60):
+            plugins = PluginManager()
+            plugins.run(SimpleNamespace(digest=digest), None)
+
+        return plugins.results
+
+    def test_plugin_manager_cache(self):
+        stats = PluginManager.get_cache_stats()
+        PluginCached.runs = 0
+
+        # First run is a miss
+        first = self._run_cached('abc')
+        self.assertEquals(PluginCached.runs, 1)
+
+        # Same inputs are served from cache
+        results = self._run_cached('abc')
+        self.assertEquals(PluginCached.runs, 1)
+        self.assertEquals([(result.plugin, result.test, result.outcome,
+                            result.data, result.severity)
+                           for result in results],
+                          [(result.plugin, result.test, result.outcome,
+                            result.data, result.severity)
+                           for result in first])
+
+        # Other inputs or plugin version are not
+        self._run_cached('def')
+        self.assertEquals(PluginCached.runs, 2)
+
+        with patch.object(PluginCached, 'version', '2.0'):
+            self._run_cached('abc')
+        self.assertEquals(PluginCached.runs, 3)
+
+        self.assertEquals(PluginManager.get_cache_stats(),
+                          {'hits': stats['hits'] + 1,
+                           'misses': stats['misses'] + 3})
+
+    def test_plugin_manager_cache_disabled(self):
+        PluginCached.runs = 0
+
+        with self.settings(IMPORTER_PLUGINS=(
+                ('tests.unit.importer.test_plugins', 'PluginCached'),)):
+            for i in range(2):
+                PluginManager().run(SimpleNamespace(digest='abc'), None)
+
+        self.assertEquals(PluginCached.runs, 2)
+
+    def test_lintian_version(self):
+        with TemporaryDirectory() as bindir:
+            lintian = join(bindir, 'lintian')
+
+            def install_lintian(version):
+                with open(f'{lintian}.new', 'w') as script:
+                    script.write(f'#!/bin/sh\necho "Lintian v{version}"\n')
+
+                chmod(f'{lintian}.new', 0o755)
+                replace(f'{lintian}.new', lintian)
+
+            with patch.dict(environ, {'PATH': bindir}):
+                install_lintian('2.116.3')
+                self.assertEquals(_get_lintian_version(), 'Lintian v2.116.3')
+
+                # Upgrading lintian changes the version
+                install_lintian('2.117.0')
+                self.assertEquals(_get_lintian_version(), 'Lintian v2.117.0')
+
+    def test_lintian_cache_inputs(self):
+        with TemporaryDirectory() as upload:
+            filename = join(upload, 'hello_1.0-1_amd64.changes')
+
+            with open(filename, 'w') as changes_file:
+                changes_file.write('Source: hello\n')
+
+            dsc = CheckSumedFile(join(upload, 'hello_1.0-1.dsc'))
+            dsc.add_checksum('sha256', 'a' * 64)
+            changes = ChangesStub(distribution='unstable', filename=filename,
+                                  files=SimpleNamespace(files=[dsc]))
+
+            inputs = PluginLintian().get_cache_inputs(changes, None)
+
+            # The changes itself is checked by lintian
+            self.assertIn('hello_1.0-1_amd64.changes ' + sha256(
+                b'Source: hello\n').hexdigest(), inputs)
+            self.assertIn(f'hello_1.0-1.dsc {"a" * 64}', inputs)
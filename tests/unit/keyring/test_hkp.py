@@ -28,7 +28,7 @@
 
 from django.urls import reverse
 
-from debexpo.keyring.models import SubKey
+from debexpo.keyring.models import Key, SubKey
 
 from tests import TestController
 
@@ -51,8 +51,10 @@ class TestHKP(TestController):
     def setUp(self):
         self._setup_example_user(gpg=True)
         another = self._setup_example_user(email='another@example.org')
+        # Both keys share the same short ID
         self._add_gpg_key(another, _GPGKEY,
-                          'FINGERPRINT', '22', 256)
+                          'FINGERPRINT' + self._GPG_FINGERPRINT[-8:], '22',
+                          256)
 
     def test_op(self):
         # Missing op parameter: 400
@@ -83,7 +85,7 @@ class TestHKP(TestController):
         # Multiple matches: 500
         response = self.client.get(reverse('hkp'),
                                    {'op': 'get',
-                                    'search': ''})
+                                    'search': self._GPG_FINGERPRINT[-8:]})
         self.assertEquals(response.status_code, 500)
         self.assertIn("Multiple matches found", str(response.content))
 
@@ -104,3 +106,124 @@ class TestHKP(TestController):
         })
         self.assertIn(self._GPG_KEY, response.content.decode())
         self.assertEquals(response.status_code, 200)
+
+        # Matches long id of a subkey, in lower case: 200
+        response = self.client.get(reverse('hkp'), {
+            'op': 'get',
+            'search': '0x' + fingerprint[-16:].lower()
+        })
+        self.assertIn(self._GPG_KEY, response.content.decode())
+        self.assertEquals(response.status_code, 200)
+
+    def test_key_ids(self):
+        key = Key.objects.get(fingerprint=self._GPG_FINGERPRINT)
+        subkey = key.subkey_set.first()
+
+        self.assertEquals(key.long_id, self._GPG_FINGERPRINT[-16:])
+        self.assertEquals(key.short_id, self._GPG_FINGERPRINT[-8:])
+        self.assertEquals(subkey.long_id, subkey.fingerprint[-16:])
+
+        for key_id in (self._GPG_FINGERPRINT, self._GPG_FINGERPRINT[-16:],
+                       subkey.fingerprint, subkey.fingerprint[-16:]):
+            self.assertEquals(Key.objects.get_key_by_fingerprint(key_id), key)
+
+        self.assertRaises(Key.MultipleObjectsReturned,
+                          Key.objects.get_key_by_fingerprint,
+                          self._GPG_FINGERPRINT[-8:])
+        self.assertRaises(Key.DoesNotExist,
+                          Key.objects.get_key_by_fingerprint,
+                          self._GPG_FINGERPRINT[-12:])
+
+    def test_get_many(self):
+        # Several key ids in a single search: 200
+        fingerprint = SubKey.objects.filter(
+            key__fingerprint=self._GPG_FINGERPRINT).first().fingerprint
+        response = self.client.get(reverse('hkp'), {
+            'op': 'get',
+            'search': f'0x{self._GPG_FINGERPRINT} {fingerprint[-16:]}'
+        })
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response['Content-Type'], 'application/pgp-keys')
+        self.assertEquals(response.content.decode().count(self._GPG_KEY), 1)
+
+    def test_index(self):
+        for op in ('index', 'vindex'):
+            # Search by email
+            response = self.client.get(reverse('hkp'),
+                                       {'op': op,
+                                        'search': 'email@example.com',
+                                        'options': 'mr'})
+            self.assertEquals(response.status_code, 200)
+            self.assertEquals(response['Content-Type'], 'text/plain')
+
+            lines = response.content.decode().splitlines()
+            self.assertEquals(lines[0], 'info:1:1')
+            self.assertTrue(lines[1].startswith(
+                f'pub:{self._GPG_FINGERPRINT}:22:255:1542554026::'))
+            self.assertIn('uid:Test user <email@example.com>:1542554088::',
+                          lines)
+
+        # Search in user IDs
+        response = self.client.get(reverse('hkp'),
+                                   {'op': 'index',
+                                    'search': 'test'})
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.content.decode().startswith('info:1:2\n'))
+
+        response = self.client.get(reverse('hkp'),
+                                   {'op': 'index',
+                                    'search': 'test user <email@example.com>',
+                                    'exact': 'on'})
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.content.decode().startswith('info:1:1\n'))
+
+        response = self.client.get(reverse('hkp'),
+                                   {'op': 'index',
+                                    'search': 'test',
+                                    'exact': 'on'})
+        self.assertEquals(response.status_code, 404)
+
+    def test_index_private(self):
+        # Accounts are not searched: the email of the second user is not in
+        # its key
+        for search in ('another@example.org', 'another', 'Test user'):
+            response = self.client.get(reverse('hkp'),
+                                       {'op': 'index',
+                                        'search': search})
+            self.assertNotIn('FINGERPRINT', response.content.decode())
+
+        response = self.client.get(reverse('hkp'),
+                                   {'op': 'index',
+                                    'search': 'another@example.org'})
+        self.assertEquals(response.status_code, 404)
+
+        # Short searches are refused
+        response = self.client.get(reverse('hkp'),
+                                   {'op': 'index',
+                                    'search': 'e'})
+        self.assertEquals(response.status_code, 400)
+
+    def test_cache(self):
+        search = {'op': 'get', 'search': self._GPG_FINGERPRINT}
+        response = self.client.get(reverse('hkp'), search)
+        etag = response['ETag']
+
+        self.assertEquals(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+        # Cached response is not modified
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('hkp'), search,
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+
+        # Updating a key invalidates cached responses
+        key = Key.objects.get(fingerprint=self._GPG_FINGERPRINT)
+        key.key = _GPGKEY
+        key.save()
+
+        response = self.client.get(reverse('hkp'), search,
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+        self.assertIn(_GPGKEY, response.content.decode())
+        self.assertNotEquals(response['ETag'], etag)
@@ -27,6 +27,7 @@
 #   OTHER DEALINGS IN THE SOFTWARE.
 
 import unittest
+from http.server import BaseHTTPRequestHandler
 from tempfile import NamedTemporaryFile
 from os import unlink
 
@@ -35,6 +36,7 @@ from django.test import tag
 from tests import TestController, TestingHTTPServer, InfinityHTTPHandler
 from tests.tools import test_network
 
+from debexpo.importer.metrics import render_metrics
 from debexpo.tools.clients import ClientHTTP, ExceptionClient, \
     ExceptionClientSize, ClientJsonAPI
 
@@ -113,3 +115,124 @@ class TestClientsController(TestController):
 
         self.assertRaises(ExceptionClient, client.fetch_resource,
                           'https://www.debian.org/windows')
+
+
+class CachedHTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    cache_control = None
+    connections = 0
+    requests = 0
+
+    def setup(self):
+        super().setup()
+        CachedHTTPHandler.connections += 1
+
+    def do_GET(self):
+        CachedHTTPHandler.requests += 1
+
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304, 'Not Modified')
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        content = f'content of {self.path}'.encode()
+
+        self.send_response(200, 'OK')
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(content)))
+
+        if self.cache_control:
+            self.send_header('Cache-Control', self.cache_control)
+
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestClientsCache(TestController):
+    def setUp(self):
+        CachedHTTPHandler.connections = 0
+        CachedHTTPHandler.requests = 0
+        CachedHTTPHandler.cache_control = None
+        self.client = ClientHTTP()
+
+    def _fetch_twice(self, path):
+        with TestingHTTPServer(CachedHTTPHandler) as httpd:
+            url = f'http://localhost:{httpd.port}/{path}'
+
+            try:
+                with self.settings(HTTP_CACHE_TIME=60):
+                    contents = [self.client.fetch_resource(url)
+                                for i in range(2)]
+            finally:
+                # Let the server shutdown
+                self.client._drop_connection('http', f'localhost:{httpd.port}')
+
+        for content in contents:
+            self.assertEquals(content, f'content of /{path}'.encode())
+
+        return url
+
+    def test_client_keep_alive(self):
+        CachedHTTPHandler.cache_control = 'no-store'
+        self._fetch_twice('keep-alive')
+
+        self.assertEquals(CachedHTTPHandler.requests, 2)
+        self.assertEquals(CachedHTTPHandler.connections, 1)
+
+    def test_client_cache(self):
+        url = self._fetch_twice('cached')
+
+        self.assertEquals(CachedHTTPHandler.requests, 1)
+        self.assertEquals(
+            ClientHTTP.get_stats()[self.client._get_endpoint(url)]['hits'], 1
+        )
+
+    def test_client_cache_revalidate(self):
+        CachedHTTPHandler.cache_control = 'no-cache'
+        url = self._fetch_twice('revalidated')
+
+        self.assertEquals(CachedHTTPHandler.requests, 2)
+        stats = ClientHTTP.get_stats()[self.client._get_endpoint(url)]
+        self.assertEquals(stats['requests'], 2)
+        self.assertEquals(stats['hits'], 1)
+
+        # Exported with the importer metrics
+        endpoint = self.client._get_endpoint(url)
+        metrics = render_metrics()
+        self.assertIn(f'debexpo_http_client_requests_total'
+                      f'{{endpoint="{endpoint}"}} 2', metrics)
+        self.assertIn(f'debexpo_http_client_cache_hits_total'
+                      f'{{endpoint="{endpoint}"}} 1', metrics)
+
+    def test_client_cache_disabled(self):
+        with TestingHTTPServer(CachedHTTPHandler) as httpd:
+            url = f'http://localhost:{httpd.port}/disabled'
+
+            try:
+                for i in range(2):
+                    self.client.fetch_resource(url)
+            finally:
+                self.client._drop_connection('http', f'localhost:{httpd.port}')
+
+        self.assertEquals(CachedHTTPHandler.requests, 2)
+
+    def test_client_reconnect(self):
+        with TestingHTTPServer(CachedHTTPHandler) as httpd:
+            url = f'http://localhost:{httpd.port}/reconnect'
+
+            try:
+                self.client.fetch_resource(url)
+
+                # Simulate the server closing the idle connection
+                self.client._get_connection(
+                    'http', f'localhost:{httpd.port}').sock.shutdown(2)
+                self.client.fetch_resource(url)
+            finally:
+                self.client._drop_connection('http', f'localhost:{httpd.port}')
+
+        self.assertEquals(CachedHTTPHandler.connections, 2)
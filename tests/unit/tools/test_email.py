@@ -26,9 +26,16 @@
 #   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 #   OTHER DEALINGS IN THE SOFTWARE.
 
+from smtplib import SMTPServerDisconnected
+from unittest.mock import patch
+
+from kombu.exceptions import OperationalError
+
 from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
 from django.test import TestCase
-from debexpo.tools.email import Email
+from debexpo.base.tasks import send_emails
+from debexpo.tools.email import Email, outbox
 
 
 class TestMail(TestCase):
@@ -69,3 +76,74 @@ class TestMail(TestCase):
                         bounce_to=bounce)
 
         self._assert_mail_content(mail.outbox[0], bounce=bounce)
+
+    def test_outbox(self):
+        with patch.object(EmailBackend, 'open', autospec=True,
+                          side_effect=EmailBackend.open) as connected, \
+                self.settings(EMAIL_BATCH_SIZE=2):
+            with outbox():
+                for index in range(3):
+                    self.email.send(f'Subject {index}', ['user@example.org'])
+
+                    # Nested outboxes are merged
+                    with outbox():
+                        self.email.send(f'Nested {index}',
+                                        ['user@example.org'])
+
+                self.assertEquals(len(mail.outbox), 0)
+
+        self.assertEquals([email.subject for email in mail.outbox],
+                          ['Subject 0', 'Nested 0', 'Subject 1', 'Nested 1',
+                           'Subject 2', 'Nested 2'])
+        self.assertEquals(connected.call_count, 3)
+
+    def test_retry(self):
+        send_messages = EmailBackend.send_messages
+        failures = []
+
+        def fail_once(backend, messages):
+            if messages[0].subject not in failures:
+                failures.append(messages[0].subject)
+                raise SMTPServerDisconnected('Connection lost')
+
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, 'send_messages', autospec=True,
+                          side_effect=fail_once), \
+                self.settings(EMAIL_RETRY_DELAY=0):
+            with outbox():
+                self.email.send('First', ['user@example.org'])
+                self.email.send('Second', ['user@example.org'])
+
+        self.assertEquals(sorted(email.subject for email in mail.outbox),
+                          ['First', 'Second'])
+
+    def test_retry_give_up(self):
+        with patch.object(EmailBackend, 'send_messages',
+                          side_effect=SMTPServerDisconnected('Down')) as sent, \
+                self.settings(EMAIL_RETRY_DELAY=0, EMAIL_MAX_RETRIES=2):
+            self.email.send('My subject', ['user@example.org'])
+
+        self.assertEquals(sent.call_count, 3)
+        self.assertEquals(len(mail.outbox), 0)
+
+    def test_outbox_error(self):
+        # Emails sent before an error are delivered
+        with self.assertRaises(ValueError):
+            with outbox():
+                self.email.send('My subject', ['user@example.org'])
+                raise ValueError('Import failed')
+
+        self.assertEquals(len(mail.outbox), 1)
+
+        # A broker failure does not hide the original error
+        with patch.object(send_emails, 'delay',
+                          side_effect=OperationalError('Broker down')):
+            with self.assertRaises(ValueError):
+                with outbox():
+                    self.email.send('My subject', ['user@example.org'])
+                    raise ValueError('Import failed')
+
+            with self.assertRaises(OperationalError):
+                with outbox():
+                    self.email.send('My subject', ['user@example.org'])
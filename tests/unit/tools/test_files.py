@@ -31,12 +31,19 @@
 Test cases for debexpo.tools.files
 """
 
+from hashlib import sha256
+from os import chmod, listdir, mkdir, replace, stat
+from os.path import join
+from stat import S_IMODE
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from unittest.mock import Mock, patch
+
 from tests import TestController
-from debexpo.tools.gnupg import ExceptionGnuPGNotSignedFile, \
+from debexpo.tools.gnupg import GnuPG, ExceptionGnuPGNotSignedFile, \
     ExceptionGnuPG, ExceptionGnuPGNoPubKey
 from debexpo.tools.files import GPGSignedFile, CheckSumedFile, \
     ExceptionCheckSumedFileNoFile, ExceptionCheckSumedFileFailedSum, \
-    ExceptionCheckSumedFileNoMethod
+    ExceptionCheckSumedFileNoMethod, CheckSumedFileWriter, install_file
 from debexpo.accounts.models import User
 from debexpo.keyring.models import Key
 from tests.unit.tools.test_gnupg import signed_file, test_gpg_key, \
@@ -81,6 +88,99 @@ class TestGPGSignedFileController(TestController):
         # Remove user and key
         user.delete()
 
+    def test_signed_file_no_keyring(self):
+        with self.settings(GPG_KEYRING=None):
+            self.test_signed_file()
+
+    def test_signed_file_keyring(self):
+        user = User.objects.create_user('debexpo@example.org',
+                                        'debexpo testing', 'password')
+        user.save()
+
+        # Key is synced to the keyring when added
+        self._add_gpg_key(user, test_gpg_key, test_gpg_key_fpr,
+                          test_gpg_key_algo, test_gpg_key_size)
+
+        with patch.object(GnuPG, 'verify_sig', autospec=True,
+                          side_effect=GnuPG.verify_sig) as verify_sig:
+            changes = GPGSignedFile(signed_file)
+            changes.authenticate()
+
+        self.assertEquals(changes.get_key(), Key.objects.get(user=user))
+        self.assertEquals(verify_sig.call_count, 1)
+
+        # Key is still known to the keyring once removed from the database
+        user.delete()
+        keyring = Key.objects.get_keyring()
+        self.assertIn(test_gpg_key_fpr,
+                      [key.fpr for key in keyring.get_keys_data()])
+
+        # But the file is not considered signed by a known key anymore
+        changes = GPGSignedFile(signed_file)
+        self.assertRaises(ExceptionGnuPGNoPubKey, changes.authenticate)
+        self.assertNotIn(test_gpg_key_fpr,
+                         [key.fpr for key in keyring.get_keys_data()])
+
+    def test_verify_signatures(self):
+        user = User.objects.create_user('debexpo@example.org',
+                                        'debexpo testing', 'password')
+        user.save()
+        self._add_gpg_key(user, test_gpg_key, test_gpg_key_fpr,
+                          test_gpg_key_algo, test_gpg_key_size)
+
+        # Drop any key left in the keyring by a previous test
+        Key.objects.get_keyring().delete_key(test_gpg1_key_fpr)
+
+        signed = GPGSignedFile(signed_file)
+        unknown = GPGSignedFile(signed_file_v1)
+        plain = GPGSignedFile('/etc/passwd')
+
+        with patch.object(GnuPG, 'verify_sig', autospec=True,
+                          side_effect=GnuPG.verify_sig) as verify_sig:
+            GPGSignedFile.verify_signatures([signed, unknown, plain])
+
+            signed.authenticate()
+            self.assertRaises(ExceptionGnuPGNoPubKey, unknown.authenticate)
+            self.assertRaises(ExceptionGnuPGNotSignedFile, plain.authenticate)
+
+        self.assertEquals(signed.get_key(), Key.objects.get(user=user))
+        self.assertEquals(verify_sig.call_count, 0)
+
+        # Without keyring, signatures are verified by authenticate()
+        with self.settings(GPG_KEYRING=None):
+            signed = GPGSignedFile(signed_file)
+            GPGSignedFile.verify_signatures([signed])
+            signed.authenticate()
+
+        self.assertEquals(signed.get_key(), Key.objects.get(user=user))
+        user.delete()
+
+    def test_signed_file_keyring_not_synced(self):
+        user = User.objects.create_user('debexpo@example.org',
+                                        'debexpo testing', 'password')
+        user.save()
+
+        with self.settings(GPG_KEYRING=None):
+            self._add_gpg_key(user, test_gpg_key, test_gpg_key_fpr,
+                              test_gpg_key_algo, test_gpg_key_size)
+
+        # Key is missing from the keyring and imported on first use
+        keyring = Key.objects.get_keyring()
+        keyring.delete_key(test_gpg_key_fpr)
+
+        changes = GPGSignedFile(signed_file)
+        changes.authenticate()
+
+        self.assertEquals(changes.get_key(), Key.objects.get(user=user))
+        self.assertIn(test_gpg_key_fpr,
+                      [key.fpr for key in keyring.get_keys_data()])
+
+        # Deleting the key removes it from the keyring
+        Key.objects.get(user=user).delete()
+        self.assertNotIn(test_gpg_key_fpr,
+                         [key.fpr for key in keyring.get_keys_data()])
+        user.delete()
+
 
 class TestCheckSumedFile(TestController):
     def test_invalid_file(self):
@@ -120,3 +220,231 @@ class TestCheckSumedFile(TestController):
             'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'
         )
         self.assertTrue(sumed_file.validate())
+
+    def test_sumed_file_cache(self):
+        with NamedTemporaryFile() as data:
+            data.write(b'debexpo')
+            data.flush()
+
+            sumed_file = CheckSumedFile(data.name)
+            sumed_file.add_checksum(
+                'sha256',
+                'ba193667500dfc5f5f6979d7ddc89100'
+                'b2064947b9779f0068770562bb21a454'
+            )
+
+            with patch.object(CheckSumedFile, '_hash_file', autospec=True,
+                              side_effect=CheckSumedFile._hash_file) as hashed:
+                # Both digests are computed in a single pass
+                checksums = sumed_file.compute_checksums()
+                self.assertEquals(hashed.call_count, 1)
+                self.assertEquals(checksums['sha256'],
+                                  sumed_file.checksums['sha256'])
+                self.assertEquals(checksums['sha512'][:32],
+                                  'fc4044111cfbee385427cb596f4415b9')
+
+                # And are not computed again
+                self.assertTrue(sumed_file.validate())
+                self.assertEquals(hashed.call_count, 1)
+
+                # Unless the file is modified
+                data.write(b' testing')
+                data.flush()
+                self.assertRaises(ExceptionCheckSumedFileFailedSum,
+                                  sumed_file.validate)
+                self.assertEquals(hashed.call_count, 2)
+
+    def test_sumed_file_cache_move(self):
+        with TemporaryDirectory() as directory:
+            filename = join(directory, 'debexpo')
+
+            with open(filename, 'w') as fh:
+                fh.write('debexpo')
+
+            sumed_file = CheckSumedFile(filename)
+            checksums = sumed_file.compute_checksums()
+            mkdir(join(directory, 'dest'))
+
+            # Digests are kept when the file is moved
+            with patch.object(CheckSumedFile, '_hash_file') as hashed:
+                sumed_file.move(join(directory, 'dest'))
+                self.assertEquals(sumed_file.compute_checksums(), checksums)
+
+            hashed.assert_not_called()
+
+    def test_sumed_file_writer(self):
+        with TemporaryDirectory() as directory:
+            filename = join(directory, 'debexpo')
+
+            with CheckSumedFileWriter(filename) as fh:
+                fh.write(b'deb')
+                fh.write(b'expo')
+
+            sumed_file = CheckSumedFile(filename)
+            sumed_file.add_checksum(
+                'sha256',
+                'ba193667500dfc5f5f6979d7ddc89100'
+                'b2064947b9779f0068770562bb21a454'
+            )
+
+            # Digests computed while writing are used
+            with patch.object(CheckSumedFile, '_hash_file') as hashed:
+                self.assertTrue(sumed_file.validate())
+                self.assertEquals(
+                    sumed_file.compute_checksums()['sha512'][:32],
+                    'fc4044111cfbee385427cb596f4415b9')
+
+            hashed.assert_not_called()
+
+    def test_sumed_file_writer_interleaved(self):
+        with TemporaryDirectory() as directory:
+            filename = join(directory, 'debexpo')
+
+            # Two uploads of the same name and size, the first one finishing
+            # last
+            first = CheckSumedFileWriter(filename)
+            second = CheckSumedFileWriter(filename)
+            first.write(b'debexpo')
+            second.write(b'changed')
+            second.close()
+            first.close()
+
+            with open(filename, 'rb') as fh:
+                content = fh.read()
+
+            self.assertEquals(content, b'debexpo')
+            self.assertEquals(listdir(directory), ['debexpo'])
+
+            # The recorded digests are the ones of the installed content
+            self.assertEquals(
+                CheckSumedFile(filename).compute_checksums()['sha256'],
+                sha256(content).hexdigest())
+
+    def test_sumed_file_writer_replaced(self):
+        with TemporaryDirectory() as directory:
+            filename = join(directory, 'debexpo')
+
+            with CheckSumedFileWriter(filename) as fh:
+                fh.write(b'debexpo')
+
+                # Another upload replaces the file once this one is installed
+                with patch('debexpo.tools.files.replace') as mock_replace:
+                    def install_and_replace(src, dest):
+                        replace(src, dest)
+
+                        with open(dest + '.new', 'wb') as other:
+                            other.write(b'other')
+
+                        replace(dest + '.new', dest)
+
+                    mock_replace.side_effect = install_and_replace
+                    fh.close()
+
+            # The digests of the replaced file are not recorded
+            self.assertEquals(
+                CheckSumedFile(filename).compute_checksums()['sha256'],
+                sha256(b'other').hexdigest())
+
+    def test_sumed_file_writer_error(self):
+        with TemporaryDirectory() as directory:
+            filename = join(directory, 'debexpo')
+
+            with self.assertRaises(OSError):
+                with CheckSumedFileWriter(filename) as fh:
+                    fh.write(b'deb')
+                    raise OSError('Connection reset')
+
+            # Nothing is installed
+            self.assertEquals(listdir(directory), [])
+
+
+class TestInstallFile(TestController):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.src = join(self.directory.name, 'src')
+        self.dest = join(self.directory.name, 'dest')
+
+        with open(self.src, 'w') as fh:
+            fh.write('debexpo')
+
+        with open(self.dest, 'w') as fh:
+            fh.write('previous content')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _assert_installed(self):
+        with open(self.dest) as fh:
+            self.assertEquals(fh.read(), 'debexpo')
+
+        self.assertEquals(sorted(listdir(self.directory.name)),
+                          ['dest', 'src'])
+
+    def test_install_file_link(self):
+        chmod(self.src, 0o444)
+        install_file(self.src, self.dest)
+
+        self._assert_installed()
+        self.assertEquals(stat(self.src).st_ino, stat(self.dest).st_ino)
+
+    def test_install_file_writable(self):
+        chmod(self.src, 0o640)
+
+        with patch('debexpo.tools.files.ioctl', side_effect=OSError()):
+            install_file(self.src, self.dest)
+
+        self._assert_installed()
+        self.assertNotEqual(stat(self.src).st_ino, stat(self.dest).st_ino)
+        self.assertEquals(S_IMODE(stat(self.dest).st_mode), 0o640)
+
+    def test_install_file_mode(self):
+        chmod(self.src, 0o444)
+        install_file(self.src, self.dest, 0o644)
+
+        self._assert_installed()
+        self.assertNotEqual(stat(self.src).st_ino, stat(self.dest).st_ino)
+        self.assertEquals(S_IMODE(stat(self.src).st_mode), 0o444)
+        self.assertEquals(S_IMODE(stat(self.dest).st_mode), 0o644)
+
+    def test_install_file_owned(self):
+        chmod(self.src, 0o600)
+        install_file(self.src, self.dest, 0o644, owned=True)
+
+        self._assert_installed()
+        self.assertEquals(stat(self.src).st_ino, stat(self.dest).st_ino)
+        self.assertEquals(S_IMODE(stat(self.dest).st_mode), 0o644)
+
+    def test_install_file_other_owner(self):
+        chmod(self.src, 0o444)
+
+        def other_owner(path):
+            info = stat(path)
+
+            if path == self.directory.name:
+                return Mock(st_mode=info.st_mode, st_uid=info.st_uid + 1)
+
+            return info
+
+        with patch('debexpo.tools.files.stat', side_effect=other_owner):
+            install_file(self.src, self.dest, owned=True)
+
+        self._assert_installed()
+        self.assertNotEqual(stat(self.src).st_ino, stat(self.dest).st_ino)
+
+    def test_install_file_copy(self):
+        with patch('debexpo.tools.files.link', side_effect=OSError()):
+            with patch('debexpo.tools.files.ioctl', side_effect=OSError()):
+                install_file(self.src, self.dest)
+
+        self._assert_installed()
+        self.assertNotEqual(stat(self.src).st_ino, stat(self.dest).st_ino)
+
+    def test_install_file_failure(self):
+        with patch('debexpo.tools.files.replace', side_effect=OSError()):
+            self.assertRaises(OSError, install_file, self.src, self.dest)
+
+        with open(self.dest) as fh:
+            self.assertEquals(fh.read(), 'previous content')
+
+        self.assertEquals(sorted(listdir(self.directory.name)),
+                          ['dest', 'src'])
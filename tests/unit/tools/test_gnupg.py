@@ -224,6 +224,32 @@ class TestGnuPGController(TestCase):
             self.assertEquals(e.long_id, long_id)
             self.assertIn(os.path.basename(filename), str(e))
 
+    def testVerifyMany(self):
+        """
+        Verify several files with a single gpg call.
+        """
+        gnupg = self._get_gnupg()
+        gnupg.import_key(test_gpg_key)
+        results = gnupg.verify_many([signed_file, '/etc/passwd',
+                                     signed_file_v1, '/noexistent'])
+
+        self.assertEquals(results[signed_file], test_gpg_key_fpr)
+        self.assertIsInstance(results['/etc/passwd'],
+                              ExceptionGnuPGNotSignedFile)
+        self.assertIsInstance(results[signed_file_v1], ExceptionGnuPGNoPubKey)
+        self.assertEquals(results[signed_file_v1].long_id,
+                          test_gpg1_key_fpr[-16:])
+        self.assertIsInstance(results['/noexistent'], ExceptionGnuPG)
+        self.assertIn('noexistent', str(results['/noexistent']))
+        self.assertEquals(gnupg.verify_many([]), {})
+
+    def testVerifyManyTimeout(self):
+        gnupg = self._get_gnupg()
+        with self.settings(SUBPROCESS_TIMEOUT_GPG=0):
+            results = gnupg.verify_many([signed_file])
+
+        self.assertIsInstance(results[signed_file], ExceptionGnuPG)
+
     def testInvalidSignature(self):
         """
         Test that verify_sig() fails for an unsigned file.
@@ -33,8 +33,35 @@ from django.conf import settings
 from django.test import TestCase, tag
 
 from debexpo.tools.nntp import NNTPClient
+from tests import TestingNNTPServer
 from tests.tools import test_network
 
+MULTIPART = """--boundary
+Content-Type: text/html
+
+<p>Accepted</p>
+--boundary
+Content-Type: text/plain; charset="utf-8"
+Content-Transfer-Encoding: quoted-printable
+
+Source: hello=0AVersion: 1.0-1
+--boundary--
+"""
+
+
+def build_articles(count):
+    articles = []
+
+    for number in range(1, count + 1):
+        if number % 3 == 0:
+            articles.append((f'Accepted hello {number} (source) into '
+                             'unstable', {}, f'Source: hello\n'
+                             f'Version: {number}\n.dot-stuffed'))
+        else:
+            articles.append((f'Processed: bug {number}', {}, 'noise'))
+
+    return articles
+
 
 @tag('network', 'nntp')
 @unittest.skipIf(test_network(), 'no network: {}'.format(test_network()))
@@ -97,3 +124,57 @@ class TestNNTP(TestCase):
         self.assertRaises(StopIteration, next,
                           self.client.unread_messages(self.list, '-1'))
         self.assertTrue(self.client.disconnect_from_server())
+
+
+class TestNNTPFake(TestCase):
+    def _read(self, server, since='1', **kwargs):
+        with self.settings(NNTP_SERVER='localhost', NNTP_PORT=server.port,
+                           **kwargs):
+            self.client = NNTPClient(subject=r'^Accepted\s')
+            self.assertTrue(self.client.connect_to_server())
+            messages = list(self.client.unread_messages('list', since))
+            self.assertTrue(self.client.disconnect_from_server())
+
+        return messages
+
+    def test_nntp_filtered(self):
+        with TestingNNTPServer(build_articles(10)) as server:
+            messages = self._read(server, NNTP_BATCH_SIZE=4, NNTP_WORKERS=1)
+
+        self.assertEquals([message['X-Debexpo-Message-Number']
+                           for message in messages], [3, 6, 9])
+        self.assertEquals(messages[0].get_payload(),
+                          'Source: hello\nVersion: 3\n.dot-stuffed\n')
+        self.assertIn('Accepted hello 3', messages[0]['Subject'])
+
+        # Only relevant bodies are retrieved
+        self.assertEquals(server.commands.count('BODY'), 3)
+        self.assertEquals(server.commands.count('XOVER'), 3)
+        self.assertNotIn('ARTICLE', server.commands)
+
+        # The last article was scanned, even if not returned
+        self.assertEquals(self.client.scanned, {'list': 10})
+
+    def test_nntp_concurrent(self):
+        with TestingNNTPServer(build_articles(30)) as server:
+            messages = self._read(server, since='5', NNTP_WORKERS=4)
+
+        # Messages are in order
+        self.assertEquals([message['X-Debexpo-Message-Number']
+                           for message in messages], list(range(6, 31, 3)))
+
+    def test_nntp_mime(self):
+        articles = [('Accepted hello 1.0-1 (source) into unstable',
+                     {'Content-Type': 'multipart/alternative; '
+                                      'boundary="boundary"'}, MULTIPART)]
+
+        with TestingNNTPServer(articles) as server:
+            messages = self._read(server)
+
+        parts = messages[0].get_payload()
+        self.assertEquals(parts[1].get_payload(decode=True),
+                          b'Source: hello\nVersion: 1.0-1')
+
+    def test_nntp_wrong_index(self):
+        with TestingNNTPServer(build_articles(3)) as server:
+            self.assertEquals(self._read(server, since='-1'), [])